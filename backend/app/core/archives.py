@@ -0,0 +1,261 @@
+# backend/app/core/archives.py
+import struct
+import zlib
+from typing import AsyncIterator, NamedTuple, Optional, Tuple
+
+# Zip and tar members are read straight off the request body, one at a
+# time: nothing is spooled to disk and no central directory is needed.
+
+_ZIP_LOCAL = b"PK\x03\x04"
+_ZIP_END = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")  # central directory: no members follow
+_ZIP_DESCRIPTOR = b"PK\x07\x08"
+_GZIP = b"\x1f\x8b"
+_BLOCK = 512
+_READ_SIZE = 65536
+_INFLATE_STEP = 1 << 20  # output per decompress call, so a bomb never inflates at once
+
+
+class ArchiveError(ValueError):
+    """Raised when an archive is truncated or malformed; members already read stay valid"""
+
+
+class UnsupportedArchiveError(ArchiveError):
+    """Raised when a body is not a zip, tar or gzipped tar"""
+
+
+class ArchiveMember(NamedTuple):
+    name: str
+    data: Optional[bytes]
+    error: Optional[str] = None  # set, with data None, for members that could not be read
+
+
+class _Reader:
+    """Byte-level reads over an async chunk stream, buffering only what was asked for"""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._buffer = bytearray()
+
+    async def _fill(self) -> bool:
+        try:
+            self._buffer += await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return False
+        return True
+
+    async def peek(self, n: int) -> bytes:
+        while len(self._buffer) < n and await self._fill():
+            pass
+        return bytes(self._buffer[:n])
+
+    async def read(self, n: int) -> bytes:
+        """Exactly n bytes; ArchiveError if the stream ends first"""
+        while len(self._buffer) < n:
+            if not await self._fill():
+                raise ArchiveError("Archive is truncated")
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return data
+
+    async def read_some(self, limit: int = _READ_SIZE) -> bytes:
+        if not self._buffer and not await self._fill():
+            raise ArchiveError("Archive is truncated")
+        data = bytes(self._buffer[:limit])
+        del self._buffer[:limit]
+        return data
+
+    async def skip(self, n: int) -> None:
+        while n > 0:
+            n -= len(await self.read_some(min(n, _READ_SIZE)))
+
+    def unread(self, data: bytes) -> None:
+        self._buffer[:0] = data
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """What is left of the stream, buffered bytes first"""
+        if self._buffer:
+            data, self._buffer = bytes(self._buffer), bytearray()
+            yield data
+        async for chunk in self._chunks:
+            yield chunk
+
+
+async def _gunzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    decompressor = zlib.decompressobj(wbits=31)
+    async for chunk in chunks:
+        while chunk:
+            try:
+                data = decompressor.decompress(chunk, _INFLATE_STEP)
+            except zlib.error as exc:
+                raise ArchiveError(f"Corrupt gzip stream: {exc}") from exc
+            if data:
+                yield data
+            if decompressor.eof:  # concatenated gzip members
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=31)
+            else:
+                chunk = decompressor.unconsumed_tail
+
+
+def _tar_number(field: bytes) -> int:
+    if field[:1] and field[0] & 0x80:  # GNU base-256, for sizes of 8 GiB and up
+        return int.from_bytes(field[1:], "big")
+    digits = field.strip(b"\0 ")
+    return int(digits, 8) if digits else 0
+
+
+def _pax_path(records: bytes) -> Optional[str]:
+    """The path record of a pax extended header ("<length> <key>=<value>\\n" records)"""
+    while records:
+        length, _, rest = records.partition(b" ")
+        if not length.isdigit():
+            break
+        record, records = records[:int(length)], records[int(length):]
+        key, _, value = record[len(length) + 1:].rstrip(b"\n").partition(b"=")
+        if key == b"path":
+            return value.decode("utf-8", "replace")
+    return None
+
+
+async def _iter_tar(reader: _Reader, max_member_bytes: int) -> AsyncIterator[ArchiveMember]:
+    long_name: Optional[str] = None
+    while True:
+        header = await reader.peek(_BLOCK)
+        if len(header) < _BLOCK or header == b"\0" * _BLOCK:
+            return  # end-of-archive blocks, or a writer that left them out
+        await reader.skip(_BLOCK)
+        checksum = sum(header[:148]) + 8 * 32 + sum(header[156:])
+        if checksum != _tar_number(header[148:156]):
+            raise ArchiveError("Malformed tar header")
+        size = _tar_number(header[124:136])
+        padding = -size % _BLOCK
+        kind = header[156:157]
+        name = header[:100].split(b"\0", 1)[0]
+        if header[257:262] == b"ustar" and header[345:500].strip(b"\0"):
+            name = header[345:500].split(b"\0", 1)[0] + b"/" + name
+        name = long_name or name.decode("utf-8", "replace")
+        long_name = None
+        if kind in (b"L", b"x"):
+            # Metadata for the next header: a GNU long name or pax records
+            if size > 65536:
+                raise ArchiveError("Tar extended header is too large")
+            data = await reader.read(size)
+            await reader.skip(padding)
+            long_name = data.rstrip(b"\0").decode("utf-8", "replace") if kind == b"L" else _pax_path(data)
+        elif kind not in (b"0", b"\0", b"7"):
+            await reader.skip(size + padding)  # directories, links, global pax headers
+        elif size > max_member_bytes:
+            await reader.skip(size + padding)
+            yield ArchiveMember(name, None, f"Exceeds {max_member_bytes} bytes")
+        else:
+            data = await reader.read(size)
+            await reader.skip(padding)
+            yield ArchiveMember(name, data)
+
+
+def _zip64_sizes(extra: bytes, compressed: int, size: int) -> Tuple[int, int, bool]:
+    """Sizes from the zip64 extra field, which holds those the header marks 0xFFFFFFFF"""
+    while len(extra) >= 4:
+        tag, length = struct.unpack("<HH", extra[:4])
+        if tag == 0x0001:
+            values = list(struct.unpack(f"<{length // 8}Q", extra[4:4 + length // 8 * 8]))
+            if size == 0xFFFFFFFF and values:
+                size = values.pop(0)
+            if compressed == 0xFFFFFFFF and values:
+                compressed = values.pop(0)
+            return compressed, size, True
+        extra = extra[4 + length:]
+    return compressed, size, False
+
+
+async def _inflate(reader: _Reader, limit: int) -> Tuple[Optional[bytes], int]:
+    """Inflate one raw deflate stream off the reader, up to limit bytes of output.
+
+    Returns (data or None past the limit, crc32 of everything inflated).
+    """
+    decompressor = zlib.decompressobj(-15)
+    output = bytearray()
+    crc = 0
+    over = False
+    while not decompressor.eof:
+        chunk = await reader.read_some()
+        while chunk:
+            try:
+                data = decompressor.decompress(chunk, _INFLATE_STEP)
+            except zlib.error as exc:
+                raise ArchiveError(f"Corrupt zip member: {exc}") from exc
+            crc = zlib.crc32(data, crc)
+            if not over and len(output) + len(data) > limit:
+                over, output = True, bytearray()
+            if not over:
+                output += data
+            chunk = decompressor.unconsumed_tail
+            if decompressor.eof:
+                break
+    reader.unread(decompressor.unused_data)
+    return (None if over else bytes(output)), crc
+
+
+async def _iter_zip(reader: _Reader, max_member_bytes: int) -> AsyncIterator[ArchiveMember]:
+    while True:
+        signature = await reader.read(4)
+        if signature in _ZIP_END:
+            return
+        if signature != _ZIP_LOCAL:
+            raise ArchiveError("Malformed zip: expected a local file header")
+        _, flags, method, _, _, crc, compressed, size, name_length, extra_length = struct.unpack(
+            "<HHHHHIIIHH", await reader.read(26))
+        name = (await reader.read(name_length)).decode("utf-8" if flags & 0x800 else "cp437")
+        compressed, size, zip64 = _zip64_sizes(await reader.read(extra_length), compressed, size)
+        streamed = bool(flags & 0x08)  # sizes and CRC follow the data instead
+        if flags & 0x01:
+            raise ArchiveError(f"Encrypted zip member {name} is not supported")
+        if method == 8:
+            if not streamed and size > max_member_bytes:
+                await reader.skip(compressed)
+                data, actual_crc = None, crc
+            else:
+                data, actual_crc = await _inflate(reader, max_member_bytes)
+        elif method == 0 and not streamed:
+            data = await reader.read(compressed) if compressed <= max_member_bytes else None
+            if data is None:
+                await reader.skip(compressed)
+            actual_crc = zlib.crc32(data) if data is not None else crc
+        else:
+            # Stored data of unknown length cannot be delimited in a stream
+            raise ArchiveError(f"Zip member {name} uses an unsupported layout (method {method})")
+        if streamed:
+            if await reader.peek(4) == _ZIP_DESCRIPTOR:
+                await reader.skip(4)
+            crc = struct.unpack("<I", await reader.read(4))[0]
+            await reader.skip(16 if zip64 else 8)
+        if data is not None and actual_crc != crc:
+            raise ArchiveError(f"CRC mismatch in zip member {name}")
+        if name.endswith("/"):
+            continue
+        if data is None:
+            yield ArchiveMember(name, None, f"Exceeds {max_member_bytes} bytes")
+        else:
+            yield ArchiveMember(name, data)
+
+
+async def open_archive(chunks: AsyncIterator[bytes],
+                       max_member_bytes: int) -> Tuple[str, AsyncIterator[ArchiveMember]]:
+    """Detect the archive format from its first bytes and return (format, members).
+
+    Reads only the head of the stream, so an unsupported body is refused
+    (UnsupportedArchiveError) before any response is started. Members over
+    max_member_bytes are skipped without being held in memory.
+    """
+    reader = _Reader(chunks)
+    head = await reader.peek(_BLOCK)
+    if head.startswith(_ZIP_LOCAL):
+        return "zip", _iter_zip(reader, max_member_bytes)
+    kind = "tar"
+    if head.startswith(_GZIP):
+        reader = _Reader(_gunzip(reader.chunks()))
+        head = await reader.peek(_BLOCK)
+        kind = "tar.gz"
+    if head[257:262] != b"ustar":
+        raise UnsupportedArchiveError("Send a zip, tar or tar.gz archive")
+    return kind, _iter_tar(reader, max_member_bytes)
@@ -0,0 +1,313 @@
+# backend/app/core/cache.py
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+from .config import settings
+from .metrics import CACHE_INVALIDATIONS, CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+SchemaT = TypeVar("SchemaT", bound=BaseModel)
+
+
+class LRUTTLCache:
+    """In-process LRU cache whose entries also expire after a fixed TTL"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Left in L2 by invalidate for a few seconds: a fill that read the row before
+# the write must not store it afterwards (see EntityCache.fill)
+TOMBSTONE = "__invalidated__"
+
+# Increment a counter only while it is cached, so a write never resurrects
+# an expired counter with a partial value
+INCR_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+class InMemoryPubSub:
+    """Subscriber handle returned by InMemoryRedis.pubsub()"""
+
+    def __init__(self, broker: "InMemoryRedis"):
+        self._broker = broker
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._channels: List[str] = []
+
+    async def subscribe(self, *channels: str) -> None:
+        for channel in channels:
+            self._channels.append(channel)
+            self._broker._subscribers.setdefault(channel, []).append(self._queue)
+            await self._queue.put({"type": "subscribe", "channel": channel, "data": 1})
+
+    async def unsubscribe(self, *channels: str) -> None:
+        for channel in channels or tuple(self._channels):
+            queues = self._broker._subscribers.get(channel, [])
+            if self._queue in queues:
+                queues.remove(self._queue)
+
+    async def listen(self):
+        while True:
+            yield await self._queue.get()
+
+    async def aclose(self) -> None:
+        await self.unsubscribe()
+
+
+class InMemoryRedis:
+    """Single-process stand-in for the subset of redis.asyncio.Redis the app uses.
+
+    Selected with REDIS_URL=memory:// for tests and local runs without Redis.
+    Several EntityCache instances sharing one InMemoryRedis behave like
+    workers sharing one Redis server, including pub/sub fan-out.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], str]] = {}
+        self._subscribers: Dict[str, List["asyncio.Queue[Dict[str, Any]]"]] = {}
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._live(key)
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> bool:
+        if nx and self._live(key) is not None:
+            return False
+        expires_at = time.monotonic() + ex if ex else None
+        self._data[key] = (expires_at, str(value))
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def _incr_if_exists(self, keys: List[str], argv: List[Any]) -> Optional[int]:
+        value = self._live(keys[0])
+        if value is None:
+            return None
+        total = int(value) + int(argv[0])
+        self._data[keys[0]] = (self._data[keys[0]][0], str(total))
+        return total
+
+    # Native equivalents of the Lua scripts the app ships, keyed by their source
+    _SCRIPTS: Dict[str, Callable[["InMemoryRedis", List[str], List[Any]], Any]] = {
+        INCR_IF_EXISTS_SCRIPT: _incr_if_exists,
+    }
+
+    async def eval(self, script: str, numkeys: int, *args: Any) -> Any:
+        emulation = self._SCRIPTS.get(script)
+        if emulation is None:
+            raise ValueError("InMemoryRedis has no emulation of this script; add one to _SCRIPTS")
+        return emulation(self, list(args[:numkeys]), list(args[numkeys:]))
+
+    async def publish(self, channel: str, message: str) -> int:
+        queues = self._subscribers.get(channel, [])
+        for queue in queues:
+            await queue.put({"type": "message", "channel": channel, "data": message})
+        return len(queues)
+
+    def pubsub(self) -> InMemoryPubSub:
+        return InMemoryPubSub(self)
+
+    async def aclose(self) -> None:
+        self._data.clear()
+
+
+def create_redis(url: str):
+    """Return a Redis client for url, or the in-memory stand-in for memory://"""
+    if url.startswith("memory://"):
+        return InMemoryRedis()
+    from redis import asyncio as aioredis
+    return aioredis.from_url(url, decode_responses=True)
+
+
+class EntityCache:
+    """Read-through cache with an in-process L1 in front of a shared Redis L2.
+
+    Values are JSON strings. Writes invalidate both tiers and publish the
+    keys on a pub/sub channel so other workers drop their L1 copies; the
+    short L1 TTL bounds staleness if a message is ever missed. Invalidated
+    keys hold a tombstone for tombstone_ttl seconds that fills do not
+    overwrite. Redis errors are logged and treated as misses so the
+    database stays the fallback.
+    """
+
+    def __init__(self, redis, ttl: int, l1_max_entries: int, l1_ttl: float, channel: str,
+                 tombstone_ttl: int = 5):
+        self.redis = redis
+        self.ttl = ttl
+        self.tombstone_ttl = tombstone_ttl
+        self.channel = channel
+        self.l1 = LRUTTLCache(l1_max_entries, l1_ttl)
+        self.instance_id = uuid.uuid4().hex
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+        self._listener: Optional[asyncio.Task] = None
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.l1.get(key)
+        if value is not None:
+            self._record("l1", "hit")
+            return value
+        try:
+            value = await self.redis.get(key)
+        except Exception as exc:
+            logger.warning("Redis get failed for %s: %s", key, exc)
+            value = None
+        if value is not None and value != TOMBSTONE:
+            self._record("l2", "hit")
+            self.l1.set(key, value)
+            return value
+        self._record("l2", "miss")
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        self.l1.set(key, value)
+        try:
+            await self.redis.set(key, value, ex=self.ttl)
+        except Exception as exc:
+            logger.warning("Redis set failed for %s: %s", key, exc)
+
+    async def fill(self, key: str, value: str) -> bool:
+        """Cache a value just read from the database, unless the key was written
+        to since: invalidate leaves a tombstone that a fill never replaces, so a
+        read that raced an update cannot cache the old row after it"""
+        try:
+            stored = await self.redis.set(key, value, ex=self.ttl, nx=True)
+        except Exception as exc:
+            logger.warning("Redis set failed for %s: %s", key, exc)
+            stored = True  # no L2 to consult; the L1 TTL bounds staleness
+        if stored:
+            self.l1.set(key, value)
+        return bool(stored)
+
+    async def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            self.l1.delete(key)
+        CACHE_INVALIDATIONS.labels(origin="local").inc(len(keys))
+        try:
+            for key in keys:
+                await self.redis.set(key, TOMBSTONE, ex=self.tombstone_ttl)
+            await self.redis.publish(self.channel, json.dumps({"sender": self.instance_id, "keys": list(keys)}))
+        except Exception as exc:
+            logger.warning("Redis invalidation failed for %s: %s", keys, exc)
+
+    async def read_through(self, key: str, schema: Type[SchemaT],
+                           loader: Callable[[], Awaitable[Any]]) -> Optional[SchemaT]:
+        """Return the cached schema for key, loading and caching it on a miss"""
+        cached = await self.get(key)
+        if cached is not None:
+            return schema.model_validate_json(cached)
+        row = await loader()
+        if row is None:
+            return None
+        value = schema.model_validate(row)
+        await self.fill(key, value.model_dump_json())
+        return value
+
+    def _record(self, tier: str, result: str) -> None:
+        if tier == "l1":
+            self.stats["l1_hits"] += 1
+        elif result == "hit":
+            self.stats["l2_hits"] += 1
+        else:
+            self.stats["misses"] += 1
+        CACHE_REQUESTS.labels(tier=tier, result=result).inc()
+
+    async def start(self) -> None:
+        """Start listening for invalidations published by other workers"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("sender") == self.instance_id:
+                        continue
+                    for key in payload.get("keys", []):
+                        self.l1.delete(key)
+                    CACHE_INVALIDATIONS.labels(origin="pubsub").inc(len(payload.get("keys", [])))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # Missed messages are covered by the L1 TTL; drop L1 to be safe
+                logger.warning("Cache invalidation listener failed, resubscribing: %s", exc)
+                self.l1.clear()
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+entity_cache = EntityCache(
+    create_redis(settings.REDIS_URL),
+    ttl=settings.CACHE_TTL_SECONDS,
+    l1_max_entries=settings.CACHE_L1_MAX_ENTRIES,
+    l1_ttl=settings.CACHE_L1_TTL_SECONDS,
+    channel=settings.CACHE_INVALIDATION_CHANNEL,
+    tombstone_ttl=settings.CACHE_TOMBSTONE_SECONDS,
+)
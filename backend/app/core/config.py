@@ -1,6 +1,6 @@
 # backend/app/core/config.py
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # Database settings from .env
@@ -10,6 +10,22 @@ class Settings(BaseSettings):
     DB_USER: str = "plant_user"
     DB_PASSWORD: str = "plant_password"
     
+    # Connection pool, applied to every connection in TORTOISE_ORM. Requests
+    # waiting longer than DB_POOL_ACQUIRE_TIMEOUT for a connection get a 503.
+    DB_POOL_MIN_SIZE: int = 2
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_ACQUIRE_TIMEOUT: float = 2.0
+    DB_COMMAND_TIMEOUT: float = 30.0
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_MAX_INACTIVE_CONNECTION_LIFETIME: float = 300.0
+    DB_MAX_QUERIES: int = 50000
+    
+    # Optional read replica: get_* service calls read from it unless the
+    # session wrote within the last REPLICA_PIN_SECONDS (tracked by cookie)
+    DATABASE_REPLICA_URL: Optional[str] = None
+    REPLICA_PIN_SECONDS: float = 5.0
+    REPLICA_PIN_COOKIE: str = "plantify_primary_until"
+    
     # PostgreSQL Admin (for setup)
     POSTGRES_ADMIN_USER: str = "postgres"
     POSTGRES_ADMIN_PASSWORD: str = "admin123"
@@ -19,6 +35,97 @@ class Settings(BaseSettings):
     DEBUG: bool = True
     ENVIRONMENT: str = "development"
     
+    # Redis / entity cache (REDIS_URL=memory:// uses an in-process stand-in)
+    REDIS_URL: str = "redis://localhost:6379"
+    CACHE_TTL_SECONDS: int = 300
+    CACHE_L1_TTL_SECONDS: float = 30.0
+    CACHE_L1_MAX_ENTRIES: int = 10000
+    CACHE_INVALIDATION_CHANNEL: str = "plantify:cache:invalidate"
+    # After a write, reads go to the database for this long so a read that
+    # started before the write cannot cache the old row; keep it above the
+    # slowest entity query
+    CACHE_TOMBSTONE_SECONDS: int = 5
+    COUNT_CACHE_TTL_SECONDS: int = 600
+    
+    # Bulk ingestion
+    BULK_MAX_ITEMS: int = 5000
+    BULK_INSERT_BATCH_SIZE: int = 1000
+    INGEST_CHUNK_SIZE: int = 1000
+    INGEST_MAX_LINE_BYTES: int = 65536
+    EXPORT_FETCH_SIZE: int = 2000
+    
+    # Image uploads: content-addressed blobs in a pluggable store ("local" is
+    # a directory tree under UPLOAD_DIR). nginx also caps bodies at 50 MB.
+    STORAGE_BACKEND: str = "local"
+    UPLOAD_DIR: str = "uploads"
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024
+    
+    # Diagnosis engine: a saved Keras classifier with one label per output in
+    # MODEL_LABELS_PATH (default labels.txt beside the model); unset MODEL_PATH
+    # disables server-side diagnosis. Concurrent requests are micro-batched: a
+    # batch runs once it holds INFERENCE_MAX_BATCH_SIZE images or its first
+    # image has waited INFERENCE_MAX_WAIT_MS.
+    MODEL_PATH: Optional[str] = None
+    MODEL_LABELS_PATH: Optional[str] = None
+    MODEL_VERSION: Optional[str] = None  # defaults to the model's file name
+    MODEL_HEALTHY_LABEL: str = "healthy"
+    # A .tflite model (float16 or int8 converted; see bench_inference.py
+    # runtimes) runs on the TFLite interpreter with TFLITE_THREADS threads
+    # (default: one per CPU) instead of TensorFlow.
+    TFLITE_THREADS: Optional[int] = None
+    INFERENCE_MAX_BATCH_SIZE: int = 32
+    INFERENCE_MAX_WAIT_MS: float = 10.0
+    INFERENCE_MAX_QUEUE: int = 1024
+    
+    # Set INFERENCE_SOCKET to use one shared inference process (see
+    # app/services/inference_server.py) instead of a model per web worker;
+    # each worker then hands images over in a ring of INFERENCE_SHM_SLOTS.
+    INFERENCE_SOCKET: Optional[str] = None
+    INFERENCE_SHM_SLOTS: int = 64
+    
+    # Set MODEL_REGISTRY_PATH instead of MODEL_PATH to pick a model per plant
+    # species (see app/services/model_registry.py). Models load on first use
+    # and the least recently used are unloaded to keep the loaded ones within
+    # MODEL_REGISTRY_MAX_BYTES, estimated from their size on disk.
+    MODEL_REGISTRY_PATH: Optional[str] = None
+    MODEL_REGISTRY_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    
+    # Each worker caches predictions by model version and image SHA-256 for up
+    # to INFERENCE_CACHE_MAX_ENTRIES images (0 disables). With
+    # INFERENCE_CACHE_MAX_DISTANCE set, an image whose 64-bit perceptual hash
+    # is within that many bits of a cached one reuses its prediction too.
+    INFERENCE_CACHE_MAX_ENTRIES: int = 10000
+    INFERENCE_CACHE_MAX_DISTANCE: Optional[int] = None
+    
+    # Images are decoded and resized for the model in PREPROCESS_WORKERS
+    # processes (default: one per CPU; 0 = a thread in the web worker).
+    # Images over PREPROCESS_MAX_PIXELS are refused from their header alone.
+    PREPROCESS_WORKERS: Optional[int] = None
+    PREPROCESS_MAX_PIXELS: int = 40_000_000
+    
+    # Resized images (GET /images/{image_path}?w=): widths round up to one of
+    # THUMBNAIL_WIDTHS, encoded at THUMBNAIL_QUALITY by THUMBNAIL_WORKERS
+    # processes (default: one per CPU; 0 = a thread) on first request and
+    # kept in THUMBNAIL_DIR (default UPLOAD_DIR/.thumbnails), which can be
+    # cleared at any time.
+    THUMBNAIL_WIDTHS: List[int] = [160, 320, 640, 1280]
+    THUMBNAIL_QUALITY: int = 80
+    THUMBNAIL_WORKERS: Optional[int] = None
+    THUMBNAIL_DIR: Optional[str] = None
+    
+    # Archive diagnosis (POST /api/diagnoses/analyze/archive): up to
+    # ARCHIVE_MAX_MEMBERS images per zip/tar, each at most UPLOAD_MAX_BYTES,
+    # with ARCHIVE_MAX_IN_FLIGHT of them stored and diagnosed at once; results
+    # are inserted as they finish, up to ARCHIVE_INSERT_CHUNK_SIZE rows a time.
+    ARCHIVE_MAX_MEMBERS: int = 5000
+    ARCHIVE_MAX_IN_FLIGHT: int = 64
+    ARCHIVE_INSERT_CHUNK_SIZE: int = 256
+    
+    # Plant health summary: weight of the newest diagnosis in the rolling
+    # score, and how many recent diagnoses a rebuild folds in
+    HEALTH_SCORE_ALPHA: float = 0.3
+    HEALTH_SCORE_WINDOW: int = 50
+    
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
     
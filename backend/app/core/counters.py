@@ -0,0 +1,107 @@
+# backend/app/core/counters.py
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Literal, Optional
+
+from tortoise.queryset import QuerySet
+
+from .cache import INCR_IF_EXISTS_SCRIPT, entity_cache
+from .config import settings
+from .db_router import read_connection
+from .metrics import COUNT_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+# exact: COUNT(*) every call. cached: counter cache, falling back to COUNT(*)
+# on a miss. approx: planner statistics for whole-table totals, cached for
+# scoped counts (pg_class has no per-user estimate).
+CountMode = Literal["exact", "cached", "approx"]
+
+USERS_COUNT_KEY = "count:users"
+PLANTS_COUNT_KEY = "count:plants"
+DIAGNOSES_COUNT_KEY = "count:diagnoses"
+
+
+def plants_by_user_count_key(user_id: int) -> str:
+    return f"count:plants:user:{user_id}"
+
+
+def diagnoses_by_plant_count_key(plant_id: int) -> str:
+    return f"count:diagnoses:plant:{plant_id}"
+
+
+def diagnoses_by_user_count_key(user_id: int) -> str:
+    return f"count:diagnoses:user:{user_id}"
+
+
+class CounterCache:
+    """Row counts kept in Redis and adjusted by the services on create/delete.
+
+    A counter is seeded from COUNT(*) on first read and expires after
+    COUNT_CACHE_TTL_SECONDS, which bounds drift from races between seeding
+    and concurrent writes or from cascaded deletes nobody adjusted for.
+    Adjustments only touch counters that already exist.
+    """
+
+    def __init__(self, redis, ttl: int):
+        self.redis = redis
+        self.ttl = ttl
+
+    async def get(self, key: str, compute: Callable[[], Awaitable[int]]) -> int:
+        try:
+            value = await self.redis.get(key)
+        except Exception as exc:
+            logger.warning("Redis get failed for %s: %s", key, exc)
+            value = None
+        if value is not None:
+            COUNT_REQUESTS.labels(mode="cached", result="hit").inc()
+            return int(value)
+        COUNT_REQUESTS.labels(mode="cached", result="miss").inc()
+        total = await compute()
+        try:
+            await self.redis.set(key, total, ex=self.ttl, nx=True)
+        except Exception as exc:
+            logger.warning("Redis set failed for %s: %s", key, exc)
+        return total
+
+    async def adjust(self, deltas: Dict[str, int]) -> None:
+        try:
+            await asyncio.gather(*(
+                self.redis.eval(INCR_IF_EXISTS_SCRIPT, 1, key, delta) for key, delta in deltas.items() if delta
+            ))
+        except Exception as exc:
+            logger.warning("Counter adjust failed for %s: %s", list(deltas), exc)
+
+    async def invalidate(self, *keys: str) -> None:
+        try:
+            await self.redis.delete(*keys)
+        except Exception as exc:
+            logger.warning("Counter invalidation failed for %s: %s", keys, exc)
+
+
+counter_cache = CounterCache(entity_cache.redis, ttl=settings.COUNT_CACHE_TTL_SECONDS)
+
+
+async def approximate_count(table: str) -> Optional[int]:
+    """Row estimate from planner statistics, or None if the table was never analyzed"""
+    rows = await read_connection().execute_query_dict(
+        "SELECT reltuples::bigint AS estimate FROM pg_class WHERE oid = to_regclass($1)", [table]
+    )
+    if not rows or rows[0]["estimate"] is None or rows[0]["estimate"] < 0:
+        return None
+    return rows[0]["estimate"]
+
+
+async def count_rows(mode: CountMode, key: str, queryset: QuerySet, table: Optional[str] = None) -> int:
+    """Count rows of queryset with the requested exactness"""
+    if mode == "exact":
+        COUNT_REQUESTS.labels(mode="exact", result="query").inc()
+        return await queryset.count()
+    if mode == "approx" and table is not None:
+        estimate = await approximate_count(table)
+        if estimate is not None:
+            COUNT_REQUESTS.labels(mode="approx", result="estimate").inc()
+            return estimate
+    return await counter_cache.get(key, queryset.count)
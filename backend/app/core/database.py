@@ -1,5 +1,6 @@
 # backend/app/core/database.py
-from tortoise import Tortoise
+from tortoise import Tortoise, connections
+from tortoise.backends.base.config_generator import expand_db_url
 import os
 
 from .config import settings
@@ -10,10 +11,27 @@ from .config import settings
 
 DATABASE_URL = os.getenv("DATABASE_URL", settings.DATABASE_URL)
 
+def pooled_connection(db_url: str) -> dict:
+    """Expand a postgres URL into a connection config carrying the pool settings"""
+    if db_url.startswith("postgresql://"):
+        db_url = "postgres://" + db_url[len("postgresql://"):]
+    config = expand_db_url(db_url)
+    config["engine"] = "app.core.db_pool"
+    config["credentials"].update({
+        "minsize": settings.DB_POOL_MIN_SIZE,
+        "maxsize": settings.DB_POOL_MAX_SIZE,
+        "acquire_timeout": settings.DB_POOL_ACQUIRE_TIMEOUT,
+        "command_timeout": settings.DB_COMMAND_TIMEOUT,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "max_inactive_connection_lifetime": settings.DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+        "max_queries": settings.DB_MAX_QUERIES,
+    })
+    return config
+
 # Tortoise-ORM configuration
 TORTOISE_ORM = {
     "connections": {
-        "default": DATABASE_URL,
+        "default": pooled_connection(DATABASE_URL),
     },
     "apps": {
         "models": {
@@ -23,12 +41,26 @@ TORTOISE_ORM = {
     }
 }
 
+# Optional read replica; see app/core/db_router.py for what reads go there
+if settings.DATABASE_REPLICA_URL:
+    TORTOISE_ORM["connections"]["replica"] = pooled_connection(settings.DATABASE_REPLICA_URL)
+    TORTOISE_ORM["routers"] = ["app.core.db_router.ReplicaRouter"]
+
 async def init_db():
     """Initialize database connection"""
     await Tortoise.init(config=TORTOISE_ORM)
     await Tortoise.generate_schemas()
     print("Database initialized successfully!")
 
+def pool_stats() -> dict:
+    """Per-connection pool usage for this worker"""
+    stats = {}
+    for name in TORTOISE_ORM["connections"]:
+        pool = getattr(connections.get(name), "_pool", None)
+        if pool is not None:
+            stats[name] = pool.stats()
+    return stats
+
 async def close_db():
     """Close database connection"""
     await Tortoise.close_connections()
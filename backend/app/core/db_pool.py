@@ -0,0 +1,84 @@
+# backend/app/core/db_pool.py
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+import asyncpg
+from tortoise.backends.asyncpg.client import AsyncpgDBClient
+from tortoise.exceptions import DBConnectionError
+
+from .metrics import (
+    DB_POOL_ACQUIRE_SECONDS, DB_POOL_ACQUIRE_TIMEOUTS, DB_POOL_IN_USE, DB_POOL_MAX_SIZE,
+    DB_POOL_SIZE, DB_POOL_WAITING,
+)
+
+# Tortoise engine module: TORTOISE_ORM connections use
+# {"engine": "app.core.db_pool", ...} to get an instrumented asyncpg pool
+
+
+class PoolTimeoutError(DBConnectionError):
+    """No pooled connection became free within the acquire timeout"""
+
+
+class InstrumentedPool:
+    """asyncpg pool wrapper that bounds acquire waits and records pool metrics.
+
+    Every acquire in Tortoise (queries, transactions, acquire_connection)
+    goes through pool.acquire(), so this is the one place to time it.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, name: str, max_size: int, acquire_timeout: Optional[float]):
+        self._pool = pool
+        self.name = name
+        self.acquire_timeout = acquire_timeout
+        self._waiting = 0
+        worker = str(os.getpid())
+        DB_POOL_MAX_SIZE.labels(connection=name, worker=worker).set(max_size)
+        DB_POOL_SIZE.labels(connection=name, worker=worker).set_function(pool.get_size)
+        DB_POOL_IN_USE.labels(connection=name, worker=worker).set_function(
+            lambda: pool.get_size() - pool.get_idle_size()
+        )
+        DB_POOL_WAITING.labels(connection=name, worker=worker).set_function(lambda: self._waiting)
+
+    async def acquire(self) -> asyncpg.Connection:
+        self._waiting += 1
+        start = time.perf_counter()
+        try:
+            return await self._pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            DB_POOL_ACQUIRE_TIMEOUTS.labels(connection=self.name).inc()
+            raise PoolTimeoutError(
+                f"Timed out after {self.acquire_timeout}s waiting for a '{self.name}' connection"
+            ) from None
+        finally:
+            self._waiting -= 1
+            DB_POOL_ACQUIRE_SECONDS.labels(connection=self.name).observe(time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        size = self._pool.get_size()
+        return {
+            "size": size,
+            "in_use": size - self._pool.get_idle_size(),
+            "waiting": self._waiting,
+            "max_size": self._pool.get_max_size(),
+        }
+
+    def __getattr__(self, name: str) -> Any:
+        # release, close, terminate, expire_connections, ...
+        return getattr(self._pool, name)
+
+
+class InstrumentedAsyncpgClient(AsyncpgDBClient):
+    """AsyncpgDBClient whose pool is an InstrumentedPool"""
+
+    def __init__(self, acquire_timeout: Optional[float] = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.acquire_timeout = float(acquire_timeout) if acquire_timeout else None
+
+    async def create_pool(self, **kwargs: Any) -> InstrumentedPool:
+        pool = await super().create_pool(**kwargs)
+        return InstrumentedPool(pool, self.connection_name, self.pool_maxsize, self.acquire_timeout)
+
+
+client_class = InstrumentedAsyncpgClient
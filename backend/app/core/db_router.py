@@ -0,0 +1,107 @@
+# backend/app/core/db_router.py
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional, Type, TypeVar
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from .config import settings
+from .metrics import DB_READ_ROUTES
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+T = TypeVar("T")
+
+# True while a read-only service call (a get_* method) is running
+_read_scope: ContextVar[bool] = ContextVar("replica_read_scope", default=False)
+# Why the current request must read from the primary, if it must
+_pinned: ContextVar[Optional[str]] = ContextVar("replica_pinned", default=None)
+
+
+def read_target() -> str:
+    """Connection name for a read issued now, recording the decision.
+
+    Reads go to the replica only inside a read-only service call, and only
+    when the request is not pinned to the primary for read-your-writes.
+    """
+    if not settings.DATABASE_REPLICA_URL:
+        return PRIMARY
+    if not _read_scope.get():
+        target, reason = PRIMARY, "write_path"
+    elif _pinned.get():
+        target, reason = PRIMARY, _pinned.get()
+    else:
+        target, reason = REPLICA, "read"
+    DB_READ_ROUTES.labels(target="replica" if target == REPLICA else "primary", reason=reason).inc()
+    return target
+
+
+def read_connection() -> BaseDBAsyncClient:
+    """Client for raw read queries, routed like ORM reads"""
+    return connections.get(read_target())
+
+
+def primary() -> BaseDBAsyncClient:
+    """Client for reads that must not lag, such as cache fills"""
+    return connections.get(PRIMARY)
+
+
+class ReplicaRouter:
+    """Tortoise router sending reads in a read scope to the replica; writes use the default"""
+
+    def db_for_read(self, model: Type[Any]) -> Optional[str]:
+        target = read_target()
+        return target if target == REPLICA else None
+
+    def db_for_write(self, model: Type[Any]) -> Optional[str]:
+        return None
+
+
+@contextmanager
+def read_scope() -> Iterator[None]:
+    """Mark the enclosed reads as safe to serve from the replica"""
+    token = _read_scope.set(True)
+    try:
+        yield
+    finally:
+        _read_scope.reset(token)
+
+
+def _in_read_scope(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        with read_scope():
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+def route_reads(cls: Type[T]) -> Type[T]:
+    """Class decorator: run the class's get_* static methods in a read scope"""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("get_") and isinstance(attr, staticmethod):
+            setattr(cls, name, staticmethod(_in_read_scope(attr.__func__)))
+    return cls
+
+
+def pin_request(method: str, pinned_until: Optional[str]) -> Any:
+    """Pin this request to the primary if it writes or its session wrote recently"""
+    reason = None
+    if method not in SAFE_METHODS:
+        reason = "write_request"
+    else:
+        try:
+            if pinned_until and float(pinned_until) > time.time():
+                reason = "pinned_session"
+        except ValueError:
+            pass
+    return _pinned.set(reason)
+
+
+def unpin_request(token: Any) -> None:
+    _pinned.reset(token)
@@ -0,0 +1,162 @@
+# backend/app/core/metrics.py
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# All Prometheus metrics live here so /metrics has a single registry to scrape
+
+CACHE_REQUESTS = Counter(
+    "plantify_cache_requests_total",
+    "Entity cache lookups by tier and outcome",
+    ["tier", "result"],
+)
+
+CACHE_INVALIDATIONS = Counter(
+    "plantify_cache_invalidations_total",
+    "Entity cache keys invalidated, by origin (local write or pub/sub message)",
+    ["origin"],
+)
+
+COUNT_REQUESTS = Counter(
+    "plantify_count_requests_total",
+    "Total-count lookups by mode and how they were answered",
+    ["mode", "result"],
+)
+
+# Connection pool gauges are labelled with the worker pid: each worker has its
+# own pools, and this tells the series apart when scraped through a balancer
+DB_POOL_SIZE = Gauge(
+    "plantify_db_pool_size",
+    "Open connections in the pool",
+    ["connection", "worker"],
+)
+
+DB_POOL_MAX_SIZE = Gauge(
+    "plantify_db_pool_max_size",
+    "Configured maximum pool size",
+    ["connection", "worker"],
+)
+
+DB_POOL_IN_USE = Gauge(
+    "plantify_db_pool_in_use",
+    "Connections currently checked out of the pool",
+    ["connection", "worker"],
+)
+
+DB_POOL_WAITING = Gauge(
+    "plantify_db_pool_waiting",
+    "Callers waiting to acquire a connection",
+    ["connection", "worker"],
+)
+
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    "plantify_db_pool_acquire_seconds",
+    "Time spent waiting to acquire a pooled connection",
+    ["connection"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0),
+)
+
+DB_POOL_ACQUIRE_TIMEOUTS = Counter(
+    "plantify_db_pool_acquire_timeouts_total",
+    "Acquires that gave up after DB_POOL_ACQUIRE_TIMEOUT",
+    ["connection"],
+)
+
+DB_READ_ROUTES = Counter(
+    "plantify_db_read_routes_total",
+    "Read routing decisions by target connection and reason",
+    ["target", "reason"],
+)
+
+UPLOADS = Counter(
+    "plantify_uploads_total",
+    "Image uploads by outcome (stored, deduplicated or a rejection reason)",
+    ["result"],
+)
+
+UPLOAD_BYTES = Counter(
+    "plantify_upload_bytes_total",
+    "Bytes received by the upload endpoint, including deduplicated uploads",
+)
+
+INFERENCE_BATCH_SIZE = Histogram(
+    "plantify_inference_batch_size",
+    "Images per model invocation",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+INFERENCE_SECONDS = Histogram(
+    "plantify_inference_seconds",
+    "Model forward time per batch",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+INFERENCE_QUEUE_SECONDS = Histogram(
+    "plantify_inference_queue_seconds",
+    "Time an image waited for its batch to start",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+PREPROCESS_SECONDS = Histogram(
+    "plantify_preprocess_seconds",
+    "Image preprocessing time per image, by stage (read, queue, open, decode, resize)",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+INFERENCE_REJECTED = Counter(
+    "plantify_inference_rejected_total",
+    "Images refused because INFERENCE_MAX_QUEUE were already waiting",
+)
+
+INFERENCE_CACHE_REQUESTS = Counter(
+    "plantify_inference_cache_requests_total",
+    "Inference cache lookups by tier (exact, similar) and outcome",
+    ["tier", "result"],
+)
+
+INFERENCE_CACHE_ENTRIES = Gauge(
+    "plantify_inference_cache_entries",
+    "Predictions held in this worker's inference cache",
+)
+
+MODEL_LOADS = Counter(
+    "plantify_model_loads_total",
+    "Diagnosis model loads by registry model name and outcome (loaded, error)",
+    ["model", "result"],
+)
+
+MODEL_LOAD_SECONDS = Histogram(
+    "plantify_model_load_seconds",
+    "Time to load and warm up a diagnosis model",
+    ["model"],
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0, 120.0),
+)
+
+MODEL_EVICTIONS = Counter(
+    "plantify_model_evictions_total",
+    "Diagnosis models unloaded to stay within MODEL_REGISTRY_MAX_BYTES",
+    ["model"],
+)
+
+MODEL_RESIDENT_BYTES = Gauge(
+    "plantify_model_resident_bytes",
+    "Estimated memory of each loaded diagnosis model (its size on disk)",
+    ["model"],
+)
+
+THUMBNAIL_REQUESTS = Counter(
+    "plantify_thumbnail_requests_total",
+    "Resized image requests by outcome (cached, generated, coalesced, not_modified)",
+    ["result"],
+)
+
+THUMBNAIL_SECONDS = Histogram(
+    "plantify_thumbnail_seconds",
+    "Time to decode, resize and encode one resized image, including the wait for a worker",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+def metrics_response() -> Response:
+    """Render the default registry in the Prometheus text format"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
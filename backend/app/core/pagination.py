@@ -0,0 +1,90 @@
+# backend/app/core/pagination.py
+import asyncio
+import base64
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Dict, Mapping, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from .counters import TOTAL_COUNT_HEADER
+
+# Keyset pagination walks rows newest first on (created_at, id). The id
+# breaks ties between rows inserted in the same microsecond, so the order is
+# total and rows inserted while a client is paging never shift later pages.
+KEYSET_ORDERING = ("-created_at", "-id")
+
+Cursor = Tuple[datetime, int]
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode a (created_at, id) position as an opaque URL-safe token"""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor:
+    """Decode a token produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid pagination cursor") from exc
+
+
+def paginate(queryset: QuerySet, skip: int, limit: int, cursor: Optional[Cursor] = None) -> QuerySet:
+    """Apply keyset pagination when a cursor is given, offset pagination otherwise"""
+    queryset = queryset.order_by(*KEYSET_ORDERING)
+    if cursor is None:
+        return queryset.offset(skip).limit(limit)
+    created_at, row_id = cursor
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=row_id)
+    ).limit(limit)
+
+
+def next_cursor(rows: Sequence[Any], limit: int) -> Optional[str]:
+    """Return the cursor for the page after rows, or None on the last page"""
+    if len(rows) < limit:
+        return None
+    last = rows[-1]
+    if isinstance(last, Mapping):
+        return encode_cursor(last["created_at"], last["id"])
+    return encode_cursor(last.created_at, last.id)
+
+
+def parse_cursor(token: Optional[str]) -> Optional[Cursor]:
+    """Decode an optional cursor query parameter, rejecting bad tokens with a 400"""
+    if token is None:
+        return None
+    try:
+        return decode_cursor(token)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def cursor_headers(rows: Sequence[Any], limit: int) -> Dict[str, str]:
+    """Response headers exposing the next page cursor when there may be more rows"""
+    cursor = next_cursor(rows, limit)
+    return {NEXT_CURSOR_HEADER: cursor} if cursor is not None else {}
+
+
+async def fetch_page(rows: Awaitable[Sequence[Any]], limit: int,
+                     total: Optional[Awaitable[int]] = None) -> Tuple[Sequence[Any], Dict[str, str]]:
+    """Run a page query, and the total count if requested, concurrently.
+
+    Returns the rows plus the X-Next-Cursor / X-Total-Count headers to send.
+    """
+    if total is None:
+        page, count = await rows, None
+    else:
+        page, count = await asyncio.gather(rows, total)
+    headers = cursor_headers(page, limit)
+    if count is not None:
+        headers[TOTAL_COUNT_HEADER] = str(count)
+    return page, headers
@@ -0,0 +1,44 @@
+# backend/app/core/preconditions.py
+from datetime import datetime, timezone
+from typing import List, Optional
+
+# Entity tags are the row's updated_at in epoch microseconds, which is exactly
+# what Postgres stores, so an If-Match check is a plain equality in the UPDATE
+
+ETAG_HEADER = "ETag"
+
+
+class PreconditionFailedError(Exception):
+    """The row exists but its updated_at matches none of the If-Match tags"""
+
+
+def etag_for(updated_at: datetime) -> str:
+    delta = updated_at - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f'"{micros}"'
+
+
+def etag_headers(updated_at: datetime) -> dict:
+    return {ETAG_HEADER: etag_for(updated_at)}
+
+
+def parse_if_match(header: Optional[str]) -> Optional[List[datetime]]:
+    """Versions accepted by an If-Match header; None when absent or "*".
+
+    Tags that are not ours can never match, so they are dropped; a header
+    with no usable tags yields an empty list and the write fails with 412.
+    """
+    if header is None or header.strip() == "*":
+        return None
+    versions = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            continue  # weak tags never satisfy If-Match
+        try:
+            micros = int(tag.strip('"'))
+        except ValueError:
+            continue
+        versions.append(datetime.fromtimestamp(micros // 1_000_000, tz=timezone.utc).replace(
+            microsecond=micros % 1_000_000))
+    return versions
@@ -0,0 +1,35 @@
+# backend/app/core/serialization.py
+from typing import Any, Dict, Mapping, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+# One adapter per response type; building a TypeAdapter compiles a schema,
+# so they are created on first use and reused for every request after that.
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+class PydanticJSONResponse(Response):
+    """JSON response whose body has already been encoded by pydantic-core"""
+    media_type = "application/json"
+
+
+def get_adapter(response_type: Any) -> TypeAdapter:
+    """Return the cached TypeAdapter for a response schema or List[...] of one"""
+    adapter = _adapters.get(response_type)
+    if adapter is None:
+        adapter = _adapters[response_type] = TypeAdapter(response_type)
+    return adapter
+
+
+def render(response_type: Any, content: Any, status_code: int = 200,
+           headers: Optional[Mapping[str, str]] = None) -> PydanticJSONResponse:
+    """Validate ORM objects or row dicts once and encode them straight to JSON bytes.
+
+    Returning a Response from an endpoint makes FastAPI skip its own
+    response_model validation and jsonable_encoder pass, so the
+    response_model on the route is only used for the OpenAPI schema.
+    """
+    adapter = get_adapter(response_type)
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+    return PydanticJSONResponse(body, status_code=status_code, headers=headers)
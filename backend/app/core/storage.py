@@ -0,0 +1,173 @@
+# backend/app/core/storage.py
+import hashlib
+import os
+import re
+import uuid
+from abc import ABC, abstractmethod
+from typing import AsyncIterable, NamedTuple, Optional
+
+import aiofiles
+import aiofiles.os
+
+from .config import settings
+
+# Leading bytes of the image formats we accept, mapped to (content type, extension)
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+)
+_SNIFF_BYTES = 12
+_CONTENT_KEY = re.compile(r"([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})\.[a-z]+")
+
+
+class UploadTooLargeError(ValueError):
+    """Raised while streaming once an upload exceeds the size limit"""
+
+
+class UnsupportedMediaTypeError(ValueError):
+    """Raised when the first bytes of an upload are not a supported image"""
+
+
+class StoredFile(NamedTuple):
+    key: str
+    sha256: str
+    size: int
+    content_type: str
+    deduplicated: bool
+
+
+def sniff_image(head: bytes) -> Optional[tuple]:
+    """Return (content type, extension) for the image format head starts with"""
+    for signature, content_type, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    return None
+
+
+def content_key(sha256: str, extension: str) -> str:
+    """Storage key of a blob: its hash, fanned out over two directory levels"""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def key_sha256(key: str) -> Optional[str]:
+    """The SHA-256 a content key was derived from, or None if key is not one"""
+    match = _CONTENT_KEY.fullmatch(key)
+    return match.group(3) if match else None
+
+
+class ContentDigest:
+    """Hashes, sizes and sniffs a byte stream one chunk at a time"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b""
+        self.kind: Optional[tuple] = None
+        self._hash = hashlib.sha256()
+
+    def update(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds {self.max_bytes} bytes")
+        if self.kind is None:
+            self.head = (self.head + chunk)[:_SNIFF_BYTES]
+            if len(self.head) == _SNIFF_BYTES:
+                self._check_kind()
+        self._hash.update(chunk)
+
+    def _check_kind(self) -> None:
+        self.kind = sniff_image(self.head)
+        if self.kind is None:
+            raise UnsupportedMediaTypeError("Only JPEG, PNG and WebP images are accepted")
+
+    def finish(self) -> str:
+        """Validate a short stream too and return the hex digest"""
+        if self.kind is None:
+            self._check_kind()
+        return self._hash.hexdigest()
+
+
+class StorageBackend(ABC):
+    """Content-addressed blob store: a blob's key is derived from its SHA-256,
+    so storing the same bytes twice keeps one copy.
+
+    Implementations must stream in store: an upload is never held in memory whole.
+    """
+
+    @abstractmethod
+    async def store(self, chunks: AsyncIterable[bytes], max_bytes: int) -> StoredFile:
+        """Consume chunks into the store, returning where the content lives"""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether a blob with this key is stored"""
+
+    @abstractmethod
+    async def read(self, key: str) -> bytes:
+        """The whole blob, for consumers such as image decoders that need it all;
+        raises FileNotFoundError for unknown keys"""
+
+    def local_path(self, key: str) -> Optional[str]:
+        """A filesystem path other processes can open the blob at, or None if
+        the backend has none and the blob must be read"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Blobs as files under a root directory; uploads land in root/.tmp first
+    and are renamed into place, so a key never points at a partial file."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, ".tmp")
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    async def exists(self, key: str) -> bool:
+        return await aiofiles.os.path.exists(self.path(key))
+
+    async def read(self, key: str) -> bytes:
+        async with aiofiles.open(self.local_path(key), "rb") as blob:
+            return await blob.read()
+
+    def local_path(self, key: str) -> str:
+        # Keys come from clients (Diagnosis.image_path): only blobs store()
+        # wrote, never partial uploads in .tmp or other files under the root
+        if key_sha256(key) is None or not os.path.isfile(self.path(key)):
+            raise FileNotFoundError(key)
+        return self.path(key)
+
+    async def store(self, chunks: AsyncIterable[bytes], max_bytes: int) -> StoredFile:
+        await aiofiles.os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        digest = ContentDigest(max_bytes)
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    await out.write(chunk)
+            sha256 = digest.finish()
+            content_type, extension = digest.kind
+            key = content_key(sha256, extension)
+            deduplicated = await self.exists(key)
+            if not deduplicated:
+                await aiofiles.os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+                # Atomic; a concurrent upload of the same bytes just replaces identical content
+                await aiofiles.os.replace(tmp_path, self.path(key))
+        finally:
+            if await aiofiles.os.path.exists(tmp_path):
+                await aiofiles.os.remove(tmp_path)
+        return StoredFile(key, sha256, digest.size, content_type, deduplicated)
+
+
+def create_storage(backend: str, root: str) -> StorageBackend:
+    """Build the configured storage backend"""
+    if backend == "local":
+        return LocalStorage(root)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+storage = create_storage(settings.STORAGE_BACKEND, settings.UPLOAD_DIR)
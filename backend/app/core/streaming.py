@@ -0,0 +1,138 @@
+# backend/app/core/streaming.py
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.types import Receive, Scope, Send
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class LineTooLongError(ValueError):
+    """Raised by iter_lines when a line exceeds the configured limit"""
+
+
+class MultipartFieldError(ValueError):
+    """Raised by iter_multipart_field when the body has no usable field"""
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def ndjson_line(obj: Any) -> bytes:
+    """Encode one JSON-serializable object as an NDJSON line"""
+    return json.dumps(obj, separators=(",", ":"), default=_json_default).encode() + b"\n"
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Tuple[int, bytes]]:
+    """Split a byte stream into (line number, line) pairs without buffering the whole body.
+
+    Only the current partial line is kept in memory; a line longer than
+    max_line_bytes raises LineTooLongError instead of growing the buffer.
+    """
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if len(line) > max_line_bytes:
+                raise LineTooLongError(f"Line {line_number} exceeds {max_line_bytes} bytes")
+            yield line_number, line
+        if len(buffer) > max_line_bytes:
+            raise LineTooLongError(f"Line {line_number + 1} exceeds {max_line_bytes} bytes")
+    if buffer:
+        yield line_number + 1, buffer
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """Streaming response whose generator is still reading the request body.
+
+    StreamingResponse normally listens on receive() for a client disconnect
+    while it streams, which would swallow the body chunks the generator is
+    consuming. This variant only sends, so request.stream() keeps working;
+    a disconnect still surfaces as an error on the next send.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+class _FieldCollector:
+    """MultipartParser callbacks that keep only the data of one named field"""
+
+    def __init__(self, field: str):
+        self.field = field.encode()
+        self.pending: List[bytes] = []
+        self.headers: Dict[bytes, bytes] = {}
+        self.header_field = b""
+        self.header_value = b""
+        self.in_field = False
+        self.found = False
+        self.done = False
+
+    def callbacks(self) -> Dict[str, Any]:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": lambda data, start, end: self._append("header_field", data[start:end]),
+            "on_header_value": lambda data, start, end: self._append("header_value", data[start:end]),
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def _append(self, name: str, data: bytes) -> None:
+        setattr(self, name, getattr(self, name) + data)
+
+    def on_part_begin(self) -> None:
+        self.headers = {}
+
+    def on_header_end(self) -> None:
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = self.header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, params = parse_options_header(self.headers.get(b"content-disposition", b""))
+        self.in_field = not self.found and params.get(b"name") == self.field
+        self.found = self.found or self.in_field
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self.in_field:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self) -> None:
+        if self.in_field:
+            self.in_field = False
+            self.done = True
+
+
+async def iter_multipart_field(chunks: AsyncIterator[bytes], content_type: str,
+                               field: str) -> AsyncIterator[bytes]:
+    """Yield the bytes of one multipart/form-data field as the body streams in.
+
+    Unlike Starlette's form parsing, nothing is spooled: data is passed on
+    chunk by chunk, and reading stops as soon as the field has ended.
+    """
+    _, params = parse_options_header(content_type)
+    boundary: Optional[bytes] = params.get(b"boundary")
+    if not boundary:
+        raise MultipartFieldError("Missing multipart boundary")
+    collector = _FieldCollector(field)
+    parser = MultipartParser(boundary, collector.callbacks())
+    async for chunk in chunks:
+        parser.write(chunk)
+        if collector.pending:
+            data, collector.pending = b"".join(collector.pending), []
+            yield data
+        if collector.done:
+            return
+    raise MultipartFieldError(f"No complete '{field}' field in the form")
@@ -1,18 +1,43 @@
-from fastapi import FastAPI
+import asyncio
+import math
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 
-from .core.database import init_db, close_db
-from .routers import users, plants, diagnoses
+from .core.cache import entity_cache
+from .core.database import init_db, close_db, pool_stats
+from .core.config import settings
+from .core.db_pool import PoolTimeoutError
+from .core.db_router import SAFE_METHODS, pin_request, unpin_request
+from .core.preconditions import PreconditionFailedError
+from .core.metrics import metrics_response
+from .services.diagnosis_engine import InferenceOverloadedError, diagnosis_engine, load_configured_model
+from .services.model_registry import load_model_registry
+from .services.thumbnails import thumbnails
+from .routers import users, plants, diagnoses, exports, uploads, images
 
 # Database lifecycle management
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    await entity_cache.start()
+    if settings.INFERENCE_SOCKET:
+        await diagnosis_engine.connect(settings.INFERENCE_SOCKET)
+    elif settings.MODEL_REGISTRY_PATH:
+        diagnosis_engine.start_registry(load_model_registry(settings.MODEL_REGISTRY_PATH,
+                                                            settings.MODEL_REGISTRY_MAX_BYTES))
+    elif settings.MODEL_PATH:
+        diagnosis_engine.start(await asyncio.to_thread(load_configured_model))
+    thumbnails.start()
     print("🌱 Plant Health API Started!")
     yield
     # Shutdown
+    await diagnosis_engine.stop()
+    thumbnails.stop()
+    await entity_cache.stop()
     await close_db()
     print("🌱 Plant Health API Stopped!")
 
@@ -31,12 +56,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Server-Timing"],
 )
 
+@app.middleware("http")
+async def pin_writes_to_primary(request: Request, call_next):
+    """Route this request's reads to the primary after a write in the same session"""
+    token = pin_request(request.method, request.cookies.get(settings.REPLICA_PIN_COOKIE))
+    try:
+        response = await call_next(request)
+    finally:
+        unpin_request(token)
+    if settings.DATABASE_REPLICA_URL and request.method not in SAFE_METHODS and response.status_code < 400:
+        pinned_until = time.time() + settings.REPLICA_PIN_SECONDS
+        response.set_cookie(settings.REPLICA_PIN_COOKIE, f"{pinned_until:.3f}",
+                            max_age=math.ceil(settings.REPLICA_PIN_SECONDS), httponly=True, samesite="lax")
+    return response
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    # Fail fast instead of queueing behind a saturated pool
+    return JSONResponse(status_code=503, content={"detail": "Database busy, retry shortly"},
+                        headers={"Retry-After": "1"})
+
+@app.exception_handler(InferenceOverloadedError)
+async def inference_overloaded_handler(request: Request, exc: InferenceOverloadedError):
+    return JSONResponse(status_code=503, content={"detail": "Diagnosis queue is full, retry shortly"},
+                        headers={"Retry-After": "1"})
+
+@app.exception_handler(PreconditionFailedError)
+async def precondition_failed_handler(request: Request, exc: PreconditionFailedError):
+    return JSONResponse(status_code=412, content={"detail": "Resource was modified; fetch it again and retry"})
+
 # Include routers
 app.include_router(users.router, prefix="/api")
 app.include_router(plants.router, prefix="/api")
 app.include_router(diagnoses.router, prefix="/api")
+app.include_router(exports.router, prefix="/api")
+app.include_router(uploads.router)
+app.include_router(images.router)
 
 @app.get("/")
 async def root():
@@ -51,5 +109,14 @@ async def health_check():
         "status": "healthy",
         "service": "plant-health-api",
         "version": "1.0.0",
-        "database": db_status
-    }
\ No newline at end of file
+        "database": db_status,
+        "cache": entity_cache.stats,
+        "db_pool": pool_stats() if Tortoise._inited else {},
+        "diagnosis_model": diagnosis_engine.model.version if diagnosis_engine.model is not None else None,
+        "model_registry": diagnosis_engine.registry.stats if diagnosis_engine.registry is not None else {},
+        "inference_cache": diagnosis_engine.cache.stats if diagnosis_engine.cache is not None else {}
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
\ No newline at end of file
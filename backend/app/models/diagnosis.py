@@ -19,11 +19,18 @@ class Diagnosis(Model):
     # Additional metadata
     notes = fields.TextField(null=True)
     is_healthy = fields.BooleanField(default=False)
+    model_version = fields.CharField(max_length=100, null=True)  # set when diagnosed server-side
     
     created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)  # ETag for If-Match updates
     
     class Meta:
         table = "diagnoses"
+        # Keyset pagination order, see app/core/pagination.py; the plant_id
+        # variant also serves per-plant lists and health summary rebuilds, the
+        # disease_name variant the disease filter. Partial indexes for the
+        # is_healthy filter live in migrations/models/2_*.
+        indexes = (("created_at", "id"), ("plant_id", "created_at", "id"), ("disease_name", "created_at", "id"))
     
     def __str__(self):
         return f"Diagnosis({self.disease_name} - {self.confidence_score:.2f})"
\ No newline at end of file
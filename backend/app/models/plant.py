@@ -14,11 +14,23 @@ class Plant(Model):
         on_delete=fields.CASCADE
     )
     
+    # Health summary, maintained by PlantHealthService alongside every
+    # diagnosis write so dashboards never aggregate diagnoses at read time
+    diagnosis_count = fields.IntField(default=0)
+    health_score = fields.FloatField(null=True)  # rolling 0.0 (sick) to 1.0 (healthy)
+    last_diagnosis_at = fields.DatetimeField(null=True)
+    last_disease_name = fields.CharField(max_length=200, null=True)
+    last_confidence_score = fields.FloatField(null=True)
+    last_is_healthy = fields.BooleanField(null=True)
+    
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
     
     class Meta:
         table = "plants"
+        # Keyset pagination order, see app/core/pagination.py; the user_id
+        # variant serves per-user plant lists
+        indexes = (("created_at", "id"), ("user_id", "created_at", "id"))
     
     def __str__(self):
         return f"Plant({self.name} - {self.species})"
\ No newline at end of file
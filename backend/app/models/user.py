@@ -10,6 +10,8 @@ class User(Model):
     
     class Meta:
         table = "users"
+        # Keyset pagination order, see app/core/pagination.py
+        indexes = (("created_at", "id"),)
     
     def __str__(self):
         return f"User({self.email})"
\ No newline at end of file
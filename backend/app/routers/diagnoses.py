@@ -1,6 +1,17 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
-from app.schemas.diagnosis import DiagnosisCreate, DiagnosisUpdate, DiagnosisResponse
+import json
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from typing import List, Optional
+from app.core.archives import ArchiveError, open_archive
+from app.core.counters import CountMode
+from app.core.pagination import fetch_page, parse_cursor
+from app.core.config import settings
+from app.core.preconditions import etag_headers, parse_if_match
+from app.core.serialization import render
+from app.core.streaming import NDJSON_MEDIA_TYPE, DuplexStreamingResponse, iter_lines, ndjson_line
+from app.schemas.bulk import BulkCreateResponse
+from app.schemas.diagnosis import DiagnosisAnalyze, DiagnosisCreate, DiagnosisUpdate, DiagnosisResponse
+from app.services.diagnosis_engine import ModelNotLoadedError, diagnosis_engine
+from app.services.preprocessing import ImageDecodeError, ImageTooLargeError
 from app.services.diagnosis_service import DiagnosisService
 
 router = APIRouter(prefix="/diagnoses", tags=["diagnoses"])
@@ -11,13 +22,95 @@ async def create_diagnosis(diagnosis: DiagnosisCreate):
     created_diagnosis = await DiagnosisService.create_diagnosis(diagnosis)
     if not created_diagnosis:
         raise HTTPException(status_code=400, detail="Plant not found or invalid data")
-    return DiagnosisResponse.model_validate(created_diagnosis)
+    return render(DiagnosisResponse, created_diagnosis)
+
+@router.post("/analyze", response_model=DiagnosisResponse)
+async def analyze_diagnosis(analyze: DiagnosisAnalyze):
+    """Diagnose an uploaded image (image_path from POST /upload) with the model and store the result.
+
+    Server-Timing reports the time spent in each preprocessing stage and in inference.
+    """
+    timings = {}
+    try:
+        created_diagnosis = await DiagnosisService.analyze_diagnosis(analyze, timings)
+    except ModelNotLoadedError:
+        raise HTTPException(status_code=503, detail="Diagnosis model is not available")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found; upload it first")
+    except ImageTooLargeError as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except ImageDecodeError:
+        raise HTTPException(status_code=415, detail="Image could not be decoded")
+    if not created_diagnosis:
+        raise HTTPException(status_code=404, detail="Plant not found")
+    server_timing = ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items())
+    return render(DiagnosisResponse, created_diagnosis, headers={"Server-Timing": server_timing})
+
+@router.post("/analyze/archive")
+async def analyze_archive(request: Request, plant_id: Optional[int] = Query(None),
+                          plants: Optional[str] = Query(None)):
+    """Diagnose every image in a zip, tar or tar.gz body, streaming NDJSON results as they finish.
+
+    Images are assigned to plants by plants, a JSON object mapping member
+    paths or top-level directories to plant ids, falling back to plant_id.
+    Each line is a DiagnosisResponse plus the member "name", or
+    {"name", "error"} for an image that failed; the last is a summary.
+    """
+    try:
+        mapping = json.loads(plants) if plants else {}
+        valid = isinstance(mapping, dict) and all(type(value) is int for value in mapping.values())
+    except ValueError:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="plants must be a JSON object of plant ids")
+    if not mapping and plant_id is None:
+        raise HTTPException(status_code=400, detail="Pass plant_id or plants")
+    plant_ids = set(mapping.values()) | ({plant_id} if plant_id is not None else set())
+    plant_info = await DiagnosisService.archive_plants(plant_ids)
+    if missing := plant_ids - plant_info.keys():
+        raise HTTPException(status_code=404, detail=f"Plant not found: {', '.join(map(str, sorted(missing)))}")
+    if not diagnosis_engine.loaded:
+        raise HTTPException(status_code=503, detail="Diagnosis model is not available")
+    try:
+        _, members = await open_archive(request.stream(), settings.UPLOAD_MAX_BYTES)
+    except ArchiveError as exc:
+        raise HTTPException(status_code=415, detail=str(exc))
+    results = DiagnosisService.analyze_archive(members, mapping, plant_id, plant_info)
+    return DuplexStreamingResponse((ndjson_line(r) async for r in results), media_type=NDJSON_MEDIA_TYPE)
+
+@router.post("/bulk", response_model=BulkCreateResponse)
+async def bulk_create_diagnoses(diagnoses: List[DiagnosisCreate]):
+    """Create many diagnoses in one transaction, reporting success or failure per item"""
+    if len(diagnoses) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BULK_MAX_ITEMS} items per request")
+    result = await DiagnosisService.bulk_create_diagnoses(diagnoses)
+    return render(BulkCreateResponse, result)
+
+@router.post("/ingest")
+async def ingest_diagnoses(request: Request):
+    """Stream NDJSON diagnoses (one DiagnosisCreate per line), inserting in fixed-size chunks.
+
+    The response is NDJSON too: one progress record per chunk, then a summary.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type != NDJSON_MEDIA_TYPE:
+        raise HTTPException(status_code=415, detail=f"Expected {NDJSON_MEDIA_TYPE}")
+    lines = iter_lines(request.stream(), settings.INGEST_MAX_LINE_BYTES)
+    progress = DiagnosisService.ingest_diagnoses(lines, settings.INGEST_CHUNK_SIZE)
+    return DuplexStreamingResponse((ndjson_line(p) async for p in progress), media_type=NDJSON_MEDIA_TYPE)
 
 @router.get("/", response_model=List[DiagnosisResponse])
-async def get_diagnoses(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
-    """Get all diagnoses with pagination"""
-    diagnoses = await DiagnosisService.get_all_diagnoses(skip=skip, limit=limit)
-    return [DiagnosisResponse.model_validate(diagnosis) for diagnosis in diagnoses]
+async def get_diagnoses(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000),
+                        cursor: Optional[str] = Query(None),
+                        total: Optional[CountMode] = Query(None),
+                        is_healthy: Optional[bool] = Query(None), disease_name: Optional[str] = Query(None)):
+    """Get all diagnoses with pagination (pass X-Next-Cursor back as cursor for the next page)"""
+    diagnoses, headers = await fetch_page(
+        DiagnosisService.get_all_diagnoses(skip=skip, limit=limit, cursor=parse_cursor(cursor),
+                                           is_healthy=is_healthy, disease_name=disease_name), limit,
+        DiagnosisService.get_diagnoses_count(total, is_healthy, disease_name) if total else None
+    )
+    return render(List[DiagnosisResponse], diagnoses, headers=headers)
 
 @router.get("/{diagnosis_id}", response_model=DiagnosisResponse)
 async def get_diagnosis(diagnosis_id: int):
@@ -25,32 +118,46 @@ async def get_diagnosis(diagnosis_id: int):
     diagnosis = await DiagnosisService.get_diagnosis_by_id(diagnosis_id)
     if not diagnosis:
         raise HTTPException(status_code=404, detail="Diagnosis not found")
-    return DiagnosisResponse.model_validate(diagnosis)
+    return render(DiagnosisResponse, diagnosis, headers=etag_headers(diagnosis.updated_at))
 
 @router.put("/{diagnosis_id}", response_model=DiagnosisResponse)
-async def update_diagnosis(diagnosis_id: int, diagnosis_update: DiagnosisUpdate):
-    """Update diagnosis by ID"""
-    updated_diagnosis = await DiagnosisService.update_diagnosis(diagnosis_id, diagnosis_update)
+async def update_diagnosis(diagnosis_id: int, diagnosis_update: DiagnosisUpdate, if_match: Optional[str] = Header(None)):
+    """Update diagnosis by ID (send the ETag back as If-Match to reject concurrent edits with 412)"""
+    updated_diagnosis = await DiagnosisService.update_diagnosis(diagnosis_id, diagnosis_update, parse_if_match(if_match))
     if not updated_diagnosis:
         raise HTTPException(status_code=404, detail="Diagnosis not found")
-    return DiagnosisResponse.model_validate(updated_diagnosis)
+    return render(DiagnosisResponse, updated_diagnosis, headers=etag_headers(updated_diagnosis["updated_at"]))
 
 @router.delete("/{diagnosis_id}")
-async def delete_diagnosis(diagnosis_id: int):
-    """Delete diagnosis by ID"""
-    success = await DiagnosisService.delete_diagnosis(diagnosis_id)
+async def delete_diagnosis(diagnosis_id: int, if_match: Optional[str] = Header(None)):
+    """Delete diagnosis by ID, optionally only if it still matches If-Match"""
+    success = await DiagnosisService.delete_diagnosis(diagnosis_id, parse_if_match(if_match))
     if not success:
         raise HTTPException(status_code=404, detail="Diagnosis not found")
     return {"message": "Diagnosis deleted successfully"}
 
 @router.get("/plant/{plant_id}", response_model=List[DiagnosisResponse])
-async def get_diagnoses_by_plant(plant_id: int, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+async def get_diagnoses_by_plant(plant_id: int, skip: int = Query(0, ge=0),
+                                 limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = Query(None),
+                                 total: Optional[CountMode] = Query(None),
+                                 is_healthy: Optional[bool] = Query(None), disease_name: Optional[str] = Query(None)):
     """Get all diagnoses for a specific plant"""
-    diagnoses = await DiagnosisService.get_diagnoses_by_plant(plant_id, skip=skip, limit=limit)
-    return [DiagnosisResponse.model_validate(diagnosis) for diagnosis in diagnoses]
+    diagnoses, headers = await fetch_page(
+        DiagnosisService.get_diagnoses_by_plant(plant_id, skip=skip, limit=limit, cursor=parse_cursor(cursor),
+                                                is_healthy=is_healthy, disease_name=disease_name), limit,
+        DiagnosisService.get_diagnoses_count_by_plant(plant_id, total, is_healthy, disease_name) if total else None
+    )
+    return render(List[DiagnosisResponse], diagnoses, headers=headers)
 
 @router.get("/user/{user_id}", response_model=List[DiagnosisResponse])
-async def get_diagnoses_by_user(user_id: int, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+async def get_diagnoses_by_user(user_id: int, skip: int = Query(0, ge=0),
+                                limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = Query(None),
+                                total: Optional[CountMode] = Query(None),
+                                is_healthy: Optional[bool] = Query(None), disease_name: Optional[str] = Query(None)):
     """Get all diagnoses for a specific user"""
-    diagnoses = await DiagnosisService.get_diagnoses_by_user(user_id, skip=skip, limit=limit)
-    return [DiagnosisResponse.model_validate(diagnosis) for diagnosis in diagnoses]
\ No newline at end of file
+    diagnoses, headers = await fetch_page(
+        DiagnosisService.get_diagnoses_by_user(user_id, skip=skip, limit=limit, cursor=parse_cursor(cursor),
+                                               is_healthy=is_healthy, disease_name=disease_name), limit,
+        DiagnosisService.get_diagnoses_count_by_user(user_id, total, is_healthy, disease_name) if total else None
+    )
+    return render(List[DiagnosisResponse], diagnoses, headers=headers)
\ No newline at end of file
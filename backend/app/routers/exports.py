@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from typing import Literal
+from app.core.streaming import NDJSON_MEDIA_TYPE
+from app.services.export_service import EXPORT_FIELDS, ExportService
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+@router.get("/users/{user_id}/{kind}")
+async def export_user_rows(user_id: int, kind: Literal["diagnoses", "plants"],
+                           format: Literal["ndjson", "csv"] = Query("ndjson")):
+    """Stream every diagnosis or plant of a user as NDJSON or CSV"""
+    batches = ExportService.stream_user_rows(kind, user_id)
+    if format == "csv":
+        body = ExportService.encode_csv(batches, EXPORT_FIELDS[kind])
+        media_type = "text/csv"
+    else:
+        body = ExportService.encode_ndjson(batches)
+        media_type = NDJSON_MEDIA_TYPE
+    filename = f"user_{user_id}_{kind}.{format}"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
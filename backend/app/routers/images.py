@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
+from typing import Optional
+from app.core.config import settings
+from app.core.metrics import THUMBNAIL_REQUESTS
+from app.core.storage import key_sha256
+from app.services.preprocessing import ImageDecodeError
+from app.services.thumbnails import FORMATS, thumbnails, width_bucket
+
+# Mounted at the root like /upload; nginx caches /images responses itself
+router = APIRouter(prefix="/images", tags=["images"])
+
+# Derivatives are named by content, so a URL's response never changes
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{image_path:path}")
+async def get_image(image_path: str, request: Request, w: Optional[int] = Query(None, ge=1),
+                    format: Optional[str] = Query(None, pattern="^(webp|jpeg)$"),
+                    if_none_match: Optional[str] = Header(None)):
+    """A stored image (image_path from POST /upload) at most w pixels wide, as WebP or JPEG.
+
+    w is rounded up to one of THUMBNAIL_WIDTHS (default the largest), so a
+    few derivatives serve every layout. Without format, WebP goes to clients
+    whose Accept header allows it and JPEG to the rest.
+    """
+    sha256 = key_sha256(image_path)
+    if sha256 is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    fmt = format or ("webp" if "image/webp" in request.headers.get("accept", "") else "jpeg")
+    width = width_bucket(w or max(settings.THUMBNAIL_WIDTHS), settings.THUMBNAIL_WIDTHS)
+    etag = thumbnails.etag(sha256, width, fmt)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if format is None:
+        headers["Vary"] = "Accept"
+    if if_none_match is not None and (if_none_match.strip() == "*" or etag in
+                                      (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+        THUMBNAIL_REQUESTS.labels("not_modified").inc()
+        return Response(status_code=304, headers=headers)
+    try:
+        path = await thumbnails.get(image_path, width, fmt)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    except ImageDecodeError as exc:
+        raise HTTPException(status_code=422, detail=f"Image cannot be resized: {exc}")
+    return FileResponse(path, media_type=FORMATS[fmt][0], headers=headers)
@@ -1,6 +1,12 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
-from app.schemas.plant import PlantCreate, PlantUpdate, PlantResponse
+from fastapi import APIRouter, Header, HTTPException, Query
+from typing import List, Optional
+from app.core.counters import CountMode
+from app.core.pagination import fetch_page, parse_cursor
+from app.core.config import settings
+from app.core.preconditions import etag_headers, parse_if_match
+from app.core.serialization import render
+from app.schemas.bulk import BulkCreateResponse
+from app.schemas.plant import PlantCreate, PlantUpdate, PlantResponse, PlantHealthResponse
 from app.services.plant_service import PlantService
 
 router = APIRouter(prefix="/plants", tags=["plants"])
@@ -11,13 +17,26 @@ async def create_plant(plant: PlantCreate):
     created_plant = await PlantService.create_plant(plant)
     if not created_plant:
         raise HTTPException(status_code=400, detail="User not found or invalid data")
-    return PlantResponse.model_validate(created_plant)
+    return render(PlantResponse, created_plant)
+
+@router.post("/bulk", response_model=BulkCreateResponse)
+async def bulk_create_plants(plants: List[PlantCreate]):
+    """Create many plants in one transaction, reporting success or failure per item"""
+    if len(plants) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BULK_MAX_ITEMS} items per request")
+    result = await PlantService.bulk_create_plants(plants)
+    return render(BulkCreateResponse, result)
 
 @router.get("/", response_model=List[PlantResponse])
-async def get_plants(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
-    """Get all plants with pagination"""
-    plants = await PlantService.get_all_plants(skip=skip, limit=limit)
-    return [PlantResponse.model_validate(plant) for plant in plants]
+async def get_plants(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000),
+                     cursor: Optional[str] = Query(None),
+                     total: Optional[CountMode] = Query(None)):
+    """Get all plants with pagination (pass X-Next-Cursor back as cursor for the next page)"""
+    plants, headers = await fetch_page(
+        PlantService.get_all_plants(skip=skip, limit=limit, cursor=parse_cursor(cursor)), limit,
+        PlantService.get_plants_count(total) if total else None
+    )
+    return render(List[PlantResponse], plants, headers=headers)
 
 @router.get("/{plant_id}", response_model=PlantResponse)
 async def get_plant(plant_id: int):
@@ -25,26 +44,42 @@ async def get_plant(plant_id: int):
     plant = await PlantService.get_plant_by_id(plant_id)
     if not plant:
         raise HTTPException(status_code=404, detail="Plant not found")
-    return PlantResponse.model_validate(plant)
+    return render(PlantResponse, plant, headers=etag_headers(plant.updated_at))
 
 @router.put("/{plant_id}", response_model=PlantResponse)
-async def update_plant(plant_id: int, plant_update: PlantUpdate):
-    """Update plant by ID"""
-    updated_plant = await PlantService.update_plant(plant_id, plant_update)
+async def update_plant(plant_id: int, plant_update: PlantUpdate, if_match: Optional[str] = Header(None)):
+    """Update plant by ID (send the ETag back as If-Match to reject concurrent edits with 412)"""
+    updated_plant = await PlantService.update_plant(plant_id, plant_update, parse_if_match(if_match))
     if not updated_plant:
         raise HTTPException(status_code=404, detail="Plant not found")
-    return PlantResponse.model_validate(updated_plant)
+    return render(PlantResponse, updated_plant, headers=etag_headers(updated_plant["updated_at"]))
 
 @router.delete("/{plant_id}")
-async def delete_plant(plant_id: int):
-    """Delete plant by ID"""
-    success = await PlantService.delete_plant(plant_id)
+async def delete_plant(plant_id: int, if_match: Optional[str] = Header(None)):
+    """Delete plant by ID, optionally only if it still matches If-Match"""
+    success = await PlantService.delete_plant(plant_id, parse_if_match(if_match))
     if not success:
         raise HTTPException(status_code=404, detail="Plant not found")
     return {"message": "Plant deleted successfully"}
 
 @router.get("/user/{user_id}", response_model=List[PlantResponse])
-async def get_plants_by_user(user_id: int, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+async def get_plants_by_user(user_id: int, skip: int = Query(0, ge=0),
+                             limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = Query(None),
+                             total: Optional[CountMode] = Query(None)):
     """Get all plants for a specific user"""
-    plants = await PlantService.get_plants_by_user(user_id, skip=skip, limit=limit)
-    return [PlantResponse.model_validate(plant) for plant in plants]
\ No newline at end of file
+    plants, headers = await fetch_page(
+        PlantService.get_plants_by_user(user_id, skip=skip, limit=limit, cursor=parse_cursor(cursor)), limit,
+        PlantService.get_plants_count_by_user(user_id, total) if total else None
+    )
+    return render(List[PlantResponse], plants, headers=headers)
+
+@router.get("/user/{user_id}/health", response_model=List[PlantHealthResponse])
+async def get_plant_health_by_user(user_id: int, skip: int = Query(0, ge=0),
+                                   limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = Query(None),
+                                   total: Optional[CountMode] = Query(None)):
+    """Get a user's plants with latest diagnosis, diagnosis count and health score"""
+    plants, headers = await fetch_page(
+        PlantService.get_plant_health_by_user(user_id, skip=skip, limit=limit, cursor=parse_cursor(cursor)), limit,
+        PlantService.get_plants_count_by_user(user_id, total) if total else None
+    )
+    return render(List[PlantHealthResponse], plants, headers=headers)
\ No newline at end of file
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Request
+from app.core.config import settings
+from app.core.metrics import UPLOAD_BYTES, UPLOADS
+from app.core.serialization import render
+from app.core.storage import UnsupportedMediaTypeError, UploadTooLargeError, storage
+from app.core.streaming import MultipartFieldError, iter_multipart_field
+from app.schemas.upload import UploadResponse
+
+# Mounted at the root, not under /api: nginx proxies /upload straight through
+router = APIRouter(prefix="/upload", tags=["uploads"])
+
+@router.post("", response_model=UploadResponse, status_code=201, responses={200: {"model": UploadResponse}})
+async def upload_image(request: Request):
+    """Store an image (multipart "file" field or a raw image/* body), streaming it to disk.
+
+    Files are stored by SHA-256, so re-uploading the same bytes returns the
+    existing image_path with 200 instead of 201.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        chunks = iter_multipart_field(request.stream(), content_type, "file")
+    elif content_type.startswith("image/"):
+        chunks = request.stream()
+    else:
+        raise HTTPException(status_code=415, detail="Send multipart/form-data with a file field or an image/* body")
+    try:
+        stored = await storage.store(chunks, settings.UPLOAD_MAX_BYTES)
+    except UploadTooLargeError as exc:
+        UPLOADS.labels("too_large").inc()
+        raise HTTPException(status_code=413, detail=str(exc))
+    except UnsupportedMediaTypeError as exc:
+        UPLOADS.labels("unsupported").inc()
+        raise HTTPException(status_code=415, detail=str(exc))
+    except MultipartFieldError as exc:
+        UPLOADS.labels("malformed").inc()
+        raise HTTPException(status_code=400, detail=str(exc))
+    UPLOADS.labels("deduplicated" if stored.deduplicated else "stored").inc()
+    UPLOAD_BYTES.inc(stored.size)
+    return render(UploadResponse, {**stored._asdict(), "image_path": stored.key},
+                  status_code=200 if stored.deduplicated else 201)
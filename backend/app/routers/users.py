@@ -1,26 +1,44 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from fastapi import APIRouter, Header, HTTPException, Query
+from typing import List, Optional
+from app.core.counters import CountMode
+from app.core.pagination import fetch_page, parse_cursor
+from app.core.preconditions import etag_headers, parse_if_match
+from app.core.serialization import render
+from app.schemas.overview import UserOverviewResponse
 from app.schemas.user import UserCreate, UserUpdate, UserResponse
-from app.services.user_service import UserService
+from app.services.overview_service import OverviewService
+from app.services.user_service import DuplicateEmailError, UserService
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.post("/", response_model=UserResponse)
 async def create_user(user: UserCreate):
     """Create a new user"""
-    # Check if user already exists
-    existing_user = await UserService.get_user_by_email(user.email)
-    if existing_user:
-        raise HTTPException(status_code=400, detail="User with this email already exists")
-    
+    # The unique index on email is the check, so concurrent signups cannot race
     created_user = await UserService.create_user(user)
-    return UserResponse.model_validate(created_user)
+    if not created_user:
+        raise HTTPException(status_code=400, detail="User with this email already exists")
+    return render(UserResponse, created_user)
+
+@router.post("/get-or-create", response_model=UserResponse, responses={201: {"model": UserResponse}})
+async def get_or_create_user(user: UserCreate):
+    """Return the user with this email, creating it first if needed (201 when created).
+
+    Idempotent, so onboarding jobs can safely retry; an existing user's name is left as is.
+    """
+    found_user, created = await UserService.get_or_create_user(user)
+    return render(UserResponse, found_user, status_code=201 if created else 200)
 
 @router.get("/", response_model=List[UserResponse])
-async def get_users(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
-    """Get all users with pagination"""
-    users = await UserService.get_all_users(skip=skip, limit=limit)
-    return [UserResponse.model_validate(user) for user in users]
+async def get_users(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000),
+                    cursor: Optional[str] = Query(None),
+                    total: Optional[CountMode] = Query(None)):
+    """Get all users with pagination (pass X-Next-Cursor back as cursor for the next page)"""
+    users, headers = await fetch_page(
+        UserService.get_all_users(skip=skip, limit=limit, cursor=parse_cursor(cursor)), limit,
+        UserService.get_users_count(total) if total else None
+    )
+    return render(List[UserResponse], users, headers=headers)
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(user_id: int):
@@ -28,26 +46,32 @@ async def get_user(user_id: int):
     user = await UserService.get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return UserResponse.model_validate(user)
+    return render(UserResponse, user, headers=etag_headers(user.updated_at))
+
+@router.get("/{user_id}/overview", response_model=UserOverviewResponse)
+async def get_user_overview(user_id: int, diagnoses_per_plant: int = Query(3, ge=0, le=50),
+                            plant_limit: int = Query(100, ge=1, le=1000)):
+    """Get a user with their plants, health summaries and most recent diagnoses per plant"""
+    overview = await OverviewService.get_user_overview(user_id, diagnoses_per_plant, plant_limit)
+    if not overview:
+        raise HTTPException(status_code=404, detail="User not found")
+    return render(UserOverviewResponse, overview)
 
 @router.put("/{user_id}", response_model=UserResponse)
-async def update_user(user_id: int, user_update: UserUpdate):
-    """Update user by ID"""
-    # Check if email is being updated and already exists
-    if user_update.email:
-        existing_user = await UserService.get_user_by_email(user_update.email)
-        if existing_user and existing_user.id != user_id:
-            raise HTTPException(status_code=400, detail="User with this email already exists")
-    
-    updated_user = await UserService.update_user(user_id, user_update)
+async def update_user(user_id: int, user_update: UserUpdate, if_match: Optional[str] = Header(None)):
+    """Update user by ID (send the ETag back as If-Match to reject concurrent edits with 412)"""
+    try:
+        updated_user = await UserService.update_user(user_id, user_update, parse_if_match(if_match))
+    except DuplicateEmailError:
+        raise HTTPException(status_code=400, detail="User with this email already exists")
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
-    return UserResponse.model_validate(updated_user)
+    return render(UserResponse, updated_user, headers=etag_headers(updated_user["updated_at"]))
 
 @router.delete("/{user_id}")
-async def delete_user(user_id: int):
-    """Delete user by ID"""
-    success = await UserService.delete_user(user_id)
+async def delete_user(user_id: int, if_match: Optional[str] = Header(None)):
+    """Delete user by ID, optionally only if it still matches If-Match"""
+    success = await UserService.delete_user(user_id, parse_if_match(if_match))
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "User deleted successfully"}
@@ -58,4 +82,4 @@ async def get_user_by_email(email: str):
     user = await UserService.get_user_by_email(email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return UserResponse.model_validate(user)
\ No newline at end of file
+    return render(UserResponse, user, headers=etag_headers(user.updated_at))
\ No newline at end of file
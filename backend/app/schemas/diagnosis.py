@@ -19,9 +19,15 @@ class DiagnosisUpdate(BaseModel):
     notes: Optional[str] = None
     is_healthy: Optional[bool] = None
 
+class DiagnosisAnalyze(BaseModel):
+    plant_id: int
+    image_path: str  # storage key returned by POST /upload
+    notes: Optional[str] = None
+
 class DiagnosisResponse(DiagnosisBase):
     id: int
     plant_id: int
+    model_version: Optional[str] = None
     created_at: datetime
 
     class Config:
@@ -0,0 +1,10 @@
+from typing import List
+from app.schemas.diagnosis import DiagnosisResponse
+from app.schemas.plant import PlantHealthResponse
+from app.schemas.user import UserResponse
+
+class PlantOverview(PlantHealthResponse):
+    recent_diagnoses: List[DiagnosisResponse] = []
+
+class UserOverviewResponse(UserResponse):
+    plants: List[PlantOverview] = []
@@ -22,4 +22,12 @@ class PlantResponse(PlantBase):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PlantHealthResponse(PlantResponse):
+    diagnosis_count: int
+    health_score: Optional[float] = None
+    last_diagnosis_at: Optional[datetime] = None
+    last_disease_name: Optional[str] = None
+    last_confidence_score: Optional[float] = None
+    last_is_healthy: Optional[bool] = None
\ No newline at end of file
@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+class UploadResponse(BaseModel):
+    image_path: str  # storage key; pass as DiagnosisCreate.image_path
+    sha256: str
+    size: int
+    content_type: str
+    deduplicated: bool
@@ -0,0 +1,56 @@
+from typing import Awaitable, Callable, List, Optional, Sequence, Set, Type
+from pydantic import BaseModel
+from tortoise.exceptions import IntegrityError
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+from app.core.config import settings
+from app.core.db_router import primary
+from app.schemas.bulk import BulkCreateResponse, BulkItemResult
+
+async def _lock_parents(conn: BaseDBAsyncClient, parent_model: Type[Model], parent_ids: List[int]) -> Set[int]:
+    """Those of parent_ids that exist, locked against deletion until the transaction ends"""
+    rows = await conn.execute_query_dict(
+        f'SELECT "id" FROM "{parent_model._meta.db_table}" WHERE "id" = ANY($1::int[]) FOR KEY SHARE', [parent_ids]
+    )
+    return {row["id"] for row in rows}
+
+async def bulk_create_checked(model: Type[Model], parent_model: Type[Model], parent_field: str,
+                              items: Sequence[BaseModel], missing_error: str,
+                              after_insert: Optional[Callable[[BaseDBAsyncClient, List[Model]], Awaitable[None]]] = None,
+                              ) -> BulkCreateResponse:
+    """Insert items whose parent row exists, reporting success or failure per item.
+
+    All referenced parent ids are checked with one query and the valid rows
+    are written with a multi-row bulk_create inside a single transaction.
+    The check takes the same FOR KEY SHARE lock as the foreign key, so a
+    concurrent delete of a checked parent waits for the insert to commit.
+    after_insert runs inside that transaction with the inserted rows.
+    """
+    parent_ids = list({getattr(item, parent_field) for item in items})
+    results: List[BulkItemResult] = []
+    rows: List[Model] = []
+    try:
+        async with in_transaction() as conn:
+            existing = await _lock_parents(conn, parent_model, parent_ids)
+            for index, item in enumerate(items):
+                if getattr(item, parent_field) in existing:
+                    rows.append(model(**item.model_dump()))
+                    results.append(BulkItemResult(index=index, success=True))
+                else:
+                    results.append(BulkItemResult(index=index, success=False, error=missing_error))
+            if rows:
+                await model.bulk_create(rows, batch_size=settings.BULK_INSERT_BATCH_SIZE, using_db=conn)
+                if after_insert is not None:
+                    await after_insert(conn, rows)
+    except IntegrityError:
+        # The transaction rolled back, so nothing from this batch was written;
+        # blame the items whose parent is gone now, if any
+        existing = set(await parent_model.filter(id__in=parent_ids).using_db(primary()).values_list("id", flat=True))
+        for index, result in enumerate(results):
+            if result.success:
+                result.success = False
+                result.error = missing_error if getattr(items[index], parent_field) not in existing else \
+                    "Not inserted: the batch was rolled back"
+        rows = []
+    return BulkCreateResponse(created=len(rows), failed=len(items) - len(rows), results=results)
@@ -0,0 +1,421 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, NamedTuple, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import INFERENCE_BATCH_SIZE, INFERENCE_QUEUE_SECONDS, INFERENCE_REJECTED, INFERENCE_SECONDS
+from app.core.storage import key_sha256
+from app.services.inference_cache import InferenceCache, dhash
+from app.services.preprocessing import ImagePreprocessor, Timings
+
+
+class ModelNotLoadedError(RuntimeError):
+    """Raised when a diagnosis is requested but no model is configured"""
+
+
+class InferenceOverloadedError(RuntimeError):
+    """Raised instead of queueing when INFERENCE_MAX_QUEUE images are already waiting"""
+
+
+class DiseaseModel(Protocol):
+    """What the engine needs from a model: RGB float32 batches in [0, 1] of
+    shape (n, height, width, 3) in, class probabilities (n, len(labels)) out.
+    The batch array is reused afterwards, so predict must not keep it."""
+
+    version: str
+    labels: Sequence[str]
+    input_size: Tuple[int, int]  # (height, width)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray: ...
+
+
+def batch_bucket(n: int) -> int:
+    """Smallest power of two holding n images"""
+    return 1 << max(0, n - 1).bit_length()
+
+
+class KerasDiseaseModel:
+    """A saved Keras classifier with one label per output unit.
+
+    Batches are zero-padded to a power of two: every new batch shape costs
+    a graph retrace, so this bounds them to log2(max batch size) + 1, which
+    warm_up traces before the first request.
+    """
+
+    def __init__(self, path: str, labels: Sequence[str], version: str):
+        import tensorflow as tf  # heavy import, only paid when a model is configured
+        self.model = tf.keras.models.load_model(path, compile=False)
+        _, height, width, _ = self.model.input_shape
+        self.input_size = (height, width)
+        self.labels = list(labels)
+        self.version = version
+        if self.model.output_shape[-1] != len(self.labels):
+            raise ValueError(f"{path} has {self.model.output_shape[-1]} outputs but {len(self.labels)} labels")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        n = len(batch)
+        padded = batch_bucket(n)
+        if padded != n:
+            batch = np.concatenate([batch, np.zeros((padded - n, *batch.shape[1:]), batch.dtype)])
+        return np.asarray(self.model.predict_on_batch(batch))[:n]
+
+    def warm_up(self, max_batch_size: int) -> None:
+        """Trace the graph for every batch bucket up to max_batch_size"""
+        for size in sorted({batch_bucket(n) for n in range(1, max_batch_size + 1)}):
+            self.predict(np.zeros((size, *self.input_size, 3), np.float32))
+
+
+def _tflite_interpreter():
+    try:
+        from tflite_runtime.interpreter import Interpreter  # the runtime-only package, when installed
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteDiseaseModel:
+    """A classifier converted to TFLite: float32, float16 or int8-quantized.
+
+    Quantized inputs are computed from the [0, 1] batch with the input
+    tensor's scale and zero point, and quantized outputs mapped back to
+    probabilities. Models converted with a dynamic batch dimension run each
+    batch in one invocation, padded to its bucket like KerasDiseaseModel;
+    tensors are re-allocated only when the bucket changes. Fixed-batch models
+    run in chunks of their batch size.
+    """
+
+    def __init__(self, path: str, labels: Sequence[str], version: str, threads: Optional[int] = None):
+        self.interpreter = _tflite_interpreter()(model_path=path, num_threads=threads or os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        batch_size, height, width, _ = (int(n) for n in self._input["shape"])
+        self._batch_size = batch_size
+        self._dynamic = self._input["shape_signature"][0] == -1
+        self.input_size = (height, width)
+        self.labels = list(labels)
+        self.version = version
+        if self._output["shape"][-1] != len(self.labels):
+            raise ValueError(f"{path} has {self._output['shape'][-1]} outputs but {len(self.labels)} labels")
+
+    def _resize(self, batch_size: int) -> None:
+        if batch_size != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input["index"], [batch_size, *self.input_size, 3])
+            self.interpreter.allocate_tensors()
+            self._batch_size = batch_size
+
+    def _invoke(self, batch: np.ndarray) -> np.ndarray:
+        dtype = self._input["dtype"]
+        if dtype != np.float32:
+            scale, zero_point = self._input["quantization"]
+            limits = np.iinfo(dtype)
+            batch = np.clip(np.rint(batch / np.float32(scale)) + zero_point, limits.min, limits.max).astype(dtype)
+        self.interpreter.set_tensor(self._input["index"], batch)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self._output["index"])
+        if output.dtype != np.float32:
+            scale, zero_point = self._output["quantization"]
+            output = (output.astype(np.float32) - zero_point) * np.float32(scale)
+        return output
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        n = len(batch)
+        if self._dynamic:
+            self._resize(batch_bucket(n))
+        size = self._batch_size
+        outputs = []
+        for start in range(0, n, size):
+            chunk = batch[start:start + size]
+            if len(chunk) != size:
+                chunk = np.concatenate([chunk, np.zeros((size - len(chunk), *chunk.shape[1:]), chunk.dtype)])
+            outputs.append(self._invoke(chunk)[:n - start])
+        return np.concatenate(outputs)
+
+    def warm_up(self, max_batch_size: int) -> None:
+        """Run every batch bucket up to max_batch_size once, so its kernels are prepared"""
+        for size in sorted({batch_bucket(n) for n in range(1, max_batch_size + 1)}):
+            self.predict(np.zeros((size, *self.input_size, 3), np.float32))
+
+
+def open_model(path: str, labels: Sequence[str], version: str) -> DiseaseModel:
+    """A TFLiteDiseaseModel for .tflite files, otherwise a KerasDiseaseModel"""
+    if path.endswith(".tflite"):
+        return TFLiteDiseaseModel(path, labels, version, settings.TFLITE_THREADS)
+    return KerasDiseaseModel(path, labels, version)
+
+
+def load_labels(path: str) -> List[str]:
+    """One class label per line, in output order"""
+    with open(path) as handle:
+        return [line.strip() for line in handle if line.strip()]
+
+
+def load_configured_model() -> DiseaseModel:
+    """Load the model at MODEL_PATH with its labels and version"""
+    path = settings.MODEL_PATH
+    labels_path = settings.MODEL_LABELS_PATH or os.path.join(os.path.dirname(path), "labels.txt")
+    version = settings.MODEL_VERSION or os.path.basename(path.rstrip("/"))
+    model = open_model(path, load_labels(labels_path), version)
+    model.warm_up(settings.INFERENCE_MAX_BATCH_SIZE)
+    return model
+
+
+class Prediction(NamedTuple):
+    disease_name: str
+    confidence_score: float
+    is_healthy: bool
+    model_version: str
+
+
+def to_prediction(probabilities: np.ndarray, model: DiseaseModel) -> Prediction:
+    """Top-1 class of one row of model output"""
+    best = int(np.argmax(probabilities))
+    label = model.labels[best]
+    return Prediction(label, float(probabilities[best]),
+                      label.lower() == settings.MODEL_HEALTHY_LABEL.lower(), model.version)
+
+
+class MicroBatcher:
+    """Collects concurrent single-image requests into batches for one model.
+
+    A batch runs when it holds max_batch_size images or its first image has
+    waited max_wait seconds. While a batch runs, new requests queue up, so
+    under load batches grow on their own and the wait rarely applies. The
+    model runs on a dedicated single thread: TensorFlow parallelizes each
+    batch across cores itself, and the event loop stays free.
+
+    Images are submitted as (height, width, 3) uint8 and normalized to
+    float32 in [0, 1] with one vectorized multiply into a batch array that
+    is allocated once and reused (only one batch runs at a time).
+    """
+
+    def __init__(self, predict: Callable[[np.ndarray], np.ndarray], input_size: Tuple[int, int],
+                 max_batch_size: int, max_wait: float, max_queue: int):
+        self.predict = predict
+        self.input_size = input_size
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._collecting: list = []
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pixels = np.empty((max_batch_size, *input_size, 3), np.uint8)
+        self._batch = np.empty((max_batch_size, *input_size, 3), np.float32)
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(self.max_queue)
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="inference")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            self._collecting.append(self._queue.get_nowait())
+        for _, future, _ in self._collecting:
+            if not future.done():
+                future.set_exception(ModelNotLoadedError("Diagnosis engine stopped"))
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, image: np.ndarray) -> np.ndarray:
+        """Queue one preprocessed image and wait for its row of model output"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((image, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            INFERENCE_REJECTED.inc()
+            raise InferenceOverloadedError(f"{self.max_queue} images already waiting for inference")
+        return await future
+
+    async def _collect(self) -> list:
+        """Wait for a first item, then gather more until the batch is full or the deadline passes"""
+        # Kept on the instance so stop() can fail a half-collected batch
+        items = self._collecting = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(items) < self.max_batch_size:
+            if not self._queue.empty():
+                items.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        self._collecting = []
+        return items
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [item for item in await self._collect() if not item[1].done()]
+            if not items:
+                continue
+            started = time.perf_counter()
+            for _, _, queued_at in items:
+                INFERENCE_QUEUE_SECONDS.observe(started - queued_at)
+            INFERENCE_BATCH_SIZE.observe(len(items))
+            try:
+                n = len(items)
+                for i, (image, _, _) in enumerate(items):
+                    self._pixels[i] = image
+                batch = np.multiply(self._pixels[:n], np.float32(1 / 255), out=self._batch[:n])
+                outputs = await loop.run_in_executor(self._executor, self.predict, batch)
+            except asyncio.CancelledError:
+                self._collecting = items
+                raise
+            except Exception as exc:
+                for _, future, _ in items:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            finally:
+                INFERENCE_SECONDS.observe(time.perf_counter() - started)
+            for (_, future, _), output in zip(items, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+
+class DiagnosisEngine:
+    """Diagnoses stored images: ImagePreprocessor, then the model through a
+    MicroBatcher in this process, the model for the plant's species from a
+    ModelRegistry (app/services/model_registry.py), or the shared inference
+    process (app/services/inference_server.py) when connected to one.
+    Results are cached by image content first (InferenceCache), so
+    resubmitted photos skip decoding and the model."""
+
+    def __init__(self):
+        self.batcher: Optional[MicroBatcher] = None
+        self.client = None  # InferenceClient
+        self.registry = None  # ModelRegistry
+        self.preprocessor: Optional[ImagePreprocessor] = None
+        self._model: Optional[DiseaseModel] = None
+        self.cache: Optional[InferenceCache] = None
+        if settings.INFERENCE_CACHE_MAX_ENTRIES > 0:
+            self.cache = InferenceCache(settings.INFERENCE_CACHE_MAX_ENTRIES, settings.INFERENCE_CACHE_MAX_DISTANCE)
+
+    @property
+    def model(self) -> Optional[DiseaseModel]:
+        # The inference process announces its model again on every reconnect
+        return self.client.model if self.client is not None else self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None or self.registry is not None
+
+    def _start_preprocessor(self) -> None:
+        workers = settings.PREPROCESS_WORKERS
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.preprocessor = ImagePreprocessor(workers, settings.PREPROCESS_MAX_PIXELS)
+        self.preprocessor.start()
+
+    def start(self, model: DiseaseModel) -> None:
+        """Serve model from this process"""
+        self._model = model
+        self.batcher = MicroBatcher(model.predict, model.input_size, settings.INFERENCE_MAX_BATCH_SIZE,
+                                    settings.INFERENCE_MAX_WAIT_MS / 1000, settings.INFERENCE_MAX_QUEUE)
+        self.batcher.start()
+        self._start_preprocessor()
+
+    def start_registry(self, registry) -> None:
+        """Serve the registry's models from this process, each loaded on first use"""
+        self.registry = registry
+        self._start_preprocessor()
+
+    async def connect(self, socket_path: str) -> None:
+        """Use the shared inference process listening on socket_path"""
+        from app.services.inference_server import InferenceClient  # that module imports this one
+        self.client = InferenceClient(socket_path, settings.INFERENCE_SHM_SLOTS)
+        self._start_preprocessor()
+        try:
+            await self.client.connect()
+        except ModelNotLoadedError as exc:
+            # Not up yet; requests retry the connection and answer 503 until it is
+            print(f"⚠️  {exc}")
+
+    async def _ready_model(self) -> DiseaseModel:
+        if self.client is not None and not self.client.connected:
+            await self.client.connect()
+        if self.model is None:
+            raise ModelNotLoadedError("No diagnosis model is loaded")
+        return self.model
+
+    @asynccontextmanager
+    async def _serving(self, species: Optional[str]) -> AsyncIterator[Tuple[DiseaseModel, Optional[MicroBatcher]]]:
+        """(model, batcher) to diagnose a plant of species with; no batcher for the inference process"""
+        if self.registry is None:
+            yield await self._ready_model(), self.batcher
+        else:
+            async with self.registry.use(species) as resident:
+                yield resident.model, resident.batcher
+
+    async def stop(self) -> None:
+        if self.batcher is not None:
+            await self.batcher.stop()
+        if self.registry is not None:
+            await self.registry.stop()
+        if self.client is not None:
+            await self.client.close()
+        if self.preprocessor is not None:
+            self.preprocessor.stop()
+        self.batcher = self.client = self.registry = self.preprocessor = self._model = None
+
+    async def diagnose(self, image_key: str, timings: Optional[Timings] = None,
+                       species: Optional[str] = None) -> Prediction:
+        """Diagnose a stored image with the model for species, adding per-stage
+        seconds to timings if given; raises FileNotFoundError for unknown keys"""
+        async with self._serving(species) as (model, batcher):
+            return await self._diagnose(model, batcher, image_key, timings)
+
+    async def _diagnose(self, model: DiseaseModel, batcher: Optional[MicroBatcher], image_key: str,
+                        timings: Optional[Timings]) -> Prediction:
+        sha256 = key_sha256(image_key) if self.cache is not None else None
+        if sha256 is not None:
+            cached = self.cache.get(model.version, sha256)
+            if cached is not None:
+                return cached
+        if self.client is None:
+            image, stages = await self.preprocessor.load(image_key, model.input_size)
+            prediction = await self._infer(model, image, sha256, stages, lambda: batcher.submit(image))
+        else:
+            # The preprocessing worker writes straight into the shared ring
+            async with self.client.slot() as index:
+                _, stages = await self.preprocessor.load(image_key, model.input_size,
+                                                         out=(self.client.shm.name, index))
+                prediction = await self._infer(model, self.client.ring[index], sha256, stages,
+                                               lambda: self.client.infer(index))
+        if timings is not None:
+            timings.update(stages)
+        return prediction
+
+    async def _infer(self, model: DiseaseModel, image: np.ndarray, sha256: Optional[str], stages: Timings,
+                     run: Callable[[], Awaitable[np.ndarray]]) -> Prediction:
+        """Run the model on a preprocessed image unless a near-duplicate's result is cached,
+        and cache the outcome under sha256"""
+        phash = None
+        if sha256 is not None and self.cache.similar_enabled:
+            phash = dhash(image)
+            cached = self.cache.get_similar(model.version, phash)
+            if cached is not None:
+                self.cache.put(model.version, sha256, cached, phash)
+                return cached
+        started = time.perf_counter()
+        prediction = to_prediction(await run(), model)
+        stages["inference"] = time.perf_counter() - started
+        if sha256 is not None:
+            self.cache.put(model.version, sha256, prediction, phash)
+        return prediction
+
+diagnosis_engine = DiagnosisEngine()
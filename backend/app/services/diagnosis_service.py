@@ -1,79 +1,413 @@
-from typing import List, Optional
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 from app.models.diagnosis import Diagnosis
 from app.models.plant import Plant
-from app.schemas.diagnosis import DiagnosisCreate, DiagnosisUpdate
-from tortoise.exceptions import DoesNotExist
+from app.schemas.diagnosis import DiagnosisAnalyze, DiagnosisCreate, DiagnosisUpdate, DiagnosisResponse
+from app.schemas.bulk import BulkCreateResponse
+from app.core.archives import ArchiveError, ArchiveMember
+from app.core.config import settings
+from app.core.counters import (
+    DIAGNOSES_COUNT_KEY, CountMode, count_rows, counter_cache,
+    diagnoses_by_plant_count_key, diagnoses_by_user_count_key,
+)
+from app.core.db_router import primary, route_reads
+from app.core.pagination import Cursor, paginate
+from app.core.storage import UnsupportedMediaTypeError, UploadTooLargeError, storage
+from app.core.streaming import LineTooLongError
+from app.services.bulk import bulk_create_checked
+from app.services.diagnosis_engine import InferenceOverloadedError, ModelNotLoadedError, Prediction, diagnosis_engine
+from app.services.preprocessing import ImageDecodeError, Timings
+from app.services.plant_health_service import PlantHealthService
+from app.services.writes import columns, delete_returning, update_returning
+from tortoise.exceptions import DoesNotExist, IntegrityError
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
+from pydantic import ValidationError
 
+# Columns read by list endpoints: exactly what DiagnosisResponse serializes
+DIAGNOSIS_FIELDS = tuple(DiagnosisResponse.model_fields)
+
+# Columns the plant health summary is computed from
+HEALTH_INPUT_FIELDS = frozenset({"disease_name", "confidence_score", "is_healthy"})
+
+# Overwrite many diagnoses' verdicts from parallel arrays in one statement
+_APPLY_PREDICTIONS_SQL = """
+UPDATE diagnoses d SET
+    disease_name = u.disease_name,
+    confidence_score = u.confidence_score,
+    is_healthy = u.is_healthy,
+    model_version = $5,
+    updated_at = now()
+FROM unnest($1::int[], $2::text[], $3::float8[], $4::bool[]) AS u(id, disease_name, confidence_score, is_healthy)
+WHERE d.id = u.id
+RETURNING d.plant_id
+"""
+
+# Insert analyzed images from parallel arrays, returning the new rows in input order
+_INSERT_ANALYZED_SQL = f"""
+INSERT INTO diagnoses (plant_id, image_path, disease_name, confidence_score, is_healthy, model_version,
+                       created_at, updated_at)
+SELECT u.plant_id, u.image_path, u.disease_name, u.confidence_score, u.is_healthy, u.model_version, now(), now()
+FROM unnest($1::int[], $2::text[], $3::text[], $4::float8[], $5::bool[], $6::text[])
+    WITH ORDINALITY AS u(plant_id, image_path, disease_name, confidence_score, is_healthy, model_version, n)
+ORDER BY u.n
+RETURNING {columns(DIAGNOSIS_FIELDS)}
+"""
+
+# Per-image failures reported on the archive stream instead of ending it
+_ARCHIVE_ITEM_ERRORS = (UnsupportedMediaTypeError, UploadTooLargeError, ImageDecodeError, FileNotFoundError,
+                        ModelNotLoadedError, InferenceOverloadedError)
+
+def archive_plant_id(name: str, plants: Dict[str, int], default: Optional[int]) -> Optional[int]:
+    """Plant of an archive member: mapped by its full path, else by its top-level directory"""
+    if name in plants:
+        return plants[name]
+    return plants.get(name.split("/", 1)[0], default) if "/" in name else default
+
+def _ignored(name: str) -> bool:
+    """Archiver droppings such as .DS_Store and __MACOSX/ resource forks"""
+    return name.rsplit("/", 1)[-1].startswith(".") or name.startswith("__MACOSX/")
+
+async def _once(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+def filter_diagnoses(queryset: QuerySet, is_healthy: Optional[bool] = None, disease_name: Optional[str] = None) -> QuerySet:
+    """Apply the optional list filters; each has a matching index (see migrations/models)"""
+    if is_healthy is not None:
+        queryset = queryset.filter(is_healthy=is_healthy)
+    if disease_name is not None:
+        queryset = queryset.filter(disease_name=disease_name)
+    return queryset
+
+@route_reads
 class DiagnosisService:
     @staticmethod
-    async def create_diagnosis(diagnosis_data: DiagnosisCreate) -> Optional[Diagnosis]:
+    async def _adjust_counts(per_plant: Dict[int, int], plant_users: Dict[int, int], sign: int = 1) -> None:
+        """Apply created (sign=1) or deleted (sign=-1) diagnoses to the cached counters"""
+        deltas = Counter({DIAGNOSES_COUNT_KEY: sign * sum(per_plant.values())})
+        for plant_id, n in per_plant.items():
+            deltas[diagnoses_by_plant_count_key(plant_id)] += sign * n
+            deltas[diagnoses_by_user_count_key(plant_users[plant_id])] += sign * n
+        await counter_cache.adjust(deltas)
+    
+    @staticmethod
+    async def create_diagnosis(diagnosis_data: DiagnosisCreate, model_version: Optional[str] = None) -> Optional[Diagnosis]:
         """Create a new diagnosis"""
         try:
             # Verify plant exists
             plant = await Plant.get(id=diagnosis_data.plant_id)
             diagnosis_dict = diagnosis_data.model_dump()
             diagnosis_dict['plant_id'] = diagnosis_dict.pop('plant_id')
-            return await Diagnosis.create(plant=plant, **{k: v for k, v in diagnosis_dict.items() if k != 'plant_id'})
+            async with in_transaction() as conn:
+                diagnosis = await Diagnosis.create(
+                    plant=plant, model_version=model_version, using_db=conn,
+                    **{k: v for k, v in diagnosis_dict.items() if k != 'plant_id'}
+                )
+                await PlantHealthService.record(conn, diagnosis)
+            await DiagnosisService._adjust_counts({plant.id: 1}, {plant.id: plant.user_id})
+            return diagnosis
         except DoesNotExist:
             return None
     
+    @staticmethod
+    async def analyze_diagnosis(analyze_data: DiagnosisAnalyze, timings: Optional[Timings] = None) -> Optional[Diagnosis]:
+        """Diagnose an uploaded image with the model and store the result, or None if the plant is missing"""
+        # Checked first so a bad plant_id does not cost a forward pass; the
+        # species picks the model
+        species = await Plant.filter(id=analyze_data.plant_id).first().values_list("species", flat=True)
+        if species is None:
+            return None
+        prediction = await diagnosis_engine.diagnose(analyze_data.image_path, timings, species)
+        return await DiagnosisService.create_diagnosis(DiagnosisCreate(
+            plant_id=analyze_data.plant_id, image_path=analyze_data.image_path, notes=analyze_data.notes,
+            disease_name=prediction.disease_name, confidence_score=prediction.confidence_score,
+            is_healthy=prediction.is_healthy,
+        ), model_version=prediction.model_version)
+    
+    @staticmethod
+    async def apply_predictions(diagnosis_ids: List[int], predictions: List[Prediction], model_version: str) -> int:
+        """Store new model verdicts for existing diagnoses with one UPDATE and refresh
+        their plants' health summaries in the same transaction; returns rows updated"""
+        async with in_transaction() as conn:
+            rows = await conn.execute_query_dict(_APPLY_PREDICTIONS_SQL, [
+                diagnosis_ids,
+                [p.disease_name for p in predictions],
+                [p.confidence_score for p in predictions],
+                [p.is_healthy for p in predictions],
+                model_version,
+            ])
+            await PlantHealthService.refresh({row["plant_id"] for row in rows}, conn)
+        return len(rows)
+    
+    @staticmethod
+    async def archive_plants(plant_ids: Iterable[int]) -> Dict[int, Tuple[int, str]]:
+        """(user_id, species) of each of plant_ids that exists, read from the primary"""
+        rows = await Plant.filter(id__in=list(plant_ids)).using_db(primary()).values_list("id", "user_id", "species")
+        return {plant_id: (user_id, species) for plant_id, user_id, species in rows}
+    
+    @staticmethod
+    async def analyze_archive(members: AsyncIterator[ArchiveMember], plants: Dict[str, int], default_plant_id: Optional[int],
+                              plant_info: Dict[int, Tuple[int, str]]) -> AsyncIterator[Dict[str, Any]]:
+        """Store and diagnose archive members while the archive is still arriving.
+
+        Yields each diagnosis row (with the member "name") once inserted, or
+        {"name", "error"}, then a summary. Results that finish together are
+        inserted with one statement, and at most ARCHIVE_MAX_IN_FLIGHT images
+        are held between unpacking and insertion, so memory stays flat
+        however large the archive is. plant_info (from archive_plants) must
+        cover every plant id.
+        """
+        plant_users = {plant_id: user_id for plant_id, (user_id, _) in plant_info.items()}
+        finished: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(settings.ARCHIVE_MAX_IN_FLIGHT)
+        tasks = set()
+        launched = 0
+        reader_error: Optional[str] = None
+        
+        async def diagnose(name: str, data: bytes, plant_id: int) -> None:
+            try:
+                stored = await storage.store(_once(data), settings.UPLOAD_MAX_BYTES)
+                prediction = await diagnosis_engine.diagnose(stored.key, species=plant_info[plant_id][1])
+                result = (name, plant_id, stored.key, prediction)
+            except _ARCHIVE_ITEM_ERRORS as exc:
+                result = (name, str(exc) or type(exc).__name__)
+            except Exception as exc:
+                result = (name, f"Diagnosis failed: {type(exc).__name__}")
+            finished.put_nowait(result)
+        
+        async def unpack() -> None:
+            nonlocal launched, reader_error
+            try:
+                async for member in members:
+                    if _ignored(member.name):
+                        continue
+                    if launched == settings.ARCHIVE_MAX_MEMBERS:
+                        raise ArchiveError(f"Archive has more than {settings.ARCHIVE_MAX_MEMBERS} images")
+                    await slots.acquire()
+                    launched += 1
+                    plant_id = archive_plant_id(member.name, plants, default_plant_id)
+                    if member.error is not None or plant_id is None:
+                        finished.put_nowait((member.name, member.error or "No plant_id for this image"))
+                        continue
+                    task = asyncio.create_task(diagnose(member.name, member.data, plant_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            except ArchiveError as exc:
+                reader_error = str(exc)
+            except Exception as exc:
+                reader_error = f"Archive could not be read: {type(exc).__name__}"
+            finished.put_nowait(None)
+        
+        reader = asyncio.create_task(unpack())
+        created = failed = received = 0
+        reading = True
+        try:
+            while reading or received < launched:
+                batch = [await finished.get()]
+                while len(batch) < settings.ARCHIVE_INSERT_CHUNK_SIZE and not finished.empty():
+                    batch.append(finished.get_nowait())
+                if None in batch:
+                    reading = False
+                    batch.remove(None)
+                received += len(batch)
+                analyzed = [item for item in batch if len(item) == 4]
+                for name, error in (item for item in batch if len(item) == 2):
+                    failed += 1
+                    yield {"name": name, "error": error}
+                if analyzed:
+                    try:
+                        rows = await DiagnosisService._insert_analyzed(analyzed, plant_users)
+                    except IntegrityError:
+                        # A plant was deleted since the request was checked
+                        rows = [None] * len(analyzed)
+                    for (name, *_), row in zip(analyzed, rows):
+                        if row is None:
+                            failed += 1
+                            yield {"name": name, "error": "Plant not found"}
+                        else:
+                            created += 1
+                            yield {"name": name, **row}
+                for _ in batch:
+                    slots.release()
+        finally:
+            reader.cancel()
+            for task in list(tasks):
+                task.cancel()
+        if reader_error is not None:
+            yield {"done": False, "created": created, "failed": failed, "error": reader_error}
+        else:
+            yield {"done": True, "created": created, "failed": failed}
+    
+    @staticmethod
+    async def _insert_analyzed(analyzed: List[Tuple[str, int, str, Prediction]],
+                               plant_users: Dict[int, int]) -> List[Dict[str, Any]]:
+        """Insert (name, plant id, image key, prediction) results in one statement, in order"""
+        predictions = [prediction for _, _, _, prediction in analyzed]
+        async with in_transaction() as conn:
+            rows = await conn.execute_query_dict(_INSERT_ANALYZED_SQL, [
+                [plant_id for _, plant_id, _, _ in analyzed],
+                [key for _, _, key, _ in analyzed],
+                [p.disease_name for p in predictions],
+                [p.confidence_score for p in predictions],
+                [p.is_healthy for p in predictions],
+                [p.model_version for p in predictions],
+            ])
+            await PlantHealthService.refresh({row["plant_id"] for row in rows}, conn)
+        await DiagnosisService._adjust_counts(Counter(row["plant_id"] for row in rows), plant_users)
+        return rows
+    
+    @staticmethod
+    async def bulk_create_diagnoses(diagnoses_data: List[DiagnosisCreate]) -> BulkCreateResponse:
+        """Create many diagnoses with one plant check and one multi-row insert"""
+        result = await bulk_create_checked(
+            Diagnosis, Plant, "plant_id", diagnoses_data, "Plant not found",
+            after_insert=lambda conn, rows: PlantHealthService.refresh({row.plant_id for row in rows}, conn),
+        )
+        if result.created:
+            per_plant = Counter(diagnoses_data[r.index].plant_id for r in result.results if r.success)
+            plant_users = dict(await Plant.filter(id__in=list(per_plant)).values_list("id", "user_id"))
+            await DiagnosisService._adjust_counts(per_plant, plant_users)
+        return result
+    
+    @staticmethod
+    async def ingest_diagnoses(lines: AsyncIterator[Tuple[int, bytes]], chunk_size: int) -> AsyncIterator[Dict[str, Any]]:
+        """Validate NDJSON lines as they arrive and insert them in fixed-size chunks.
+
+        Yields one progress record per flushed chunk and a final summary, so
+        at most chunk_size validated rows are held in memory at a time.
+        """
+        chunk: List[DiagnosisCreate] = []
+        chunk_lines: List[int] = []
+        errors: List[Dict[str, Any]] = []
+        chunk_number = created = failed = 0
+        
+        async def flush() -> Dict[str, Any]:
+            result = await DiagnosisService.bulk_create_diagnoses(chunk)
+            errors.extend({"line": chunk_lines[r.index], "error": r.error} for r in result.results if not r.success)
+            return {"chunk": chunk_number, "created": result.created, "failed": len(errors), "errors": list(errors)}
+        
+        try:
+            async for line_number, line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    chunk.append(DiagnosisCreate.model_validate_json(line))
+                    chunk_lines.append(line_number)
+                except ValidationError as exc:
+                    errors.append({"line": line_number, "error": "; ".join(
+                        f"{'.'.join(map(str, e['loc']))}: {e['msg']}" if e['loc'] else e['msg']
+                        for e in exc.errors(include_input=False))})
+                if len(chunk) + len(errors) >= chunk_size:
+                    chunk_number += 1
+                    progress = await flush()
+                    created += progress["created"]
+                    failed += progress["failed"]
+                    chunk, chunk_lines, errors = [], [], []
+                    yield progress
+            if chunk or errors:
+                chunk_number += 1
+                progress = await flush()
+                created += progress["created"]
+                failed += progress["failed"]
+                yield progress
+        except LineTooLongError as exc:
+            # Lines before the bad one are still inserted or reported
+            if chunk or errors:
+                chunk_number += 1
+                progress = await flush()
+                created += progress["created"]
+                failed += progress["failed"]
+                yield progress
+            yield {"done": False, "created": created, "failed": failed, "error": str(exc)}
+            return
+        yield {"done": True, "created": created, "failed": failed}
+    
     @staticmethod
     async def get_diagnosis_by_id(diagnosis_id: int) -> Optional[Diagnosis]:
-        """Get diagnosis by ID with plant and user relationships"""
+        """Get diagnosis by ID"""
         try:
-            return await Diagnosis.get(id=diagnosis_id).prefetch_related('plant', 'plant__user')
+            return await Diagnosis.get(id=diagnosis_id)
         except DoesNotExist:
             return None
     
     @staticmethod
-    async def get_all_diagnoses(skip: int = 0, limit: int = 100) -> List[Diagnosis]:
-        """Get all diagnoses with pagination"""
-        return await Diagnosis.all().prefetch_related('plant', 'plant__user').offset(skip).limit(limit)
+    async def get_all_diagnoses(skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None,
+                                is_healthy: Optional[bool] = None, disease_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get all diagnoses with offset or keyset pagination"""
+        queryset = filter_diagnoses(Diagnosis.all(), is_healthy, disease_name)
+        return await paginate(queryset, skip, limit, cursor).values(*DIAGNOSIS_FIELDS)
     
     @staticmethod
-    async def get_diagnoses_by_plant(plant_id: int, skip: int = 0, limit: int = 100) -> List[Diagnosis]:
+    async def get_diagnoses_by_plant(plant_id: int, skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None,
+                                     is_healthy: Optional[bool] = None, disease_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all diagnoses for a specific plant"""
-        return await Diagnosis.filter(plant_id=plant_id).prefetch_related('plant', 'plant__user').offset(skip).limit(limit)
+        queryset = filter_diagnoses(Diagnosis.filter(plant_id=plant_id), is_healthy, disease_name)
+        return await paginate(queryset, skip, limit, cursor).values(*DIAGNOSIS_FIELDS)
     
     @staticmethod
-    async def get_diagnoses_by_user(user_id: int, skip: int = 0, limit: int = 100) -> List[Diagnosis]:
+    async def get_diagnoses_by_user(user_id: int, skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None,
+                                    is_healthy: Optional[bool] = None, disease_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all diagnoses for a specific user (through their plants)"""
-        return await Diagnosis.filter(plant__user_id=user_id).prefetch_related('plant', 'plant__user').offset(skip).limit(limit)
+        queryset = filter_diagnoses(Diagnosis.filter(plant__user_id=user_id), is_healthy, disease_name)
+        return await paginate(queryset, skip, limit, cursor).values(*DIAGNOSIS_FIELDS)
     
     @staticmethod
-    async def update_diagnosis(diagnosis_id: int, diagnosis_data: DiagnosisUpdate) -> Optional[Diagnosis]:
-        """Update diagnosis by ID"""
-        try:
-            diagnosis = await Diagnosis.get(id=diagnosis_id)
-            update_data = diagnosis_data.model_dump(exclude_unset=True)
-            if update_data:
-                await diagnosis.update_from_dict(update_data)
-                await diagnosis.save()
-            return await Diagnosis.get(id=diagnosis_id).prefetch_related('plant', 'plant__user')
-        except DoesNotExist:
-            return None
+    async def update_diagnosis(diagnosis_id: int, diagnosis_data: DiagnosisUpdate,
+                               if_match: Optional[List[datetime]] = None) -> Optional[Dict[str, Any]]:
+        """Update diagnosis by ID with one UPDATE ... RETURNING"""
+        update_data = diagnosis_data.model_dump(exclude_unset=True)
+        returning = columns((*DIAGNOSIS_FIELDS, "updated_at"))
+        if not HEALTH_INPUT_FIELDS & update_data.keys():
+            return await update_returning(primary(), "diagnoses", diagnosis_id, update_data, returning, if_match)
+        async with in_transaction() as conn:
+            diagnosis = await update_returning(conn, "diagnoses", diagnosis_id, update_data, returning, if_match)
+            if diagnosis is not None:
+                await PlantHealthService.refresh([diagnosis["plant_id"]], conn)
+        return diagnosis
     
     @staticmethod
-    async def delete_diagnosis(diagnosis_id: int) -> bool:
-        """Delete diagnosis by ID"""
-        try:
-            diagnosis = await Diagnosis.get(id=diagnosis_id)
-            await diagnosis.delete()
-            return True
-        except DoesNotExist:
-            return False
+    async def delete_diagnosis(diagnosis_id: int, if_match: Optional[List[datetime]] = None) -> bool:
+        """Delete diagnosis by ID with one DELETE ... RETURNING"""
+        async with in_transaction() as conn:
+            diagnosis = await delete_returning(
+                conn, "diagnoses", diagnosis_id,
+                '"plant_id", (SELECT "user_id" FROM "plants" WHERE "id" = "diagnoses"."plant_id") AS user_id',
+                if_match,
+            )
+            if diagnosis is None:
+                return False
+            await PlantHealthService.refresh([diagnosis["plant_id"]], conn)
+        plant_id = diagnosis["plant_id"]
+        await DiagnosisService._adjust_counts({plant_id: 1}, {plant_id: diagnosis["user_id"]}, sign=-1)
+        return True
+    
+    @staticmethod
+    async def _count(mode: CountMode, key: str, queryset: QuerySet, table: Optional[str] = None,
+                     is_healthy: Optional[bool] = None, disease_name: Optional[str] = None) -> int:
+        """Count a diagnosis list; filtered lists have no cached counter and are counted exactly"""
+        if is_healthy is None and disease_name is None:
+            return await count_rows(mode, key, queryset, table=table)
+        return await count_rows("exact", key, filter_diagnoses(queryset, is_healthy, disease_name))
     
     @staticmethod
-    async def get_diagnoses_count() -> int:
+    async def get_diagnoses_count(mode: CountMode = "exact", is_healthy: Optional[bool] = None,
+                                  disease_name: Optional[str] = None) -> int:
         """Get total count of diagnoses"""
-        return await Diagnosis.all().count()
+        return await DiagnosisService._count(mode, DIAGNOSES_COUNT_KEY, Diagnosis.all(), "diagnoses",
+                                             is_healthy, disease_name)
     
     @staticmethod
-    async def get_diagnoses_count_by_plant(plant_id: int) -> int:
+    async def get_diagnoses_count_by_plant(plant_id: int, mode: CountMode = "exact", is_healthy: Optional[bool] = None,
+                                           disease_name: Optional[str] = None) -> int:
         """Get count of diagnoses for a specific plant"""
-        return await Diagnosis.filter(plant_id=plant_id).count()
+        return await DiagnosisService._count(mode, diagnoses_by_plant_count_key(plant_id),
+                                             Diagnosis.filter(plant_id=plant_id), None, is_healthy, disease_name)
     
     @staticmethod
-    async def get_diagnoses_count_by_user(user_id: int) -> int:
+    async def get_diagnoses_count_by_user(user_id: int, mode: CountMode = "exact", is_healthy: Optional[bool] = None,
+                                          disease_name: Optional[str] = None) -> int:
         """Get count of diagnoses for a specific user"""
-        return await Diagnosis.filter(plant__user_id=user_id).count()
\ No newline at end of file
+        return await DiagnosisService._count(mode, diagnoses_by_user_count_key(user_id),
+                                             Diagnosis.filter(plant__user_id=user_id), None, is_healthy, disease_name)
\ No newline at end of file
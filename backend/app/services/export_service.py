@@ -0,0 +1,66 @@
+import csv
+import io
+from typing import Any, AsyncIterator, Dict, List, Sequence
+from app.core.config import settings
+from app.core.db_router import read_connection, read_scope
+from app.core.streaming import ndjson_line
+from app.services.diagnosis_service import DIAGNOSIS_FIELDS
+from app.services.plant_service import PLANT_FIELDS
+
+# Exports read through a server-side cursor on a dedicated connection, so
+# Postgres hands rows over EXPORT_FETCH_SIZE at a time and neither side ever
+# materializes the whole result. Rows come out in storage order.
+_USER_DIAGNOSES_SQL = (
+    "SELECT " + ", ".join(f"d.{field}" for field in DIAGNOSIS_FIELDS) + " "
+    "FROM diagnoses d JOIN plants p ON p.id = d.plant_id WHERE p.user_id = $1"
+)
+_USER_PLANTS_SQL = (
+    "SELECT " + ", ".join(PLANT_FIELDS) + " FROM plants WHERE user_id = $1"
+)
+
+EXPORT_FIELDS = {"diagnoses": DIAGNOSIS_FIELDS, "plants": PLANT_FIELDS}
+
+
+class ExportService:
+    @staticmethod
+    async def _stream_rows(sql: str, *args: Any) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield batches of rows from a server-side cursor"""
+        with read_scope():
+            client = read_connection()
+        async with client.acquire_connection() as conn:
+            async with conn.transaction(readonly=True):
+                batch: List[Dict[str, Any]] = []
+                async for record in conn.cursor(sql, *args, prefetch=settings.EXPORT_FETCH_SIZE):
+                    batch.append(dict(record))
+                    if len(batch) >= settings.EXPORT_FETCH_SIZE:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+
+    @staticmethod
+    def stream_user_rows(kind: str, user_id: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream a user's diagnoses or plants in batches"""
+        sql = _USER_DIAGNOSES_SQL if kind == "diagnoses" else _USER_PLANTS_SQL
+        return ExportService._stream_rows(sql, user_id)
+
+    @staticmethod
+    async def encode_ndjson(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+        """Encode row batches as NDJSON, one chunk per batch"""
+        async for batch in batches:
+            yield b"".join(ndjson_line(row) for row in batch)
+
+    @staticmethod
+    async def encode_csv(batches: AsyncIterator[List[Dict[str, Any]]], fields: Sequence[str]) -> AsyncIterator[bytes]:
+        """Encode row batches as CSV with a header row, one chunk per batch"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields)
+        writer.writeheader()
+        yield buffer.getvalue().encode()
+        async for batch in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(
+                {k: v.isoformat() if hasattr(v, "isoformat") else v for k, v in row.items()} for row in batch
+            )
+            yield buffer.getvalue().encode()
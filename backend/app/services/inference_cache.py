@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.metrics import INFERENCE_CACHE_ENTRIES, INFERENCE_CACHE_REQUESTS
+
+_M1, _M2, _M4, _H01 = (np.uint64(m) for m in (
+    0x5555555555555555, 0x3333333333333333, 0x0F0F0F0F0F0F0F0F, 0x0101010101010101))
+_NO_MATCH = 65  # further than any two 64-bit hashes
+
+
+def popcount(x: np.ndarray) -> np.ndarray:
+    """Set bits in each uint64 (np.bitwise_count needs numpy 2)"""
+    x = x - ((x >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return (x * _H01) >> np.uint64(56)
+
+
+def dhash(image: np.ndarray) -> int:
+    """64-bit difference hash of an (height, width, 3) uint8 image: whether each
+    cell of a 9x8 grayscale thumbnail is brighter than its right neighbour.
+
+    Re-encoding, rescaling and small exposure changes flip few bits, so
+    near-duplicate photos land within a small Hamming distance.
+    """
+    thumbnail = np.asarray(Image.fromarray(image).convert("L").resize((9, 8), Image.BOX), np.int16)
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class InferenceCache:
+    """LRU of model outputs keyed by (model version, image SHA-256), with an
+    optional tier matching near-duplicates by perceptual hash.
+
+    Outputs for an image never go stale for a given model version, so there
+    is no TTL; a new version simply stops matching and its entries age out.
+    Perceptual hashes sit in a flat array so a lookup is one vectorized
+    XOR and popcount over every entry rather than a Python loop.
+    """
+
+    def __init__(self, max_entries: int, max_distance: Optional[int]):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0}
+        # (version, sha256) -> (row in the hash arrays, value)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, Any]]" = OrderedDict()
+        self._hashes = np.zeros(max_entries, np.uint64)
+        self._versions = np.full(max_entries, -1, np.int32)  # -1: empty row or no hash
+        self._keys: List[Optional[Tuple[str, str]]] = [None] * max_entries
+        self._version_ids: Dict[str, int] = {}
+        self._free_rows = list(range(max_entries - 1, -1, -1))
+
+    @property
+    def similar_enabled(self) -> bool:
+        return self.max_distance is not None
+
+    def get(self, version: str, sha256: str) -> Optional[Any]:
+        """The cached value for exactly this image and model version"""
+        entry = self._entries.get((version, sha256))
+        self._record("exact", entry is not None)
+        if entry is None:
+            return None
+        self._entries.move_to_end((version, sha256))
+        return entry[1]
+
+    def get_similar(self, version: str, phash: int) -> Optional[Any]:
+        """The cached value of the closest image within max_distance bits of phash"""
+        version_id = self._version_ids.get(version, -2)  # -2 matches no row, not even empty ones
+        distances = popcount(self._hashes ^ np.uint64(phash))
+        distances[self._versions != version_id] = _NO_MATCH
+        best = int(np.argmin(distances))
+        hit = bool(distances[best] <= self.max_distance)
+        self._record("similar", hit)
+        if not hit:
+            return None
+        key = self._keys[best]
+        self._entries.move_to_end(key)
+        return self._entries[key][1]
+
+    def put(self, version: str, sha256: str, value: Any, phash: Optional[int] = None) -> None:
+        key = (version, sha256)
+        if key in self._entries:
+            row = self._entries[key][0]
+            self._entries.move_to_end(key)
+        else:
+            if not self._free_rows:
+                _, (row, _) = self._entries.popitem(last=False)
+                self._keys[row] = None
+                self._free_rows.append(row)
+            row = self._free_rows.pop()
+            self._keys[row] = key
+        self._entries[key] = (row, value)
+        if phash is None:
+            self._versions[row] = -1
+        else:
+            self._hashes[row] = phash
+            self._versions[row] = self._version_ids.setdefault(version, len(self._version_ids))
+        INFERENCE_CACHE_ENTRIES.set(len(self._entries))
+
+    def _record(self, tier: str, hit: bool) -> None:
+        # A similar lookup only follows an exact miss, so each image counts
+        # once in stats: as a hit in one tier or as a miss
+        if hit:
+            self.stats[f"{tier}_hits"] += 1
+        elif tier == "similar" or not self.similar_enabled:
+            self.stats["misses"] += 1
+        INFERENCE_CACHE_REQUESTS.labels(tier=tier, result="hit" if hit else "miss").inc()
+
+    def __len__(self) -> int:
+        return len(self._entries)
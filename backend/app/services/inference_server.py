@@ -0,0 +1,257 @@
+"""
+Dedicated inference process shared by every web worker
+
+Run one per host next to the API, then point the workers at its socket:
+
+    MODEL_PATH=models/plant_disease.keras INFERENCE_SOCKET=/tmp/plantify-inference.sock \\
+        python -m app.services.inference_server
+    INFERENCE_SOCKET=/tmp/plantify-inference.sock uvicorn app.main:app --workers 4
+
+Only this process loads the model, so memory no longer grows with the
+worker count, and requests from all workers share its micro-batches.
+
+Pixels never cross the socket. Each worker owns a shared-memory ring of
+slots, each one preprocessed image; the preprocessing pool writes straight
+into a slot, and the socket only carries descriptors:
+
+    server -> worker   one JSON line: model version, labels, input size
+    worker -> server   one JSON line: ring name and slot count
+    worker -> server   <request id: u64><slot: u32>
+    server -> worker   <request id: u64><status: u8><length: u32><payload>
+
+The payload is the float32 class probabilities, or an error message. A
+slot stays owned by the server from request until response.
+"""
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import struct
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.diagnosis_engine import (
+    InferenceOverloadedError, MicroBatcher, ModelNotLoadedError, load_configured_model,
+)
+
+REQUEST = struct.Struct("<QI")
+RESPONSE = struct.Struct("<QBI")
+STATUS_OK, STATUS_ERROR, STATUS_OVERLOADED = 0, 1, 2
+
+
+class InferenceUnavailableError(ModelNotLoadedError):
+    """Raised when the inference process cannot be reached"""
+
+
+class RemoteModel(NamedTuple):
+    """The model metadata the inference process announces; it has no predict"""
+    version: str
+    labels: List[str]
+    input_size: Tuple[int, int]
+
+
+def attach_ring(name: str, slots: int, input_size: Tuple[int, int]) -> Tuple[SharedMemory, np.ndarray]:
+    """Map a worker's ring without taking ownership of it.
+
+    This process has its own resource tracker, which would otherwise unlink
+    the segment when this process exits, pulling it from under the worker.
+    """
+    shm = SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm, ring_view(shm, slots, input_size)
+
+
+def ring_view(shm: SharedMemory, slots: int, input_size: Tuple[int, int]) -> np.ndarray:
+    return np.ndarray((slots, *input_size, 3), np.uint8, buffer=shm.buf)
+
+
+class InferenceClient:
+    """A web worker's connection to the inference process, with its shared-memory ring"""
+
+    def __init__(self, socket_path: str, slots: int):
+        self.socket_path = socket_path
+        self.slots = slots
+        self.model: Optional[RemoteModel] = None
+        self.shm: Optional[SharedMemory] = None
+        self.ring: Optional[np.ndarray] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._free: Optional[asyncio.Queue] = None
+        self._pending: Dict[int, Tuple[asyncio.Future, int]] = {}
+        self._orphaned: Set[int] = set()
+        self._ids = itertools.count()
+        self._read_task: Optional[asyncio.Task] = None
+        self._connecting = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._read_task is not None and not self._read_task.done()
+
+    async def connect(self) -> None:
+        async with self._connecting:
+            if not self.connected:
+                await self._connect()
+
+    async def _connect(self) -> None:
+        try:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        except OSError as exc:
+            raise InferenceUnavailableError(f"Inference process not reachable at {self.socket_path}") from exc
+        try:
+            info = json.loads(await self._reader.readline())
+        except ValueError as exc:
+            self._writer.close()
+            raise InferenceUnavailableError("Inference process closed the connection") from exc
+        model = RemoteModel(info["version"], info["labels"], tuple(info["input_size"]))
+        if self.shm is None or model.input_size != self.model.input_size:
+            self._close_ring()
+            height, width = model.input_size
+            self.shm = SharedMemory(create=True, size=self.slots * height * width * 3)
+            self.ring = ring_view(self.shm, self.slots, model.input_size)
+            self._free = asyncio.Queue()
+            for index in range(self.slots):
+                self._free.put_nowait(index)
+        self.model = model
+        self._writer.write(json.dumps({"shm": self.shm.name, "slots": self.slots}).encode() + b"\n")
+        self._read_task = asyncio.create_task(self._read_responses())
+
+    async def close(self) -> None:
+        if self._read_task is not None:
+            self._read_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._read_task
+        if self._writer is not None:
+            self._writer.close()
+        self._close_ring()
+        self.model = None
+
+    def _close_ring(self) -> None:
+        if self.shm is not None:
+            self.ring = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[int]:
+        """Borrow a ring slot to fill and send; waits while every slot is in flight"""
+        index = await self._free.get()
+        try:
+            yield index
+        finally:
+            # A cancelled request's slot is still being read by the server;
+            # it is returned when the response arrives
+            if index not in self._orphaned:
+                self._free.put_nowait(index)
+
+    async def infer(self, index: int) -> np.ndarray:
+        """Run the image in slot index through the model and return its probabilities"""
+        if not self.connected:
+            await self.connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (future, index)
+        self._writer.write(REQUEST.pack(request_id, index))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.done():
+                self._orphaned.add(index)
+            raise
+
+    async def _read_responses(self) -> None:
+        try:
+            while True:
+                request_id, status, length = RESPONSE.unpack(await self._reader.readexactly(RESPONSE.size))
+                payload = await self._reader.readexactly(length)
+                future, index = self._pending.pop(request_id)
+                if index in self._orphaned:
+                    # Its caller is gone; the slot is free again now
+                    self._orphaned.discard(index)
+                    self._free.put_nowait(index)
+                    continue
+                if status == STATUS_OK:
+                    future.set_result(np.frombuffer(payload, np.float32))
+                elif status == STATUS_OVERLOADED:
+                    future.set_exception(InferenceOverloadedError(payload.decode()))
+                else:
+                    future.set_exception(RuntimeError(payload.decode()))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # Connection gone: nothing pending will be answered, and the server
+            # has let go of every slot
+            for future, index in self._pending.values():
+                if not future.done():
+                    future.set_exception(InferenceUnavailableError("Inference process disconnected"))
+                if index in self._orphaned:
+                    self._free.put_nowait(index)
+            self._pending.clear()
+            self._orphaned.clear()
+
+
+class InferenceServer:
+    """Serves one model to many workers through a MicroBatcher fed from their rings"""
+
+    def __init__(self, model, batcher: MicroBatcher):
+        self.model = model
+        self.batcher = batcher
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        info = {"version": self.model.version, "labels": list(self.model.labels),
+                "input_size": list(self.model.input_size)}
+        writer.write(json.dumps(info).encode() + b"\n")
+        hello = json.loads(await reader.readline())
+        shm, ring = attach_ring(hello["shm"], hello["slots"], self.model.input_size)
+        answers: Set[asyncio.Task] = set()
+
+        async def answer(request_id: int, image: np.ndarray) -> None:
+            try:
+                payload, status = (await self.batcher.submit(image)).astype(np.float32).tobytes(), STATUS_OK
+            except InferenceOverloadedError as exc:
+                payload, status = str(exc).encode(), STATUS_OVERLOADED
+            except Exception as exc:
+                payload, status = f"{type(exc).__name__}: {exc}".encode(), STATUS_ERROR
+            if not writer.is_closing():
+                writer.write(RESPONSE.pack(request_id, status, len(payload)) + payload)
+
+        try:
+            while True:
+                request_id, index = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+                task = asyncio.create_task(answer(request_id, ring[index]))
+                answers.add(task)
+                task.add_done_callback(answers.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # The batcher may still copy from the ring; unmap only after it has
+            await asyncio.gather(*answers, return_exceptions=True)
+            writer.close()
+            del ring
+            shm.close()
+
+
+async def serve(socket_path: str) -> None:
+    """Load the configured model and serve it on a Unix socket until cancelled"""
+    model = await asyncio.to_thread(load_configured_model)
+    batcher = MicroBatcher(model.predict, model.input_size, settings.INFERENCE_MAX_BATCH_SIZE,
+                           settings.INFERENCE_MAX_WAIT_MS / 1000, settings.INFERENCE_MAX_QUEUE)
+    batcher.start()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(InferenceServer(model, batcher).handle, path=socket_path)
+    print(f"🌱 Inference process serving {model.version} on {socket_path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(settings.INFERENCE_SOCKET))
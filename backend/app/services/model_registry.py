@@ -0,0 +1,191 @@
+"""
+Diagnosis models per species group, loaded on first use
+
+MODEL_REGISTRY_PATH names a JSON file listing the models and the plant
+species each one serves; paths are relative to the file:
+
+    {
+      "default": "general",
+      "models": {
+        "general": {"path": "general/model.keras"},
+        "nightshades": {"path": "nightshades/model.keras", "species": ["Solanum", "Capsicum annuum"]}
+      }
+    }
+
+An entry may also set "labels" (default labels.txt beside the model) and
+"version" (default the model's file name). A plant's species picks the
+entry listing it, or its genus (the first word), case-insensitively, and
+"default" otherwise.
+
+Nothing is loaded at startup. The first request for a model loads it in a
+thread while concurrent requests for it wait on that same load, and each
+loaded model gets its own MicroBatcher. Loaded models are kept in LRU
+order; the least recently used that no request is holding are unloaded
+to keep the total within MODEL_REGISTRY_MAX_BYTES, so the budget is only
+exceeded while every loaded model is in use.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, NamedTuple, Optional
+
+from app.core.config import settings
+from app.core.metrics import MODEL_EVICTIONS, MODEL_LOAD_SECONDS, MODEL_LOADS, MODEL_RESIDENT_BYTES
+from app.services.diagnosis_engine import DiseaseModel, MicroBatcher, ModelNotLoadedError, load_labels, open_model
+
+
+class ModelSpec(NamedTuple):
+    name: str
+    path: str
+    labels_path: str
+    version: str
+    memory_bytes: int  # estimated from the size on disk, which the weights dominate
+
+
+class ResidentModel:
+    """A loaded model with its batcher; leases counts requests using it"""
+
+    def __init__(self, spec: ModelSpec, model: DiseaseModel, batcher: MicroBatcher):
+        self.spec = spec
+        self.model = model
+        self.batcher = batcher
+        self.leases = 0
+
+
+def disk_bytes(path: str) -> int:
+    """Size of a model file, or of every file in a SavedModel directory"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def load_spec_model(spec: ModelSpec) -> DiseaseModel:
+    model = open_model(spec.path, load_labels(spec.labels_path), spec.version)
+    model.warm_up(settings.INFERENCE_MAX_BATCH_SIZE)
+    return model
+
+
+class ModelRegistry:
+    """Routes species to models and keeps a memory-bounded LRU of loaded ones"""
+
+    def __init__(self, specs: Dict[str, ModelSpec], routes: Dict[str, str], default: Optional[str],
+                 max_bytes: int, loader: Callable[[ModelSpec], DiseaseModel] = load_spec_model):
+        self.specs = specs
+        self.routes = routes  # lower-cased species or genus -> model name
+        self.default = default
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self._resident: "OrderedDict[str, ResidentModel]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._reserved = 0  # memory of models being loaded
+
+    def route(self, species: Optional[str]) -> str:
+        """Name of the model serving species"""
+        key = (species or "").strip().lower()
+        name = self.routes.get(key) or self.routes.get(key.split(" ", 1)[0])
+        if name is None:
+            if self.default is None:
+                raise ModelNotLoadedError(f"No diagnosis model for species {species!r}")
+            name = self.default
+        return name
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(resident.spec.memory_bytes for resident in self._resident.values())
+
+    @asynccontextmanager
+    async def use(self, species: Optional[str]) -> AsyncIterator[ResidentModel]:
+        """The loaded model for species, which is not unloaded until the block exits"""
+        name = self.route(species)
+        # Another load may unload this model between its load and this
+        # request resuming, so check again and lease it without awaiting
+        while (resident := self._resident.get(name)) is None:
+            await self._load(name)
+        self._resident.move_to_end(name)
+        resident.leases += 1
+        try:
+            yield resident
+        finally:
+            resident.leases -= 1
+
+    async def _load(self, name: str) -> None:
+        task = self._loading.get(name)
+        if task is None:
+            task = self._loading[name] = asyncio.create_task(self._load_now(name))
+            task.add_done_callback(lambda _: self._loading.pop(name, None))
+        # Shielded so one cancelled request does not abort the load for the rest
+        await asyncio.shield(task)
+
+    async def _load_now(self, name: str) -> None:
+        spec = self.specs[name]
+        await self._make_room(spec.memory_bytes)
+        self._reserved += spec.memory_bytes
+        started = time.perf_counter()
+        try:
+            model = await asyncio.to_thread(self.loader, spec)
+        except Exception as exc:
+            MODEL_LOADS.labels(model=name, result="error").inc()
+            raise ModelNotLoadedError(f"Diagnosis model {name} failed to load: {exc}") from exc
+        finally:
+            self._reserved -= spec.memory_bytes
+        batcher = MicroBatcher(model.predict, model.input_size, settings.INFERENCE_MAX_BATCH_SIZE,
+                               settings.INFERENCE_MAX_WAIT_MS / 1000, settings.INFERENCE_MAX_QUEUE)
+        batcher.start()
+        self._resident[name] = ResidentModel(spec, model, batcher)
+        MODEL_LOADS.labels(model=name, result="loaded").inc()
+        MODEL_LOAD_SECONDS.labels(model=name).observe(time.perf_counter() - started)
+        MODEL_RESIDENT_BYTES.labels(model=name).set(spec.memory_bytes)
+
+    async def _make_room(self, needed: int) -> None:
+        """Unload idle models, least recently used first, until needed more bytes fit"""
+        for name in list(self._resident):
+            if self.resident_bytes + self._reserved + needed <= self.max_bytes:
+                return
+            resident = self._resident.get(name)
+            if resident is not None and resident.leases == 0:
+                await self._unload(name)
+                MODEL_EVICTIONS.labels(model=name).inc()
+
+    async def _unload(self, name: str) -> None:
+        # Out of the LRU before awaiting, so no new request can lease it
+        resident = self._resident.pop(name)
+        MODEL_RESIDENT_BYTES.remove(name)
+        await resident.batcher.stop()
+
+    async def stop(self) -> None:
+        for task in list(self._loading.values()):
+            task.cancel()
+        for name in list(self._resident):
+            await self._unload(name)
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            "loaded": {name: resident.spec.version for name, resident in self._resident.items()},
+            "resident_bytes": self.resident_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def load_model_registry(path: str, max_bytes: int) -> ModelRegistry:
+    """Read a registry file (see the module docstring); models are not loaded yet"""
+    with open(path) as handle:
+        config = json.load(handle)
+    base = os.path.dirname(os.path.abspath(path))
+    specs: Dict[str, ModelSpec] = {}
+    routes: Dict[str, str] = {}
+    for name, entry in config["models"].items():
+        model_path = os.path.join(base, entry["path"])
+        labels_path = os.path.join(base, entry["labels"]) if "labels" in entry else \
+            os.path.join(os.path.dirname(model_path), "labels.txt")
+        version = entry.get("version") or os.path.basename(model_path.rstrip("/"))
+        specs[name] = ModelSpec(name, model_path, labels_path, version, disk_bytes(model_path))
+        for species in entry.get("species", []):
+            routes[species.strip().lower()] = name
+    default = config.get("default")
+    if default is not None and default not in specs:
+        raise ValueError(f"{path}: default model {default!r} is not listed in models")
+    return ModelRegistry(specs, routes, default, max_bytes)
@@ -0,0 +1,45 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from app.core.db_router import read_connection, route_reads
+from app.core.pagination import KEYSET_ORDERING
+from app.models.plant import Plant
+from app.services.diagnosis_service import DIAGNOSIS_FIELDS
+from app.services.plant_service import PLANT_HEALTH_FIELDS
+from app.services.user_service import UserService
+
+# Newest N diagnoses of each listed plant: one index range scan on
+# (plant_id, created_at, id) per plant, all in a single statement
+_RECENT_DIAGNOSES_SQL = (
+    "SELECT " + ", ".join(f"d.{field}" for field in DIAGNOSIS_FIELDS) + " "
+    "FROM unnest($1::int[]) AS p(id) CROSS JOIN LATERAL ("
+    "SELECT * FROM diagnoses WHERE plant_id = p.id ORDER BY created_at DESC, id DESC LIMIT $2"
+    ") d"
+)
+
+@route_reads
+class OverviewService:
+    @staticmethod
+    async def get_recent_diagnoses(plant_ids: List[int], per_plant: int) -> Dict[int, List[Dict[str, Any]]]:
+        """Get the newest per_plant diagnoses of each plant, newest first"""
+        recent: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        if not plant_ids or not per_plant:
+            return recent
+        rows = await read_connection().execute_query_dict(_RECENT_DIAGNOSES_SQL, [plant_ids, per_plant])
+        for row in rows:
+            recent[row["plant_id"]].append(row)
+        return recent
+    
+    @staticmethod
+    async def get_user_overview(user_id: int, diagnoses_per_plant: int = 3, plant_limit: int = 100) -> Optional[Dict[str, Any]]:
+        """Get a user with their newest plants and each plant's recent diagnoses in three queries"""
+        user, plants = await asyncio.gather(
+            UserService.get_user_by_id(user_id),
+            Plant.filter(user_id=user_id).order_by(*KEYSET_ORDERING).limit(plant_limit).values(*PLANT_HEALTH_FIELDS),
+        )
+        if user is None:
+            return None
+        recent = await OverviewService.get_recent_diagnoses([plant["id"] for plant in plants], diagnoses_per_plant)
+        for plant in plants:
+            plant["recent_diagnoses"] = recent.get(plant["id"], [])
+        return {**user.model_dump(), "plants": plants}
@@ -0,0 +1,111 @@
+from typing import Iterable, List, Optional
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from app.core.config import settings
+from app.models.diagnosis import Diagnosis
+
+# Fold one new diagnosis into the summary: exponential moving average with
+# weight $2 on the new sample, seeded by the first sample. Only applies when
+# the diagnosis is the plant's newest; a concurrent create that committed a
+# newer one first leaves the row untouched (see PlantHealthService.record).
+_RECORD_SQL = """
+UPDATE plants SET
+    diagnosis_count = diagnosis_count + 1,
+    health_score = CASE WHEN health_score IS NULL THEN $3::float8
+                        ELSE $2::float8 * $3::float8 + (1 - $2::float8) * health_score END,
+    last_diagnosis_at = $4,
+    last_disease_name = $5,
+    last_confidence_score = $6,
+    last_is_healthy = $7
+WHERE id = $1 AND (last_diagnosis_at IS NULL OR last_diagnosis_at <= $4)
+RETURNING id
+"""
+
+# Take the plant row lock before refresh reads diagnoses, so the refresh
+# snapshot includes every create that updated the row before us. NO KEY
+# UPDATE is what the UPDATE itself takes; FOR UPDATE would also wait on the
+# KEY SHARE locks that diagnosis inserts hold for their foreign key.
+_LOCK_SQL = 'SELECT "id" FROM plants WHERE "id" = $1 FOR NO KEY UPDATE'
+
+# Recompute the summary of the given plants from their diagnoses. The score
+# replays the moving average over the newest $3 diagnoses: the sample at
+# recency rn weighs alpha * (1 - alpha)^rn, except the oldest in the window
+# which seeds the average and weighs (1 - alpha)^rn. Plants without
+# diagnoses are reset.
+_REFRESH_SQL = """
+WITH ranked AS (
+    SELECT d.plant_id, d.created_at, d.disease_name, d.confidence_score, d.is_healthy,
+           CASE WHEN d.is_healthy THEN d.confidence_score ELSE 1 - d.confidence_score END AS sample,
+           row_number() OVER (PARTITION BY d.plant_id ORDER BY d.created_at DESC, d.id DESC) - 1 AS rn,
+           count(*) OVER (PARTITION BY d.plant_id) AS total
+    FROM diagnoses d
+    WHERE d.plant_id = ANY($1::int[])
+), summary AS (
+    SELECT plant_id,
+           max(total) AS total,
+           sum(sample * CASE WHEN rn = least(total, $3::int) - 1 THEN power(1 - $2::float8, rn)
+                             ELSE $2::float8 * power(1 - $2::float8, rn) END)
+               FILTER (WHERE rn < $3::int) AS health_score,
+           max(created_at) FILTER (WHERE rn = 0) AS last_diagnosis_at,
+           max(disease_name) FILTER (WHERE rn = 0) AS last_disease_name,
+           max(confidence_score) FILTER (WHERE rn = 0) AS last_confidence_score,
+           bool_or(is_healthy) FILTER (WHERE rn = 0) AS last_is_healthy
+    FROM ranked
+    GROUP BY plant_id
+)
+UPDATE plants p SET
+    diagnosis_count = COALESCE(s.total, 0),
+    health_score = s.health_score,
+    last_diagnosis_at = s.last_diagnosis_at,
+    last_disease_name = s.last_disease_name,
+    last_confidence_score = s.last_confidence_score,
+    last_is_healthy = s.last_is_healthy
+FROM unnest($1::int[]) AS ids(id)
+LEFT JOIN summary s ON s.plant_id = ids.id
+WHERE p.id = ids.id
+RETURNING p.id
+"""
+
+
+def health_sample(confidence_score: float, is_healthy: bool) -> float:
+    """A diagnosis scores its confidence when healthy and the complement when diseased"""
+    return confidence_score if is_healthy else 1 - confidence_score
+
+
+class PlantHealthService:
+    """Maintains the denormalized health summary columns on plants.
+
+    Callers pass the connection of the transaction that wrote the diagnoses
+    so the summary commits or rolls back together with them.
+    """
+
+    @staticmethod
+    async def record(conn: BaseDBAsyncClient, diagnosis: Diagnosis) -> None:
+        """Fold a newly created diagnosis into its plant's summary.
+
+        Concurrent creates can commit out of created_at order; a diagnosis
+        older than the plant's latest is recomputed with refresh instead, so
+        the summary never points back at it. The row is locked first: a
+        refresh that waited on another create's lock would otherwise
+        overwrite that create's update with counts from before it.
+        """
+        rowcount, _ = await conn.execute_query(_RECORD_SQL, [
+            diagnosis.plant_id, settings.HEALTH_SCORE_ALPHA,
+            health_sample(diagnosis.confidence_score, diagnosis.is_healthy), diagnosis.created_at,
+            diagnosis.disease_name, diagnosis.confidence_score, diagnosis.is_healthy,
+        ])
+        if rowcount == 0:
+            await conn.execute_query(_LOCK_SQL, [diagnosis.plant_id])
+            await PlantHealthService.refresh([diagnosis.plant_id], conn)
+
+    @staticmethod
+    async def refresh(plant_ids: Iterable[int], conn: Optional[BaseDBAsyncClient] = None) -> int:
+        """Recompute the summary of plant_ids from their diagnoses, returning plants updated"""
+        ids: List[int] = sorted(set(plant_ids))
+        if not ids:
+            return 0
+        conn = conn or connections.get("default")
+        rowcount, _ = await conn.execute_query(
+            _REFRESH_SQL, [ids, settings.HEALTH_SCORE_ALPHA, settings.HEALTH_SCORE_WINDOW]
+        )
+        return rowcount
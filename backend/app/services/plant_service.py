@@ -1,9 +1,29 @@
-from typing import List, Optional
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 from app.models.plant import Plant
 from app.models.user import User
-from app.schemas.plant import PlantCreate, PlantUpdate
+from app.schemas.plant import PlantCreate, PlantUpdate, PlantResponse, PlantHealthResponse
+from app.schemas.bulk import BulkCreateResponse
+from app.core.cache import entity_cache
+from app.core.db_router import primary, route_reads
+from app.core.counters import (
+    DIAGNOSES_COUNT_KEY, PLANTS_COUNT_KEY, CountMode, count_rows, counter_cache,
+    diagnoses_by_plant_count_key, diagnoses_by_user_count_key, plants_by_user_count_key,
+)
+from app.core.pagination import Cursor, paginate
+from app.services.bulk import bulk_create_checked
+from app.services.writes import columns, delete_returning, update_returning
 from tortoise.exceptions import DoesNotExist
 
+# Columns read by list endpoints: exactly what PlantResponse serializes
+PLANT_FIELDS = tuple(PlantResponse.model_fields)
+PLANT_HEALTH_FIELDS = tuple(PlantHealthResponse.model_fields)
+
+def plant_cache_key(plant_id: int) -> str:
+    return f"plant:{plant_id}"
+
+@route_reads
 class PlantService:
     @staticmethod
     async def create_plant(plant_data: PlantCreate) -> Optional[Plant]:
@@ -13,57 +33,77 @@ class PlantService:
             user = await User.get(id=plant_data.user_id)
             plant_dict = plant_data.model_dump()
             plant_dict['user_id'] = plant_dict.pop('user_id')
-            return await Plant.create(user=user, **{k: v for k, v in plant_dict.items() if k != 'user_id'})
+            plant = await Plant.create(user=user, **{k: v for k, v in plant_dict.items() if k != 'user_id'})
+            await counter_cache.adjust({PLANTS_COUNT_KEY: 1, plants_by_user_count_key(user.id): 1})
+            return plant
         except DoesNotExist:
             return None
     
     @staticmethod
-    async def get_plant_by_id(plant_id: int) -> Optional[Plant]:
-        """Get plant by ID with user relationship"""
-        try:
-            return await Plant.get(id=plant_id).prefetch_related('user')
-        except DoesNotExist:
-            return None
+    async def bulk_create_plants(plants_data: List[PlantCreate]) -> BulkCreateResponse:
+        """Create many plants with one user check and one multi-row insert"""
+        result = await bulk_create_checked(Plant, User, "user_id", plants_data, "User not found")
+        if result.created:
+            per_user = Counter(plants_data[r.index].user_id for r in result.results if r.success)
+            deltas = {plants_by_user_count_key(user_id): n for user_id, n in per_user.items()}
+            await counter_cache.adjust({PLANTS_COUNT_KEY: result.created, **deltas})
+        return result
+    
+    @staticmethod
+    async def get_plant_by_id(plant_id: int) -> Optional[PlantResponse]:
+        """Get plant by ID (read-through cached)"""
+        return await entity_cache.read_through(
+            plant_cache_key(plant_id), PlantResponse, lambda: Plant.get_or_none(id=plant_id).using_db(primary())
+        )
     
     @staticmethod
-    async def get_all_plants(skip: int = 0, limit: int = 100) -> List[Plant]:
-        """Get all plants with pagination"""
-        return await Plant.all().prefetch_related('user').offset(skip).limit(limit)
+    async def get_all_plants(skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None) -> List[Dict[str, Any]]:
+        """Get all plants with offset or keyset pagination"""
+        return await paginate(Plant.all(), skip, limit, cursor).values(*PLANT_FIELDS)
     
     @staticmethod
-    async def get_plants_by_user(user_id: int, skip: int = 0, limit: int = 100) -> List[Plant]:
+    async def get_plants_by_user(user_id: int, skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None) -> List[Dict[str, Any]]:
         """Get all plants for a specific user"""
-        return await Plant.filter(user_id=user_id).prefetch_related('user').offset(skip).limit(limit)
+        return await paginate(Plant.filter(user_id=user_id), skip, limit, cursor).values(*PLANT_FIELDS)
     
     @staticmethod
-    async def update_plant(plant_id: int, plant_data: PlantUpdate) -> Optional[Plant]:
-        """Update plant by ID"""
-        try:
-            plant = await Plant.get(id=plant_id)
-            update_data = plant_data.model_dump(exclude_unset=True)
-            if update_data:
-                await plant.update_from_dict(update_data)
-                await plant.save()
-            return await Plant.get(id=plant_id).prefetch_related('user')
-        except DoesNotExist:
-            return None
+    async def get_plant_health_by_user(user_id: int, skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None) -> List[Dict[str, Any]]:
+        """Get a user's plants with their denormalized health summary"""
+        return await paginate(Plant.filter(user_id=user_id), skip, limit, cursor).values(*PLANT_HEALTH_FIELDS)
     
     @staticmethod
-    async def delete_plant(plant_id: int) -> bool:
-        """Delete plant by ID"""
-        try:
-            plant = await Plant.get(id=plant_id)
-            await plant.delete()
-            return True
-        except DoesNotExist:
+    async def update_plant(plant_id: int, plant_data: PlantUpdate,
+                           if_match: Optional[List[datetime]] = None) -> Optional[Dict[str, Any]]:
+        """Update plant by ID with one UPDATE ... RETURNING"""
+        # Only edited columns are written, so a concurrent diagnosis write to
+        # the health summary is never overwritten with stale values
+        update_data = plant_data.model_dump(exclude_unset=True)
+        plant = await update_returning(primary(), "plants", plant_id, update_data, columns(PLANT_FIELDS), if_match)
+        if plant is not None and update_data:
+            await entity_cache.invalidate(plant_cache_key(plant_id))
+        return plant
+    
+    @staticmethod
+    async def delete_plant(plant_id: int, if_match: Optional[List[datetime]] = None) -> bool:
+        """Delete plant by ID with one DELETE ... RETURNING"""
+        plant = await delete_returning(primary(), "plants", plant_id, '"user_id"', if_match)
+        if plant is None:
             return False
+        user_id = plant["user_id"]
+        await entity_cache.invalidate(plant_cache_key(plant_id))
+        await counter_cache.adjust({PLANTS_COUNT_KEY: -1, plants_by_user_count_key(user_id): -1})
+        # The cascade removed an unknown number of diagnoses; recount lazily
+        await counter_cache.invalidate(
+            DIAGNOSES_COUNT_KEY, diagnoses_by_plant_count_key(plant_id), diagnoses_by_user_count_key(user_id)
+        )
+        return True
     
     @staticmethod
-    async def get_plants_count() -> int:
+    async def get_plants_count(mode: CountMode = "exact") -> int:
         """Get total count of plants"""
-        return await Plant.all().count()
+        return await count_rows(mode, PLANTS_COUNT_KEY, Plant.all(), table="plants")
     
     @staticmethod
-    async def get_plants_count_by_user(user_id: int) -> int:
+    async def get_plants_count_by_user(user_id: int, mode: CountMode = "exact") -> int:
         """Get count of plants for a specific user"""
-        return await Plant.filter(user_id=user_id).count()
\ No newline at end of file
+        return await count_rows(mode, plants_by_user_count_key(user_id), Plant.filter(user_id=user_id))
\ No newline at end of file
@@ -0,0 +1,123 @@
+import asyncio
+import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.core.metrics import PREPROCESS_SECONDS
+from app.core.storage import storage
+
+# This module is imported by the pool's worker processes: keep its imports
+# light (no TensorFlow, no database).
+
+
+class ImageDecodeError(ValueError):
+    """Raised when stored bytes cannot be decoded as an image"""
+
+
+class ImageTooLargeError(ImageDecodeError):
+    """Raised from the image header, before decoding, when it has too many pixels"""
+
+
+Timings = Dict[str, float]
+
+# (shared memory name, slot index): where to write a preprocessed image
+# instead of returning it, see app/services/inference_server.py
+Slot = Tuple[str, int]
+
+# Rings this process has mapped. Pool workers share the web worker's
+# resource tracker, so attaching here registers nothing new.
+_attached: Dict[str, SharedMemory] = {}
+
+
+def slot_view(slot: Slot, size: Tuple[int, int]) -> np.ndarray:
+    name, index = slot
+    shm = _attached.get(name)
+    if shm is None:
+        shm = _attached[name] = SharedMemory(name=name)
+    return np.ndarray((*size, 3), np.uint8, buffer=shm.buf, offset=index * size[0] * size[1] * 3)
+
+
+def load_image(source: Union[str, bytes], size: Tuple[int, int], max_pixels: int,
+               out: Optional[Slot] = None) -> Tuple[Optional[np.ndarray], Timings]:
+    """Decode, EXIF-rotate and resize an image file (or its bytes) to (height, width, 3) uint8,
+    returned or, given out, written into a shared-memory slot.
+
+    Only the header is read before the pixel count is checked, so
+    decompression bombs are refused without allocating them. JPEGs are
+    decoded at the smallest DCT scale (1/2 to 1/8) still covering the
+    target size, which skips most of the work for large phone photos.
+    """
+    timings: Timings = {}
+    started = time.perf_counter()
+    try:
+        with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as image:
+            if image.width * image.height > max_pixels:
+                raise ImageTooLargeError(f"{image.width}x{image.height} exceeds {max_pixels} pixels")
+            timings["open"] = time.perf_counter() - started
+            side = max(size)  # EXIF rotation may swap the axes, so draft for both
+            image.draft("RGB", (side, side))
+            image.load()
+            timings["decode"] = time.perf_counter() - started - timings["open"]
+            resized = time.perf_counter()
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image = image.resize((size[1], size[0]), Image.BILINEAR, reducing_gap=3.0)
+            array = np.asarray(image, dtype=np.uint8)
+            if out is not None:
+                slot_view(out, size)[...] = array
+                array = None
+            timings["resize"] = time.perf_counter() - resized
+    except Image.DecompressionBombError as exc:
+        raise ImageTooLargeError(str(exc)) from exc
+    except (UnidentifiedImageError, OSError) as exc:
+        raise ImageDecodeError(str(exc)) from exc
+    return array, timings
+
+
+class ImagePreprocessor:
+    """Runs load_image in a pool of worker processes so decoding never
+    competes with the event loop for the GIL.
+
+    Workers open local blobs by path, so only the key goes in and the small
+    resized array comes back; other backends send the bytes. With workers=0
+    it runs in a thread of this process instead (tests, single-core hosts).
+    """
+
+    def __init__(self, workers: int, max_pixels: int):
+        self.workers = workers
+        self.max_pixels = max_pixels
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        if self.workers > 0:
+            # spawn, not fork: the parent may hold TensorFlow and asyncio state
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def stop(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def load(self, image_key: str, size: Tuple[int, int],
+                   out: Optional[Slot] = None) -> Tuple[Optional[np.ndarray], Timings]:
+        """Load a stored image resized for the model, returned or written to out;
+        raises FileNotFoundError for unknown keys"""
+        started = time.perf_counter()
+        source = storage.local_path(image_key) or await storage.read(image_key)
+        read = time.perf_counter()
+        if self._pool is not None:
+            loop = asyncio.get_running_loop()
+            image, timings = await loop.run_in_executor(self._pool, load_image, source, size, self.max_pixels, out)
+        else:
+            image, timings = await asyncio.to_thread(load_image, source, size, self.max_pixels, out)
+        # Whatever the worker did not account for was spent queued for it
+        timings["read"] = read - started
+        timings["queue"] = max(0.0, time.perf_counter() - read - sum(v for k, v in timings.items() if k != "read"))
+        for stage, seconds in timings.items():
+            PREPROCESS_SECONDS.labels(stage).observe(seconds)
+        return image, timings
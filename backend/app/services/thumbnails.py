@@ -0,0 +1,136 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.core.config import settings
+from app.core.metrics import THUMBNAIL_REQUESTS, THUMBNAIL_SECONDS
+from app.core.storage import key_sha256, storage
+from app.services.preprocessing import ImageDecodeError, ImageTooLargeError
+
+# Like preprocessing, this module is imported by pool worker processes:
+# keep its imports light.
+
+FORMATS = {"webp": ("image/webp", ".webp"), "jpeg": ("image/jpeg", ".jpg")}
+
+
+def width_bucket(width: int, buckets: List[int]) -> int:
+    """The smallest bucket at least width wide, or the largest"""
+    return next((bucket for bucket in sorted(buckets) if bucket >= width), max(buckets))
+
+
+def render_derivative(source: Union[str, bytes], width: int, fmt: str, quality: int, max_pixels: int,
+                      path: str) -> None:
+    """Write an image file (or its bytes) at most width pixels wide to path as fmt.
+
+    EXIF orientation is applied and all metadata dropped, GPS included.
+    JPEGs are decoded at the smallest DCT scale still covering width. The
+    file appears at path complete or not at all.
+    """
+    try:
+        with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as image:
+            if image.width * image.height > max_pixels:
+                raise ImageTooLargeError(f"{image.width}x{image.height} exceeds {max_pixels} pixels")
+            image.draft("RGB", (width, width))  # EXIF rotation may swap the axes
+            image.load()
+            image = ImageOps.exif_transpose(image)
+    except Image.DecompressionBombError as exc:
+        raise ImageTooLargeError(str(exc)) from exc
+    except (UnidentifiedImageError, OSError) as exc:
+        raise ImageDecodeError(str(exc)) from exc
+    transparent = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if transparent and fmt == "jpeg":
+        flattened = Image.new("RGB", image.size, (255, 255, 255))
+        flattened.paste(image.convert("RGBA"), mask=image.convert("RGBA"))
+        image = flattened
+    else:
+        image = image.convert("RGBA" if transparent else "RGB")
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS,
+                             reducing_gap=3.0)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "webp":
+        image.save(tmp_path, "WEBP", quality=quality, method=4)
+    else:
+        image.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+
+
+class ThumbnailCache:
+    """Resized copies of stored images, made once and kept on disk.
+
+    Derivatives are named by image SHA-256, width, quality and format, so a
+    cached file never goes stale and needs no lookup table: its existence is
+    the cache hit. Misses are rendered in a process pool (a thread with
+    workers=0), and concurrent requests for the same derivative wait on the
+    one rendering it.
+    """
+
+    def __init__(self, root: str, quality: int, workers: int, max_pixels: int):
+        self.root = root
+        self.quality = quality
+        self.workers = workers
+        self.max_pixels = max_pixels
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def start(self) -> None:
+        if self.workers > 0:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def stop(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def path(self, sha256: str, width: int, fmt: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}-w{width}-q{self.quality}{FORMATS[fmt][1]}")
+
+    def etag(self, sha256: str, width: int, fmt: str) -> str:
+        return f'"{sha256[:32]}-w{width}-q{self.quality}-{fmt}"'
+
+    async def get(self, image_key: str, width: int, fmt: str) -> str:
+        """Path of image_key at most width pixels wide in fmt, rendered if needed;
+        raises FileNotFoundError for unknown keys"""
+        sha256 = key_sha256(image_key)
+        if sha256 is None:
+            raise FileNotFoundError(image_key)
+        path = self.path(sha256, width, fmt)
+        if os.path.exists(path):
+            THUMBNAIL_REQUESTS.labels("cached").inc()
+            return path
+        task = self._pending.get(path)
+        if task is None:
+            task = self._pending[path] = asyncio.create_task(self._render(image_key, width, fmt, path))
+            task.add_done_callback(lambda _: self._pending.pop(path, None))
+            THUMBNAIL_REQUESTS.labels("generated").inc()
+        else:
+            THUMBNAIL_REQUESTS.labels("coalesced").inc()
+        # Shielded so one client hanging up does not fail the others
+        await asyncio.shield(task)
+        return path
+
+    async def _render(self, image_key: str, width: int, fmt: str, path: str) -> None:
+        started = time.perf_counter()
+        source = storage.local_path(image_key) or await storage.read(image_key)
+        args = (source, width, fmt, self.quality, self.max_pixels, path)
+        if self._pool is not None:
+            await asyncio.get_running_loop().run_in_executor(self._pool, render_derivative, *args)
+        else:
+            await asyncio.to_thread(render_derivative, *args)
+        THUMBNAIL_SECONDS.observe(time.perf_counter() - started)
+
+
+thumbnails = ThumbnailCache(
+    settings.THUMBNAIL_DIR or os.path.join(settings.UPLOAD_DIR, ".thumbnails"),
+    settings.THUMBNAIL_QUALITY,
+    settings.THUMBNAIL_WORKERS if settings.THUMBNAIL_WORKERS is not None else os.cpu_count() or 1,
+    settings.PREPROCESS_MAX_PIXELS,
+)
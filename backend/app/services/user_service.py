@@ -1,59 +1,130 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 from app.models.user import User
-from app.schemas.user import UserCreate, UserUpdate
-from tortoise.exceptions import DoesNotExist
+from app.schemas.user import UserCreate, UserUpdate, UserResponse
+from app.core.cache import entity_cache
+from app.core.db_router import primary, route_reads
+from app.core.counters import (
+    DIAGNOSES_COUNT_KEY, PLANTS_COUNT_KEY, USERS_COUNT_KEY, CountMode, count_rows, counter_cache,
+    diagnoses_by_plant_count_key, diagnoses_by_user_count_key, plants_by_user_count_key,
+)
+from app.core.pagination import Cursor, paginate
+from app.services.plant_service import plant_cache_key
+from app.services.writes import columns, delete_returning, update_returning
+from tortoise.exceptions import DoesNotExist, IntegrityError
 
+# Columns read by list endpoints: exactly what UserResponse serializes
+USER_FIELDS = tuple(UserResponse.model_fields)
+
+def user_cache_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def user_email_cache_key(email: str) -> str:
+    # Points at the user id; the user entry is checked to still carry this email
+    return f"user_email:{email}"
+
+class DuplicateEmailError(Exception):
+    """Another user already has this email (enforced by the users.email unique index)"""
+
+# Insert unless the email is taken; the union reads the existing row in the
+# same statement. A row committed concurrently after the statement's snapshot
+# is invisible to that read, so an empty result means: look again.
+_GET_OR_CREATE_SQL = (
+    "WITH inserted AS ("
+    "INSERT INTO users (email, name, created_at, updated_at) VALUES ($1, $2, now(), now()) "
+    "ON CONFLICT (email) DO NOTHING RETURNING " + columns(USER_FIELDS) + ") "
+    "SELECT " + columns(USER_FIELDS) + ", true AS created FROM inserted "
+    "UNION ALL "
+    "SELECT " + columns(USER_FIELDS) + ", false AS created FROM users WHERE email = $1"
+)
+
+@route_reads
 class UserService:
     @staticmethod
-    async def create_user(user_data: UserCreate) -> User:
-        """Create a new user"""
-        return await User.create(**user_data.model_dump())
-    
-    @staticmethod
-    async def get_user_by_id(user_id: int) -> Optional[User]:
-        """Get user by ID"""
+    async def create_user(user_data: UserCreate) -> Optional[User]:
+        """Create a new user, or return None if the email is already taken"""
         try:
-            return await User.get(id=user_id)
-        except DoesNotExist:
+            user = await User.create(**user_data.model_dump())
+        except IntegrityError:
             return None
+        await counter_cache.adjust({USERS_COUNT_KEY: 1})
+        return user
     
     @staticmethod
-    async def get_user_by_email(email: str) -> Optional[User]:
-        """Get user by email"""
-        try:
-            return await User.get(email=email)
-        except DoesNotExist:
-            return None
+    async def get_or_create_user(user_data: UserCreate) -> Tuple[Dict[str, Any], bool]:
+        """Return the user with this email, creating it if needed, and whether it was created"""
+        while True:
+            rows = await primary().execute_query_dict(_GET_OR_CREATE_SQL, [user_data.email, user_data.name])
+            if rows:
+                user = rows[0]
+                created = user.pop("created")
+                if created:
+                    await counter_cache.adjust({USERS_COUNT_KEY: 1})
+                return user, created
     
     @staticmethod
-    async def get_all_users(skip: int = 0, limit: int = 100) -> List[User]:
-        """Get all users with pagination"""
-        return await User.all().offset(skip).limit(limit)
+    async def get_user_by_id(user_id: int) -> Optional[UserResponse]:
+        """Get user by ID (read-through cached)"""
+        return await entity_cache.read_through(
+            user_cache_key(user_id), UserResponse, lambda: User.get_or_none(id=user_id).using_db(primary())
+        )
     
     @staticmethod
-    async def update_user(user_id: int, user_data: UserUpdate) -> Optional[User]:
-        """Update user by ID"""
+    async def get_user_by_email(email: str) -> Optional[UserResponse]:
+        """Get user by email (read-through cached)"""
+        cached_id = await entity_cache.get(user_email_cache_key(email))
+        if cached_id is not None:
+            user = await UserService.get_user_by_id(int(cached_id))
+            if user is not None and user.email == email:
+                return user
         try:
-            user = await User.get(id=user_id)
-            update_data = user_data.model_dump(exclude_unset=True)
-            if update_data:
-                await user.update_from_dict(update_data)
-                await user.save()
-            return user
+            user = UserResponse.model_validate(await User.get(email=email).using_db(primary()))
         except DoesNotExist:
             return None
+        await entity_cache.fill(user_cache_key(user.id), user.model_dump_json())
+        await entity_cache.set(user_email_cache_key(email), str(user.id))
+        return user
+    
+    @staticmethod
+    async def get_all_users(skip: int = 0, limit: int = 100, cursor: Optional[Cursor] = None) -> List[Dict[str, Any]]:
+        """Get all users with offset or keyset pagination"""
+        return await paginate(User.all(), skip, limit, cursor).values(*USER_FIELDS)
     
     @staticmethod
-    async def delete_user(user_id: int) -> bool:
-        """Delete user by ID"""
+    async def update_user(user_id: int, user_data: UserUpdate,
+                          if_match: Optional[List[datetime]] = None) -> Optional[Dict[str, Any]]:
+        """Update user by ID with one UPDATE ... RETURNING; raises DuplicateEmailError"""
+        update_data = user_data.model_dump(exclude_unset=True)
         try:
-            user = await User.get(id=user_id)
-            await user.delete()
-            return True
-        except DoesNotExist:
+            user = await update_returning(primary(), "users", user_id, update_data, columns(USER_FIELDS), if_match)
+        except IntegrityError as exc:
+            raise DuplicateEmailError(update_data.get("email")) from exc
+        if user is not None and update_data:
+            await entity_cache.invalidate(user_cache_key(user_id))
+        return user
+    
+    @staticmethod
+    async def delete_user(user_id: int, if_match: Optional[List[datetime]] = None) -> bool:
+        """Delete user by ID with one DELETE ... RETURNING"""
+        # Plants are deleted by the cascade, so their cache entries go too;
+        # RETURNING still sees them, as it runs before the cascade
+        user = await delete_returning(
+            primary(), "users", user_id,
+            """(SELECT coalesce(array_agg("id"), '{}') FROM "plants" WHERE "user_id" = "users"."id") AS plant_ids""",
+            if_match,
+        )
+        if user is None:
             return False
+        plant_ids = user["plant_ids"]
+        await entity_cache.invalidate(user_cache_key(user_id), *(plant_cache_key(pid) for pid in plant_ids))
+        await counter_cache.adjust({USERS_COUNT_KEY: -1})
+        await counter_cache.invalidate(
+            PLANTS_COUNT_KEY, DIAGNOSES_COUNT_KEY, plants_by_user_count_key(user_id),
+            diagnoses_by_user_count_key(user_id), *(diagnoses_by_plant_count_key(pid) for pid in plant_ids)
+        )
+        return True
     
     @staticmethod
-    async def get_users_count() -> int:
+    async def get_users_count(mode: CountMode = "exact") -> int:
         """Get total count of users"""
-        return await User.all().count()
\ No newline at end of file
+        return await count_rows(mode, USERS_COUNT_KEY, User.all(), table="users")
\ No newline at end of file
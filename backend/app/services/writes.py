@@ -0,0 +1,57 @@
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+from tortoise.backends.base.client import BaseDBAsyncClient
+from app.core.preconditions import PreconditionFailedError
+
+# Single-statement writes by primary key. Each returns the affected row (or
+# None when nothing matched) from one round trip; only a miss under an
+# If-Match precondition costs a second query to tell 404 from 412.
+
+def columns(fields: Sequence[str]) -> str:
+    return ", ".join(f'"{field}"' for field in fields)
+
+def _where(row_id: int, if_match: Optional[List[datetime]], params: List[Any]) -> str:
+    params.append(row_id)
+    where = f'"id" = ${len(params)}'
+    if if_match is not None:
+        params.append(if_match)
+        where += f' AND "updated_at" = ANY(${len(params)}::timestamptz[])'
+    return where
+
+async def _miss(conn: BaseDBAsyncClient, table: str, row_id: int, if_match: Optional[List[datetime]]) -> None:
+    """Raise PreconditionFailedError if the row exists and the miss was the precondition's doing"""
+    if if_match is not None:
+        _, rows = await conn.execute_query(f'SELECT 1 FROM "{table}" WHERE "id" = $1', [row_id])
+        if rows:
+            raise PreconditionFailedError(f"{table} {row_id} was modified")
+
+async def update_returning(conn: BaseDBAsyncClient, table: str, row_id: int, values: Mapping[str, Any],
+                           returning: str, if_match: Optional[List[datetime]] = None) -> Optional[Dict[str, Any]]:
+    """UPDATE one row and bump updated_at, returning the new row; with no values, just read it"""
+    params: List[Any] = []
+    if values:
+        assignments = []
+        for column, value in values.items():
+            params.append(value)
+            assignments.append(f'"{column}" = ${len(params)}')
+        assignments.append('"updated_at" = now()')
+        sql = f'UPDATE "{table}" SET {", ".join(assignments)} WHERE {_where(row_id, if_match, params)} RETURNING {returning}'
+    else:
+        sql = f'SELECT {returning} FROM "{table}" WHERE {_where(row_id, if_match, params)}'
+    rows = await conn.execute_query_dict(sql, params)
+    if rows:
+        return rows[0]
+    await _miss(conn, table, row_id, if_match)
+    return None
+
+async def delete_returning(conn: BaseDBAsyncClient, table: str, row_id: int, returning: str,
+                           if_match: Optional[List[datetime]] = None) -> Optional[Dict[str, Any]]:
+    """DELETE one row, returning the requested expressions evaluated on it"""
+    params: List[Any] = []
+    rows = await conn.execute_query_dict(
+        f'DELETE FROM "{table}" WHERE {_where(row_id, if_match, params)} RETURNING {returning}', params
+    )
+    if rows:
+        return rows[0]
+    await _miss(conn, table, row_id, if_match)
+    return None
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Plant Health Monitoring API
+
+Run against a live server (uvicorn app.main:app) backed by PostgreSQL:
+
+    python bench_api.py seed --users 1000 --plants-per-user 10 --diagnoses-per-plant 50
+    python bench_api.py pagination
+    python bench_api.py read-path
+    python bench_api.py export
+    python bench_api.py overview
+    python bench_api.py writes
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+import asyncpg
+import httpx
+
+from app.core.database import DATABASE_URL, init_db, close_db
+from app.core.pagination import encode_cursor
+from app.models.diagnosis import Diagnosis
+from app.models.plant import Plant
+from app.models.user import User
+from app.schemas.diagnosis import DiagnosisResponse, DiagnosisUpdate
+from app.schemas.plant import PlantUpdate
+from app.services.diagnosis_service import DiagnosisService
+from app.services.plant_service import PlantService
+
+BASE_URL = "http://localhost:8000/api"
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(label, samples):
+    """Print p50/p99 latency in milliseconds for a list of second samples"""
+    ms = [s * 1000 for s in samples]
+    print(f"  {label:<40} p50={statistics.median(ms):8.2f}ms  p99={percentile(ms, 99):8.2f}ms")
+
+
+async def timed_get(client, url, params, repeat):
+    """GET url repeat times and return per-request latencies in seconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.get(url, params=params)
+        samples.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return samples
+
+
+async def seed(args):
+    """Bulk-load synthetic users, plants and diagnoses with generate_series"""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        print(f"Seeding {args.users} users x {args.plants_per_user} plants x {args.diagnoses_per_plant} diagnoses...")
+        start = time.perf_counter()
+        async with conn.transaction():
+            first_user = await conn.fetchval("SELECT coalesce(max(id), 0) + 1 FROM users")
+            await conn.execute(
+                """
+                INSERT INTO users (email, name, created_at, updated_at)
+                SELECT 'bench_' || g || '_' || $2::int || '@example.com', 'Bench User ' || g,
+                       now() - (g || ' seconds')::interval, now()
+                FROM generate_series(1, $1) AS g
+                """,
+                args.users, first_user,
+            )
+            await conn.execute(
+                """
+                INSERT INTO plants (name, species, description, user_id, created_at, updated_at)
+                SELECT 'Plant ' || g, 'Species ' || (g % 40), NULL, u.id,
+                       now() - (g || ' seconds')::interval, now()
+                FROM users u CROSS JOIN generate_series(1, $1) AS g
+                WHERE u.id >= $2
+                """,
+                args.plants_per_user, first_user,
+            )
+            await conn.execute(
+                """
+                INSERT INTO diagnoses (plant_id, disease_name, confidence_score, image_path, notes, is_healthy, created_at)
+                SELECT p.id, CASE WHEN g % 5 = 0 THEN 'Healthy' ELSE 'Disease ' || (g % 17) END,
+                       random(), '/uploads/bench/' || p.id || '_' || g || '.jpg', NULL, g % 5 = 0,
+                       now() - (g || ' minutes')::interval
+                FROM plants p JOIN users u ON u.id = p.user_id CROSS JOIN generate_series(1, $1) AS g
+                WHERE u.id >= $2
+                """,
+                args.diagnoses_per_plant, first_user,
+            )
+        await conn.execute("ANALYZE users; ANALYZE plants; ANALYZE diagnoses;")
+        print(f"Seeded in {time.perf_counter() - start:.1f}s")
+        print("Run rebuild_plant_health.py to fill in the plant health summary for the seeded rows")
+    finally:
+        await conn.close()
+
+
+async def pagination(args):
+    """Compare page-N latency of offset and keyset pagination as N grows"""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        total = await conn.fetchval("SELECT count(*) FROM diagnoses")
+        depths = [d for d in args.depths if d < total]
+        print(f"=== PAGINATION: {total} diagnoses, limit={args.limit}, {args.repeat} requests per point ===")
+        async with httpx.AsyncClient(timeout=60) as client:
+            for depth in depths:
+                offset_samples = await timed_get(
+                    client, f"{BASE_URL}/diagnoses/", {"skip": depth, "limit": args.limit}, args.repeat
+                )
+                params = {"limit": args.limit}
+                if depth:
+                    row = await conn.fetchrow(
+                        "SELECT created_at, id FROM diagnoses ORDER BY created_at DESC, id DESC OFFSET $1 LIMIT 1",
+                        depth - 1,
+                    )
+                    params["cursor"] = encode_cursor(row["created_at"], row["id"])
+                cursor_samples = await timed_get(client, f"{BASE_URL}/diagnoses/", params, args.repeat)
+                print(f"page at row {depth}:")
+                report("offset (skip)", offset_samples)
+                report("keyset (cursor)", cursor_samples)
+    finally:
+        await conn.close()
+
+
+async def measure_in_process(fetch, repeat):
+    """Run fetch() repeat times, returning (rows per second, mean peak KiB per call)"""
+    rows = 0
+    peaks = []
+    start = time.perf_counter()
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            rows += len(await fetch())
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+    finally:
+        tracemalloc.stop()
+    elapsed = time.perf_counter() - start
+    return rows / elapsed, statistics.mean(peaks)
+
+
+async def read_path(args):
+    """Compare ORM hydration with prefetch against the projected values() read path"""
+    await init_db()
+    try:
+        async def orm_page():
+            diagnoses = await Diagnosis.all().prefetch_related('plant', 'plant__user').order_by(
+                "-created_at", "-id").limit(args.limit)
+            return [DiagnosisResponse.model_validate(d) for d in diagnoses]
+
+        async def projected_page():
+            diagnoses = await DiagnosisService.get_all_diagnoses(limit=args.limit)
+            return [DiagnosisResponse.model_validate(d) for d in diagnoses]
+
+        print(f"=== READ PATH: limit={args.limit}, {args.repeat} pages (tracemalloc adds overhead to both) ===")
+        for label, fetch in (("before: ORM + prefetch_related", orm_page), ("after: values() projection", projected_page)):
+            rows_per_second, peak_kib = await measure_in_process(fetch, args.repeat)
+            print(f"  {label:<40} {rows_per_second:10.0f} rows/s  {peak_kib:10.1f} KiB peak per request")
+    finally:
+        await close_db()
+
+
+async def export(args):
+    """Compare paging through a user's diagnoses with the streaming export"""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        user_id, total = await conn.fetchrow(
+            "SELECT p.user_id, count(*) FROM diagnoses d JOIN plants p ON p.id = d.plant_id "
+            "GROUP BY p.user_id ORDER BY count(*) DESC LIMIT 1"
+        )
+    finally:
+        await conn.close()
+    print(f"=== EXPORT: user {user_id} with {total} diagnoses ===")
+    async with httpx.AsyncClient(timeout=None) as client:
+        start = time.perf_counter()
+        rows = skip = 0
+        while True:
+            response = await client.get(f"{BASE_URL}/diagnoses/user/{user_id}", params={"skip": skip, "limit": 1000})
+            response.raise_for_status()
+            page = response.json()
+            rows += len(page)
+            skip += 1000
+            if len(page) < 1000:
+                break
+        elapsed = time.perf_counter() - start
+        print(f"  {'paging (skip, limit=1000)':<40} {rows / elapsed:10.0f} rows/s  {elapsed:8.2f}s")
+
+        for fmt in ("ndjson", "csv"):
+            start = time.perf_counter()
+            lines = 0
+            async with client.stream("GET", f"{BASE_URL}/exports/users/{user_id}/diagnoses",
+                                     params={"format": fmt}) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    lines += chunk.count(b"\n")
+            elapsed = time.perf_counter() - start
+            rows = lines - (1 if fmt == "csv" else 0)
+            print(f"  {'streaming export (' + fmt + ')':<40} {rows / elapsed:10.0f} rows/s  {elapsed:8.2f}s")
+
+
+async def overview(args):
+    """Compare the client fan-out for the home screen with the overview endpoint"""
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        user_id, plants = await conn.fetchrow(
+            "SELECT user_id, count(*) FROM plants GROUP BY user_id ORDER BY count(*) DESC LIMIT 1"
+        )
+    finally:
+        await conn.close()
+    print(f"=== OVERVIEW: user {user_id} with {plants} plants, {args.per_plant} diagnoses per plant, "
+          f"{args.repeat} requests per point ===")
+    async with httpx.AsyncClient(timeout=60, limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        async def fan_out():
+            user = await client.get(f"{BASE_URL}/users/{user_id}")
+            user.raise_for_status()
+            plant_page = await client.get(f"{BASE_URL}/plants/user/{user_id}", params={"limit": 1000})
+            plant_page.raise_for_status()
+            responses = await asyncio.gather(*(
+                client.get(f"{BASE_URL}/diagnoses/plant/{plant['id']}", params={"limit": args.per_plant})
+                for plant in plant_page.json()
+            ))
+            for response in responses:
+                response.raise_for_status()
+            return 2 + len(responses)
+
+        fan_out_samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            requests = await fan_out()
+            fan_out_samples.append(time.perf_counter() - start)
+        overview_samples = await timed_get(
+            client, f"{BASE_URL}/users/{user_id}/overview",
+            {"diagnoses_per_plant": args.per_plant, "plant_limit": 1000}, args.repeat,
+        )
+    report(f"before: client fan-out ({requests} requests)", fan_out_samples)
+    report("after: /users/{id}/overview (1 request)", overview_samples)
+
+
+async def timed_calls(call, items):
+    """Await call(item) for each item and return per-call latencies in seconds"""
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        await call(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def writes(args):
+    """Compare read-modify-write updates and deletes with single-statement writes"""
+    await init_db()
+    user = await User.create(email=f"bench_writes_{time.time_ns()}@example.com", name="Bench Writes")
+    try:
+        await Plant.bulk_create([Plant(name=f"Plant {i}", species="bench", user_id=user.id) for i in range(args.rows * 2)])
+        plant_ids = await Plant.filter(user_id=user.id).order_by("id").values_list("id", flat=True)
+        await Diagnosis.bulk_create([
+            Diagnosis(plant_id=plant_ids[0], disease_name="Bench", confidence_score=0.5, image_path="/bench.jpg")
+            for _ in range(args.rows)
+        ])
+        diagnosis_ids = await Diagnosis.filter(plant_id=plant_ids[0]).values_list("id", flat=True)
+
+        async def plant_update_before(plant_id):
+            plant = await Plant.get(id=plant_id)
+            plant.update_from_dict({"description": "edited"})
+            await plant.save()
+            await Plant.get(id=plant_id).prefetch_related("user")
+
+        async def diagnosis_update_before(diagnosis_id):
+            diagnosis = await Diagnosis.get(id=diagnosis_id)
+            diagnosis.update_from_dict({"notes": "edited"})
+            await diagnosis.save()
+            await Diagnosis.get(id=diagnosis_id).prefetch_related("plant")
+
+        async def plant_delete_before(plant_id):
+            plant = await Plant.get(id=plant_id)
+            await plant.delete()
+
+        print(f"=== WRITES: {args.rows} calls per path ===")
+        report("before: plant get + save + get", await timed_calls(plant_update_before, plant_ids[:args.rows]))
+        report("after: plant UPDATE ... RETURNING", await timed_calls(
+            lambda pid: PlantService.update_plant(pid, PlantUpdate(description="edited again")), plant_ids[:args.rows]))
+        report("before: diagnosis get + save + get", await timed_calls(diagnosis_update_before, diagnosis_ids))
+        report("after: diagnosis UPDATE ... RETURNING", await timed_calls(
+            lambda did: DiagnosisService.update_diagnosis(did, DiagnosisUpdate(notes="edited again")), diagnosis_ids))
+        report("before: plant get + delete", await timed_calls(plant_delete_before, plant_ids[1:args.rows]))
+        report("after: plant DELETE ... RETURNING", await timed_calls(PlantService.delete_plant, plant_ids[args.rows:]))
+    finally:
+        await user.delete()
+        await close_db()
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    seed_parser = sub.add_parser("seed", help="load synthetic data")
+    seed_parser.add_argument("--users", type=int, default=1000)
+    seed_parser.add_argument("--plants-per-user", type=int, default=10)
+    seed_parser.add_argument("--diagnoses-per-plant", type=int, default=50)
+    seed_parser.set_defaults(func=seed)
+
+    page_parser = sub.add_parser("pagination", help="offset vs keyset page latency by depth")
+    page_parser.add_argument("--limit", type=int, default=100)
+    page_parser.add_argument("--repeat", type=int, default=20)
+    page_parser.add_argument("--depths", type=int, nargs="+", default=[0, 1_000, 10_000, 100_000, 250_000, 490_000])
+    page_parser.set_defaults(func=pagination)
+
+    read_parser = sub.add_parser("read-path", help="ORM hydration vs values() projection")
+    read_parser.add_argument("--limit", type=int, default=1000)
+    read_parser.add_argument("--repeat", type=int, default=50)
+    read_parser.set_defaults(func=read_path)
+
+    export_parser = sub.add_parser("export", help="paged reads vs streaming export throughput")
+    export_parser.set_defaults(func=export)
+
+    overview_parser = sub.add_parser("overview", help="home screen fan-out vs the overview endpoint")
+    overview_parser.add_argument("--per-plant", type=int, default=3)
+    overview_parser.add_argument("--repeat", type=int, default=20)
+    overview_parser.add_argument("--concurrency", type=int, default=6, help="client connections (browsers use ~6)")
+    overview_parser.set_defaults(func=overview)
+
+    writes_parser = sub.add_parser("writes", help="read-modify-write vs single-statement updates and deletes")
+    writes_parser.add_argument("--rows", type=int, default=500)
+    writes_parser.set_defaults(func=writes)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
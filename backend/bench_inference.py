@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the diagnosis engine, CPU only
+
+Runs in process, without the API or the database:
+
+    python bench_inference.py batching
+    python bench_inference.py batching --model models/plant_disease.keras --clients 64
+    python bench_inference.py preprocess --images 32 --workers 4
+    python bench_inference.py shared-memory --workers 4
+    python bench_inference.py runtimes --model models/plant_disease.keras --images fixtures/leaves --threads 1 4
+
+Without --model a randomly initialised MobileNetV2 stands in for the real
+classifier; throughput depends on the architecture, not on the weights.
+preprocess writes synthetic phone-sized JPEGs to a temporary UPLOAD_DIR.
+shared-memory compares web workers that each load the model against workers
+sharing one inference process (it runs "serve" as that process).
+runtimes converts the model to float16 and int8 TFLite (or takes --tflite
+files) and runs every runtime on the same fixtures, each in a fresh
+process, reporting top-1 agreement with Keras, latency and memory. With a
+stand-in model, agreement only measures quantization noise.
+"""
+import os
+import tempfile
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="plantify_bench_"))
+
+import argparse
+import asyncio
+import glob
+import io
+import multiprocessing
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.core.storage import storage
+from app.services.diagnosis_engine import KerasDiseaseModel, MicroBatcher, TFLiteDiseaseModel, load_labels, open_model
+from app.services.inference_server import InferenceClient, InferenceServer
+from app.services.preprocessing import ImagePreprocessor, load_image
+from bench_api import percentile, report
+
+STAND_IN_LABELS = ["healthy", "early_blight", "late_blight", "leaf_mold", "powdery_mildew"]
+
+
+class StandInKerasModel(KerasDiseaseModel):
+    """MobileNetV2 with random weights, shaped like the production classifier"""
+
+    def __init__(self, size: int):
+        import tensorflow as tf
+        self.model = tf.keras.applications.MobileNetV2(
+            input_shape=(size, size, 3), weights=None, classes=len(STAND_IN_LABELS), alpha=0.35)
+        self.input_size = (size, size)
+        self.labels = STAND_IN_LABELS
+        self.version = f"mobilenetv2-random-{size}"
+
+
+def load_model(args):
+    if args.model:
+        labels_path = os.path.join(os.path.dirname(args.model), "labels.txt")
+        with open(labels_path) as handle:
+            labels = [line.strip() for line in handle if line.strip()]
+        return open_model(args.model, labels, os.path.basename(args.model))
+    return StandInKerasModel(args.size)
+
+
+async def run_clients(batcher, images, clients, per_client):
+    """Closed loop: each client submits one image, waits for it, and submits the next"""
+    latencies = []
+
+    async def client(offset):
+        for i in range(per_client):
+            start = time.perf_counter()
+            await batcher.submit(images[(offset + i) % len(images)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    return time.perf_counter() - start, latencies
+
+
+async def batching(args):
+    """Images per second against max batch size and max wait"""
+    model = load_model(args)
+    height, width = model.input_size
+    images = np.random.default_rng(0).integers(0, 256, (64, height, width, 3), dtype=np.uint8)
+    model.warm_up(max(args.batch_sizes))  # trace every batch bucket before timing
+    total = args.clients * args.per_client
+    print(f"{model.version}: {args.clients} concurrent clients, {total} images per run, CPU only\n")
+
+    print("Unbatched (one forward pass per image):")
+    start = time.perf_counter()
+    samples = []
+    for i in range(min(total, 200)):
+        t = time.perf_counter()
+        model.predict(images[i % len(images)][None] / np.float32(255))
+        samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    print(f"  {len(samples) / elapsed:8.1f} img/s")
+    report("per image", samples)
+
+    for wait_ms in args.waits:
+        for batch_size in args.batch_sizes:
+            sizes = []
+
+            def predict(batch):
+                sizes.append(len(batch))
+                return model.predict(batch)
+
+            batcher = MicroBatcher(predict, model.input_size, batch_size, wait_ms / 1000, max_queue=total)
+            batcher.start()
+            try:
+                elapsed, latencies = await run_clients(batcher, images, args.clients, args.per_client)
+            finally:
+                await batcher.stop()
+            print(f"\nmax_batch_size={batch_size} max_wait={wait_ms}ms: {total / elapsed:8.1f} img/s, "
+                  f"mean batch {np.mean(sizes):.1f}, p99 batch {percentile(sizes, 99)}")
+            report("request latency", latencies)
+
+
+def synthetic_photo(width, height, seed):
+    """A JPEG with smooth gradients and sensor-like noise, so it compresses like a photo"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) * 127 // (width + height)], axis=-1)
+    pixels = np.clip(pixels + rng.normal(0, 12, pixels.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def inline_load(data, size):
+    """What a handler would do without the pipeline: full decode, resize, normalize"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB").resize((size[1], size[0]), Image.BILINEAR)
+    return np.asarray(image, dtype=np.float32) / 255.0
+
+
+async def measure_loop_lag(stop, interval=0.005):
+    """Largest delay of a 5 ms timer while work runs: how long the event loop was blocked"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def timed_run(label, count, load):
+    """Run load(i) for every image concurrently and report throughput and loop lag"""
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_loop_lag(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(load(i) for i in range(count)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    print(f"\n{label}: {count / elapsed:7.1f} img/s, event loop blocked up to {await lag * 1000:.0f}ms")
+    return results
+
+
+async def preprocess(args):
+    """Inline decode on the event loop vs the preprocessing pipeline in threads and processes"""
+    size = (args.size, args.size)
+    keys = []
+    for i in range(args.images):
+        data = synthetic_photo(args.width, args.height, i)
+        keys.append((await storage.store(_once(data), settings.UPLOAD_MAX_BYTES)).key)
+    blobs = [await storage.read(key) for key in keys]
+    print(f"{args.images} JPEGs of {args.width}x{args.height} "
+          f"(~{statistics.mean(map(len, blobs)) / 2**20:.1f} MiB), resized to {args.size}x{args.size}")
+
+    async def on_loop(i):
+        return inline_load(blobs[i], size)
+    await timed_run("inline on the event loop, full decode", args.images, on_loop)
+
+    async def in_thread(i):
+        return await asyncio.to_thread(inline_load, blobs[i], size)
+    await timed_run("thread, full decode", args.images, in_thread)
+
+    for workers in (0, args.workers):
+        preprocessor = ImagePreprocessor(workers, settings.PREPROCESS_MAX_PIXELS)
+        preprocessor.start()
+        try:
+            # Start every worker process before timing
+            await asyncio.gather(*(preprocessor.load(keys[0], size) for _ in range(max(1, workers))))
+            label = f"pipeline, {workers} worker processes" if workers else "pipeline in a thread"
+            results = await timed_run(label, args.images, lambda i: preprocessor.load(keys[i], size))
+        finally:
+            preprocessor.stop()
+        for stage in ("read", "queue", "open", "decode", "resize"):
+            report(stage, [timings[stage] for _, timings in results])
+    shutil.rmtree(settings.UPLOAD_DIR)
+
+
+async def _once(data):
+    yield data
+
+
+def pss_mib(pid):
+    """Proportional set size: shared pages split between the processes mapping them, so
+    summing it over processes does not count shared libraries or the ring twice"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as handle:
+            field = "Pss:"
+            lines = handle.readlines()
+    except FileNotFoundError:  # older kernels
+        with open(f"/proc/{pid}/status") as handle:
+            field = "VmRSS:"
+            lines = handle.readlines()
+    return next(int(line.split()[1]) for line in lines if line.startswith(field)) / 1024
+
+
+async def serve(args):
+    """An inference process serving the stand-in (or --model) over INFERENCE_SOCKET"""
+    model = load_model(args)
+    model.warm_up(args.batch_size)
+    batcher = MicroBatcher(model.predict, model.input_size, args.batch_size, args.wait / 1000, 4096)
+    batcher.start()
+    # The socket appears only once the model is warm
+    server = await asyncio.start_unix_server(InferenceServer(model, batcher).handle, path=args.socket)
+    async with server:
+        await server.serve_forever()
+
+
+def web_worker(args, socket_path, ready, done, results):
+    """One web worker process: its own model and batcher, or a client of the shared process"""
+    async def run():
+        if socket_path is None:
+            model = load_model(args)
+            model.warm_up(args.batch_size)
+            batcher = MicroBatcher(model.predict, model.input_size, args.batch_size, args.wait / 1000, 4096)
+            batcher.start()
+            submit, size = batcher.submit, model.input_size
+        else:
+            client = InferenceClient(socket_path, args.clients)
+            await client.connect()
+            size = client.model.input_size
+
+            async def submit(image):
+                async with client.slot() as index:
+                    client.ring[index] = image
+                    return await client.infer(index)
+        images = np.random.default_rng(os.getpid()).integers(0, 256, (16, *size, 3), dtype=np.uint8)
+        ready.wait()
+        latencies = []
+
+        async def user(offset):
+            for i in range(args.per_client):
+                start = time.perf_counter()
+                await submit(images[(offset + i) % len(images)])
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(user(c) for c in range(args.clients)))
+        results.put(latencies)
+        done.wait()  # stay alive until the parent has measured memory
+        if socket_path is None:
+            await batcher.stop()
+        else:
+            await client.close()
+    asyncio.run(run())
+
+
+async def shared_memory(args):
+    """K web workers each loading the model vs K workers sharing one inference process"""
+    context = multiprocessing.get_context("spawn")
+    total = args.workers * args.clients * args.per_client
+    print(f"{args.workers} web workers x {args.clients} concurrent clients, {total} images per run, CPU only")
+    socket_path = os.path.join(settings.UPLOAD_DIR, "inference.sock")
+    for shared in (False, True):
+        server = None
+        if shared:
+            server = subprocess.Popen([sys.executable, __file__, "serve", "--socket", socket_path,
+                                       "--size", str(args.size), "--batch-size", str(args.batch_size),
+                                       "--wait", str(args.wait)] + (["--model", args.model] if args.model else []))
+            while not os.path.exists(socket_path):
+                await asyncio.sleep(0.1)
+        ready, done, results = context.Barrier(args.workers + 1), context.Barrier(args.workers + 1), context.Queue()
+        workers = [context.Process(target=web_worker, args=(args, socket_path if shared else None, ready, done, results))
+                   for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        await asyncio.to_thread(ready.wait)
+        start = time.perf_counter()
+        latencies = []
+        for _ in workers:
+            latencies += await asyncio.to_thread(results.get)
+        elapsed = time.perf_counter() - start
+        processes = [w.pid for w in workers] + ([server.pid] if server else [])
+        memory = sum(pss_mib(pid) for pid in processes)
+        server_memory = pss_mib(server.pid) if server else 0
+        await asyncio.to_thread(done.wait)
+        for worker in workers:
+            worker.join()
+        if server:
+            server.terminate()
+            server.wait()
+        label = "one shared inference process" if shared else "a model in every worker"
+        print(f"\n{label}: {total / elapsed:7.1f} img/s, {memory:7.0f} MiB PSS over {len(processes)} processes"
+              + (f" ({server_memory:.0f} MiB in the inference process)" if server else ""))
+        report("request latency", latencies)
+    shutil.rmtree(settings.UPLOAD_DIR)
+
+
+def fixture_photos(count, size):
+    """Blurred random scenes, different enough to spread the model's top-1 classes"""
+    photos = []
+    for seed in range(count):
+        rng = np.random.default_rng(seed)
+        scene = Image.fromarray(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)).resize((640, 480), Image.BICUBIC)
+        buffer = io.BytesIO()
+        scene.save(buffer, "JPEG", quality=90)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+def convert_tflite(keras_path, quantization, representative):
+    """TFLite flatbuffer of a saved Keras model: float16 weights, or int8 weights,
+    activations and input/output calibrated on representative images"""
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(tf.keras.models.load_model(keras_path, compile=False))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        converter.representative_dataset = lambda: ([image[None] / np.float32(255)] for image in representative)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def status_mib(field):
+    """VmRSS (resident now) or VmHWM (peak) of this process; unlike ru_maxrss, not
+    carried over from the parent that forked it"""
+    with open("/proc/self/status") as handle:
+        return next(int(line.split()[1]) for line in handle if line.startswith(field + ":")) / 1024
+
+
+def runtime_worker(path, labels, fixtures_path, batch_sizes, threads, repeats, results):
+    """Load one model in a fresh process and measure it on the shared fixtures.
+    The RSS growth from loading includes importing the runtime: all of
+    TensorFlow, unless tflite_runtime is installed for the TFLite models."""
+    rss_before = status_mib("VmRSS")
+    if path.endswith(".tflite"):
+        model = TFLiteDiseaseModel(path, labels, os.path.basename(path), threads)
+    else:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+        model = KerasDiseaseModel(path, labels, os.path.basename(path))
+    model.warm_up(max(batch_sizes))
+    model_mib = status_mib("VmRSS") - rss_before
+    images = np.load(fixtures_path) / np.float32(255)
+    outputs = np.concatenate([model.predict(images[i:i + max(batch_sizes)])
+                              for i in range(0, len(images), max(batch_sizes))])
+    latencies = {}
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        latencies[batch_size] = []
+        for _ in range(repeats):
+            batch = images[rng.choice(len(images), batch_size)]
+            start = time.perf_counter()
+            model.predict(batch)
+            latencies[batch_size].append(time.perf_counter() - start)
+    results.put({"outputs": outputs, "latencies": latencies, "model_mib": model_mib,
+                 "rss_mib": status_mib("VmRSS"), "peak_mib": status_mib("VmHWM")})
+
+
+async def runtimes(args):
+    """Keras against TFLite float16/int8 on the same fixtures: top-1 agreement, latency, memory"""
+    workdir = settings.UPLOAD_DIR
+    if args.model:
+        keras_path, labels = args.model, load_labels(os.path.join(os.path.dirname(args.model), "labels.txt"))
+    else:
+        keras_path, labels = os.path.join(workdir, "stand_in.keras"), STAND_IN_LABELS
+        StandInKerasModel(args.size).model.save(keras_path)
+    height, width = KerasDiseaseModel(keras_path, labels, "").input_size
+    if args.images:
+        photos = []
+        for path in sorted(glob.glob(os.path.join(args.images, "*"))):
+            with open(path, "rb") as handle:
+                photos.append(handle.read())
+    else:
+        photos = fixture_photos(args.fixtures, (width, height))
+    images = np.stack([load_image(data, (height, width), settings.PREPROCESS_MAX_PIXELS)[0] for data in photos])
+    fixtures_path = os.path.join(workdir, "fixtures.npy")
+    np.save(fixtures_path, images)
+
+    tflite_paths = args.tflite
+    if not tflite_paths:
+        tflite_paths = []
+        for quantization in ("float16", "int8"):
+            tflite_paths.append(os.path.join(workdir, f"model_{quantization}.tflite"))
+            with open(tflite_paths[-1], "wb") as handle:
+                handle.write(convert_tflite(keras_path, quantization, images[:args.calibration]))
+    print(f"{len(images)} fixtures at {width}x{height}, {args.repeats} timed batches per batch size, CPU only")
+
+    context = multiprocessing.get_context("spawn")
+    reference = None
+    for threads in args.threads:
+        print(f"\n{threads} thread(s):")
+        for path in [keras_path] + tflite_paths:
+            results = context.Queue()
+            worker = context.Process(target=runtime_worker, args=(path, labels, fixtures_path, args.batch_sizes,
+                                                                  threads, args.repeats, results))
+            worker.start()
+            result = await asyncio.to_thread(results.get)
+            worker.join()
+            outputs = result["outputs"]
+            if reference is None:
+                reference = outputs
+                classes = len(np.unique(outputs.argmax(axis=1)))
+                print(f"  (Keras picks {classes} distinct classes over the fixtures)")
+            agreement = np.mean(outputs.argmax(axis=1) == reference.argmax(axis=1))
+            drift = np.abs(outputs - reference).max()
+            print(f"  {os.path.basename(path):<24} {os.path.getsize(path) / 2**20:6.1f} MiB on disk, "
+                  f"RSS {result['rss_mib']:5.0f} MiB ({result['model_mib']:+.0f} loading), "
+                  f"peak {result['peak_mib']:5.0f} MiB, top-1 agreement {agreement:6.1%}, max |dp| {drift:.3f}")
+            for batch_size, samples in result["latencies"].items():
+                report(f"    batch of {batch_size}", samples)
+    shutil.rmtree(workdir)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    batching_parser = sub.add_parser("batching", help="micro-batching throughput by batch size and deadline")
+    batching_parser.add_argument("--model", help="saved Keras or .tflite model with labels.txt beside it")
+    batching_parser.add_argument("--size", type=int, default=224, help="input size of the stand-in model")
+    batching_parser.add_argument("--clients", type=int, default=32)
+    batching_parser.add_argument("--per-client", type=int, default=8)
+    batching_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    batching_parser.add_argument("--waits", type=float, nargs="+", default=[2, 10, 25])
+    batching_parser.set_defaults(func=batching)
+
+    preprocess_parser = sub.add_parser("preprocess", help="image decode and resize: inline vs the pipeline")
+    preprocess_parser.add_argument("--images", type=int, default=24)
+    preprocess_parser.add_argument("--width", type=int, default=4000)
+    preprocess_parser.add_argument("--height", type=int, default=3000)
+    preprocess_parser.add_argument("--size", type=int, default=224)
+    preprocess_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    preprocess_parser.set_defaults(func=preprocess)
+
+    shared_parser = sub.add_parser("shared-memory", help="a model per web worker vs one shared inference process")
+    shared_parser.add_argument("--model", help="saved Keras model with labels.txt beside it")
+    shared_parser.add_argument("--size", type=int, default=224, help="input size of the stand-in model")
+    shared_parser.add_argument("--workers", type=int, default=4, help="web worker processes")
+    shared_parser.add_argument("--clients", type=int, default=8, help="concurrent clients per worker")
+    shared_parser.add_argument("--per-client", type=int, default=8)
+    shared_parser.add_argument("--batch-size", type=int, default=32)
+    shared_parser.add_argument("--wait", type=float, default=10, help="max wait in ms")
+    shared_parser.set_defaults(func=shared_memory)
+
+    runtimes_parser = sub.add_parser("runtimes", help="Keras vs float16/int8 TFLite: top-1 agreement, latency, RSS")
+    runtimes_parser.add_argument("--model", help="saved Keras model with labels.txt beside it")
+    runtimes_parser.add_argument("--tflite", nargs="+", help="converted models to compare (default: convert --model)")
+    runtimes_parser.add_argument("--images", help="directory of fixture photos (default: synthetic)")
+    runtimes_parser.add_argument("--fixtures", type=int, default=200, help="synthetic fixtures without --images")
+    runtimes_parser.add_argument("--calibration", type=int, default=100, help="fixtures used to calibrate int8")
+    runtimes_parser.add_argument("--size", type=int, default=224, help="input size of the stand-in model")
+    runtimes_parser.add_argument("--threads", type=int, nargs="+", default=[os.cpu_count() or 1])
+    runtimes_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    runtimes_parser.add_argument("--repeats", type=int, default=100, help="timed batches per batch size")
+    runtimes_parser.set_defaults(func=runtimes)
+
+    serve_parser = sub.add_parser("serve", help="run the stand-in model as an inference process")
+    serve_parser.add_argument("--socket", default=settings.INFERENCE_SOCKET, required=not settings.INFERENCE_SOCKET)
+    serve_parser.add_argument("--model", help="saved Keras model with labels.txt beside it")
+    serve_parser.add_argument("--size", type=int, default=224, help="input size of the stand-in model")
+    serve_parser.add_argument("--batch-size", type=int, default=32)
+    serve_parser.add_argument("--wait", type=float, default=10, help="max wait in ms")
+    serve_parser.set_defaults(func=serve)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
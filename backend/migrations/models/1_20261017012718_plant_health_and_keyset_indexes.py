@@ -0,0 +1,37 @@
+from tortoise import BaseDBAsyncClient
+
+# IF NOT EXISTS throughout: init_db's generate_schemas may already have created
+# these on a fresh database. Existing plants start with an empty health
+# summary; run rebuild_plant_health.py after upgrading.
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "plants" ADD COLUMN IF NOT EXISTS "diagnosis_count" INT NOT NULL  DEFAULT 0;
+        ALTER TABLE "plants" ADD COLUMN IF NOT EXISTS "last_is_healthy" BOOL;
+        ALTER TABLE "plants" ADD COLUMN IF NOT EXISTS "last_confidence_score" DOUBLE PRECISION;
+        ALTER TABLE "plants" ADD COLUMN IF NOT EXISTS "last_disease_name" VARCHAR(200);
+        ALTER TABLE "plants" ADD COLUMN IF NOT EXISTS "health_score" DOUBLE PRECISION;
+        ALTER TABLE "plants" ADD COLUMN IF NOT EXISTS "last_diagnosis_at" TIMESTAMPTZ;
+        CREATE INDEX IF NOT EXISTS "idx_diagnoses_disease_ae56e4" ON "diagnoses" ("disease_name", "created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_diagnoses_plant_i_f0987e" ON "diagnoses" ("plant_id", "created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_diagnoses_created_10f15a" ON "diagnoses" ("created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_plants_user_id_488447" ON "plants" ("user_id", "created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_plants_created_b9fbcf" ON "plants" ("created_at", "id");
+        CREATE INDEX IF NOT EXISTS "idx_users_created_eeb5e9" ON "users" ("created_at", "id");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_diagnoses_created_10f15a";
+        DROP INDEX IF EXISTS "idx_diagnoses_plant_i_f0987e";
+        DROP INDEX IF EXISTS "idx_diagnoses_disease_ae56e4";
+        DROP INDEX IF EXISTS "idx_plants_created_b9fbcf";
+        DROP INDEX IF EXISTS "idx_plants_user_id_488447";
+        DROP INDEX IF EXISTS "idx_users_created_eeb5e9";
+        ALTER TABLE "plants" DROP COLUMN "diagnosis_count";
+        ALTER TABLE "plants" DROP COLUMN "last_is_healthy";
+        ALTER TABLE "plants" DROP COLUMN "last_confidence_score";
+        ALTER TABLE "plants" DROP COLUMN "last_disease_name";
+        ALTER TABLE "plants" DROP COLUMN "health_score";
+        ALTER TABLE "plants" DROP COLUMN "last_diagnosis_at";"""
@@ -0,0 +1,18 @@
+from tortoise import BaseDBAsyncClient
+
+# Partial indexes for the is_healthy filter, which Meta.indexes cannot express.
+# Unhealthy diagnoses are what dashboards page through, so only that side is
+# indexed; healthy rows are found by walking the keyset indexes.
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE INDEX IF NOT EXISTS "idx_diagnoses_unhealthy_created" ON "diagnoses" ("created_at", "id") WHERE NOT "is_healthy";
+        CREATE INDEX IF NOT EXISTS "idx_diagnoses_unhealthy_plant" ON "diagnoses" ("plant_id", "created_at", "id") WHERE NOT "is_healthy";
+        ANALYZE "diagnoses";"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_diagnoses_unhealthy_plant";
+        DROP INDEX IF EXISTS "idx_diagnoses_unhealthy_created";"""
@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+# updated_at backs the ETag / If-Match preconditions on diagnosis writes.
+# Existing rows get the migration time, which is as good an ETag as any.
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "diagnoses" ADD COLUMN IF NOT EXISTS "updated_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "diagnoses" DROP COLUMN "updated_at";"""
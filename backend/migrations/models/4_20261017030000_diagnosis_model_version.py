@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+# model_version records which model produced a server-side diagnosis; rows
+# supplied by clients leave it NULL.
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "diagnoses" ADD COLUMN IF NOT EXISTS "model_version" VARCHAR(100);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "diagnoses" DROP COLUMN "model_version";"""
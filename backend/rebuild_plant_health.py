@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Rebuild the denormalized plant health summary from the diagnoses table
+
+Needed after a backfill, after diagnoses were written outside the API (for
+example by bench_api.py seed) or when changing HEALTH_SCORE_ALPHA/WINDOW:
+
+    python rebuild_plant_health.py
+    python rebuild_plant_health.py --user-id 42 --batch-size 500
+"""
+import argparse
+import asyncio
+import time
+
+from tortoise.transactions import in_transaction
+
+from app.core.database import init_db, close_db
+from app.models.plant import Plant
+from app.services.plant_health_service import PlantHealthService
+
+
+async def rebuild(args):
+    """Walk plants in id order and recompute each batch in its own transaction"""
+    await init_db()
+    try:
+        queryset = Plant.all() if args.user_id is None else Plant.filter(user_id=args.user_id)
+        last_id = 0
+        rebuilt = 0
+        start = time.perf_counter()
+        while True:
+            ids = await queryset.filter(id__gt=last_id).order_by("id").limit(args.batch_size).values_list("id", flat=True)
+            if not ids:
+                break
+            async with in_transaction() as conn:
+                rebuilt += await PlantHealthService.refresh(ids, conn)
+            last_id = ids[-1]
+            print(f"  rebuilt {rebuilt} plants (up to id {last_id})")
+        print(f"✅ Rebuilt health summary for {rebuilt} plants in {time.perf_counter() - start:.1f}s")
+    finally:
+        await close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, default=None, help="only rebuild this user's plants")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(rebuild(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
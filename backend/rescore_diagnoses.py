@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Re-score stored diagnoses with the configured model
+
+Run after shipping a new model. Every diagnosis whose model_version differs
+from the model's is diagnosed again from its image_path, and its verdict,
+model_version and plant health summary are updated:
+
+    MODEL_PATH=models/plant_disease_v2.keras python rescore_diagnoses.py
+    python rescore_diagnoses.py --model models/plant_disease_v2.keras --batch-size 128 --workers 8
+    python rescore_diagnoses.py --user-id 42
+
+Diagnoses are walked in id order. Images are decoded ahead of the model by
+a pool of --workers processes, at most --prefetch at a time, while the model
+runs on --batch-size images at once on all cores. Each batch is written
+back with one UPDATE, then its last id is saved to --checkpoint, so an
+interrupted run picks up where it stopped. Images that are missing or
+cannot be decoded are reported and skipped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from tortoise.expressions import Q
+
+from app.core.config import settings
+from app.core.database import init_db, close_db
+from app.models.diagnosis import Diagnosis
+from app.services.diagnosis_engine import DiseaseModel, load_configured_model, load_labels, open_model, to_prediction
+from app.services.diagnosis_service import DiagnosisService
+from app.services.preprocessing import ImageDecodeError, ImagePreprocessor
+
+Row = Tuple[int, str]  # (diagnosis id, image_path)
+
+
+def load_checkpoint(path: str, model_version: str, report: Callable[[str], None] = print,
+                    user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Progress saved by an earlier run with the same model version and scope, or a fresh start"""
+    fresh = {"model_version": model_version, "user_id": user_id, "last_id": 0, "rescored": 0, "skipped": 0}
+    if not os.path.exists(path):
+        return fresh
+    with open(path) as handle:
+        checkpoint = json.load(handle)
+    if checkpoint.get("model_version") != model_version:
+        report(f"  checkpoint {path} is for {checkpoint.get('model_version')}, starting over")
+        return fresh
+    if checkpoint.get("user_id") != user_id:
+        report(f"  checkpoint {path} is for user {checkpoint.get('user_id')}, starting over")
+        return fresh
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    # Written beside the target and renamed, so a crash never leaves half a file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as handle:
+        json.dump(checkpoint, handle)
+    os.replace(tmp_path, path)
+
+
+def stale(model_version: str, user_id: Optional[int] = None):
+    """Diagnoses not yet scored by model_version, of one user's plants if given"""
+    queryset = Diagnosis.filter(Q(model_version__isnull=True) | ~Q(model_version=model_version))
+    return queryset if user_id is None else queryset.filter(plant__user_id=user_id)
+
+
+class Progress:
+    """Throughput and ETA of one run, printed after every batch"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.started = time.perf_counter()
+
+    def update(self, n: int, last_id: int) -> str:
+        self.done += n
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        return (f"  {self.done}/{self.total} images ({self.done / max(self.total, 1):.0%}), "
+                f"{rate:.1f} img/s, ETA {int(eta // 60)}m{int(eta % 60):02d}s (up to id {last_id})")
+
+
+async def rescore(model: DiseaseModel, preprocessor: ImagePreprocessor, checkpoint_path: str,
+                  batch_size: int, prefetch: int, page_size: int,
+                  report: Callable[[str], None] = print, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Re-score every stale diagnosis after the checkpoint, returning the final checkpoint"""
+    checkpoint = load_checkpoint(checkpoint_path, model.version, report, user_id)
+    queryset = stale(model.version, user_id)
+    total = await queryset.filter(id__gt=checkpoint["last_id"]).count()
+    report(f"🔁 Re-scoring {total} diagnoses with {model.version} (after id {checkpoint['last_id']})")
+    progress = Progress(total)
+    # (row, decode task) in id order; the bound keeps decoded images from piling up
+    decoded: "asyncio.Queue[Optional[Tuple[Row, asyncio.Task]]]" = asyncio.Queue(prefetch)
+
+    async def decode(image_path: str):
+        try:
+            image, _ = await preprocessor.load(image_path, model.input_size)
+            return image
+        except (FileNotFoundError, ImageDecodeError) as exc:
+            return exc
+
+    async def walk() -> None:
+        """Keyset pages of stale rows, each row's decode started as soon as there is room"""
+        last_id = checkpoint["last_id"]
+        while True:
+            rows = await queryset.filter(id__gt=last_id).order_by("id").limit(page_size).values_list("id", "image_path")
+            if not rows:
+                break
+            for row in rows:
+                await decoded.put((row, asyncio.create_task(decode(row[1]))))
+            last_id = rows[-1][0]
+        await decoded.put(None)
+
+    async def flush(ids: List[int], images: List[np.ndarray], processed: int, last_id: int) -> None:
+        if images:
+            batch = np.stack(images).astype(np.float32)
+            batch *= np.float32(1 / 255)
+            outputs = await asyncio.to_thread(model.predict, batch)
+            predictions = [to_prediction(output, model) for output in outputs]
+            checkpoint["rescored"] += await DiagnosisService.apply_predictions(ids, predictions, model.version)
+        checkpoint["last_id"] = last_id
+        save_checkpoint(checkpoint_path, checkpoint)
+        report(progress.update(processed, last_id))
+
+    walker = asyncio.create_task(walk())
+    try:
+        ids: List[int] = []
+        images: List[np.ndarray] = []
+        skipped = 0
+        while (item := await decoded.get()) is not None:
+            (diagnosis_id, image_path), task = item
+            image = await task
+            if isinstance(image, Exception):
+                report(f"  ⚠️  skipped diagnosis {diagnosis_id} ({image_path}): {type(image).__name__}: {image}")
+                checkpoint["skipped"] += 1
+                skipped += 1
+            else:
+                ids.append(diagnosis_id)
+                images.append(image)
+            last_id = diagnosis_id
+            if len(images) == batch_size:
+                await flush(ids, images, len(ids) + skipped, last_id)
+                ids, images, skipped = [], [], 0
+        if images or skipped:
+            await flush(ids, images, len(ids) + skipped, last_id)
+        await walker
+    finally:
+        walker.cancel()
+        # Decodes already queued would otherwise be left pending
+        while not decoded.empty():
+            item = decoded.get_nowait()
+            if item is not None:
+                item[1].cancel()
+    report(f"✅ Re-scored {checkpoint['rescored']} diagnoses, skipped {checkpoint['skipped']}, "
+           f"in {time.perf_counter() - progress.started:.1f}s")
+    return checkpoint
+
+
+async def run(args):
+    if args.model:
+        labels_path = os.path.join(os.path.dirname(args.model), "labels.txt")
+        model = await asyncio.to_thread(open_model, args.model, load_labels(labels_path),
+                                        os.path.basename(args.model))
+    elif settings.MODEL_PATH:
+        model = await asyncio.to_thread(load_configured_model)
+    else:
+        raise SystemExit("Set MODEL_PATH or pass --model")
+    await asyncio.to_thread(model.warm_up, args.batch_size)
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    preprocessor = ImagePreprocessor(args.workers, settings.PREPROCESS_MAX_PIXELS)
+    preprocessor.start()
+    await init_db()
+    try:
+        await rescore(model, preprocessor, args.checkpoint, args.batch_size, args.prefetch, args.page_size,
+                      user_id=args.user_id)
+    finally:
+        await close_db()
+        preprocessor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="saved Keras or .tflite model with labels.txt beside it (default: MODEL_PATH)")
+    parser.add_argument("--checkpoint", default="rescore.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first id")
+    parser.add_argument("--batch-size", type=int, default=64, help="images per model invocation")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="image decoding processes")
+    parser.add_argument("--prefetch", type=int, default=None, help="images decoded ahead (default: 4 batches)")
+    parser.add_argument("--page-size", type=int, default=1000, help="diagnoses read per query")
+    parser.add_argument("--user-id", type=int, default=None, help="only re-score this user's diagnoses")
+    args = parser.parse_args()
+    args.prefetch = args.prefetch or 4 * args.batch_size
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Archive diagnosis tests: zip, streamed zip, tar and tar.gz bodies are
+unpacked as they arrive, every image is stored, diagnosed and inserted,
+results stream back as NDJSON, and bad members fail alone while a
+truncated archive ends the stream with an error summary. Needs PostgreSQL
+at DATABASE_URL; uses a temporary UPLOAD_DIR.
+"""
+import asyncio
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="plantify_archive_")
+os.environ.setdefault("PREPROCESS_WORKERS", "0")
+os.environ["UPLOAD_MAX_BYTES"] = "100000"
+
+import httpx
+
+from app.core.config import settings
+from app.main import app, lifespan
+from app.models.diagnosis import Diagnosis
+from app.models.plant import Plant
+from app.services.diagnosis_engine import diagnosis_engine
+from test_inference import StandInModel, png
+
+GREEN, RED = (20, 200, 30), (200, 40, 30)
+
+class Unseekable(io.RawIOBase):
+    """A write-only pipe, so zipfile streams members with data descriptors"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+def make_zip(files, streamed=False) -> bytes:
+    target = Unseekable() if streamed else io.BytesIO()
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return bytes(target.buffer) if streamed else target.getvalue()
+
+def make_tar(files, mode="w") -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+async def chunked(data: bytes, size: int = 97):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+def parse(response: httpx.Response):
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return {line["name"]: line for line in lines[:-1]}, lines[-1]
+
+async def seed(client: httpx.AsyncClient):
+    user = (await client.post("/api/users/get-or-create", json={"email": "archive@example.com", "name": "Archive"})).json()
+    plants = []
+    for name in ("Basil", "Mint"):
+        plants.append((await client.post("/api/plants/", json={"name": name, "species": "Lamiaceae",
+                                                                 "user_id": user["id"]})).json()["id"])
+    return plants
+
+async def test_formats(client: httpx.AsyncClient, basil: int):
+    """Every supported format is unpacked in a stream and each image diagnosed"""
+    print("=== TESTING ARCHIVE FORMATS ===")
+    files = {"leaves/green.png": png(GREEN), "leaves/red.png": png(RED), "top.png": png(GREEN, (40, 40))}
+    bodies = {"zip": make_zip(files), "streamed zip": make_zip(files, streamed=True),
+              "tar": make_tar(files), "tar.gz": make_tar(files, "w:gz")}
+    for kind, body in bodies.items():
+        response = await client.post(f"/api/diagnoses/analyze/archive?plant_id={basil}", content=chunked(body))
+        results, summary = parse(response)
+        assert summary == {"done": True, "created": 3, "failed": 0}, (kind, summary)
+        assert results["leaves/green.png"]["disease_name"] == "healthy", results
+        assert results["leaves/red.png"]["disease_name"] == "leaf_spot", results
+        assert all(r["plant_id"] == basil and r["model_version"] == StandInModel.version for r in results.values())
+        print(f"✓ {kind}: {len(body)} bytes in 97-byte chunks, 3 images diagnosed")
+    assert await Diagnosis.filter(plant_id=basil).count() == 12
+    plant = await Plant.get(id=basil)
+    assert plant.last_disease_name is not None
+    print("✓ Rows persisted and the plant health summary refreshed")
+
+async def test_mapping_and_failures(client: httpx.AsyncClient, basil: int, mint: int):
+    """Directories and paths pick plants; bad members fail on their own line"""
+    print("\n=== TESTING PLANT MAPPING AND PER-IMAGE FAILURES ===")
+    files = {
+        "basil/a.png": png(GREEN),
+        "mint/b.png": png(RED),
+        "mint/special/c.png": png(GREEN),
+        "elsewhere/d.png": png(GREEN),
+        "basil/notes.txt": b"watered on tuesday",
+        "basil/huge.png": os.urandom(settings.UPLOAD_MAX_BYTES + 1),
+        "__MACOSX/basil/._a.png": b"\0" * 64,
+        "basil/.DS_Store": b"\0" * 64,
+    }
+    plants = json.dumps({"basil": basil, "mint": mint, "mint/special/c.png": basil})
+    response = await client.post("/api/diagnoses/analyze/archive", params={"plants": plants},
+                                 content=make_zip(files, streamed=True))
+    results, summary = parse(response)
+    assert summary == {"done": True, "created": 3, "failed": 3}, summary
+    assert results["basil/a.png"]["plant_id"] == basil and results["mint/b.png"]["plant_id"] == mint
+    assert results["mint/special/c.png"]["plant_id"] == basil
+    print("✓ Top-level directories map to plants, full paths override them")
+    assert results["elsewhere/d.png"]["error"] == "No plant_id for this image"
+    assert "error" in results["basil/notes.txt"] and "Exceeds" in results["basil/huge.png"]["error"]
+    assert not any(name.startswith("__MACOSX") or name.endswith(".DS_Store") for name in results)
+    print(f"✓ Unmapped, non-image and oversized members fail alone: {summary}")
+
+async def test_bad_requests(client: httpx.AsyncClient, basil: int):
+    """Bad parameters and bodies are refused before streaming; truncation ends the stream"""
+    print("\n=== TESTING BAD REQUESTS ===")
+    body = make_tar({"a.png": png(GREEN), "b.png": png(RED)})
+    cases = {
+        "no plant": ("/api/diagnoses/analyze/archive", body, 400),
+        "bad mapping": ("/api/diagnoses/analyze/archive?plants=[1]", body, 400),
+        "unknown plant": ("/api/diagnoses/analyze/archive?plant_id=999999", body, 404),
+        "not an archive": (f"/api/diagnoses/analyze/archive?plant_id={basil}", png(GREEN), 415),
+    }
+    for case, (url, content, status) in cases.items():
+        response = await client.post(url, content=content)
+        assert response.status_code == status, (case, response.text)
+    print("✓ Missing/bad plant mapping (400), unknown plant (404) and non-archive bodies (415) refused")
+
+    cut = make_zip({"a.png": png(GREEN), "b.png": png(RED)})
+    cut = cut[:cut.index(b"PK\x03\x04", 4) + 40]
+    results, summary = parse(await client.post(f"/api/diagnoses/analyze/archive?plant_id={basil}", content=cut))
+    assert results["a.png"]["disease_name"] == "healthy"
+    assert summary == {"done": False, "created": 1, "failed": 0, "error": "Archive is truncated"}, summary
+    print("✓ A truncated archive keeps the images before the cut and reports the error last")
+
+    await diagnosis_engine.stop()
+    response = await client.post(f"/api/diagnoses/analyze/archive?plant_id={basil}", content=body)
+    assert response.status_code == 503, response.text
+    print("✓ No model loaded: 503 before reading the body")
+
+async def main():
+    """Run all archive diagnosis tests"""
+    print("🧪 Starting Archive Diagnosis Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        diagnosis_engine.start(StandInModel(delay=0))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            basil, mint = await seed(client)
+            await test_formats(client, basil)
+            await test_mapping_and_failures(client, basil, mint)
+            await test_bad_requests(client, basil)
+    shutil.rmtree(settings.UPLOAD_DIR)
+    print("\n" + "=" * 50)
+    print("🎉 ALL ARCHIVE DIAGNOSIS TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Bulk create tests: /bulk inserts the items whose parent exists and reports
+the rest per index, refuses more than BULK_MAX_ITEMS items with 413, holds
+off concurrent deletes of the parents it checked, and reports a rolled-back
+batch without database error text. Needs PostgreSQL at DATABASE_URL.
+"""
+import asyncio
+import os
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["BULK_MAX_ITEMS"] = "5"
+
+import httpx
+from tortoise.exceptions import IntegrityError
+
+from app.main import app, lifespan
+from app.models.diagnosis import Diagnosis
+from app.models.plant import Plant
+from app.schemas.diagnosis import DiagnosisCreate
+from app.services.bulk import bulk_create_checked
+
+MISSING_ID = 999999
+
+def diagnosis(plant_id: int, n: int) -> dict:
+    return {"plant_id": plant_id, "disease_name": "scab", "confidence_score": 0.6, "image_path": f"bulk/{n}.jpg"}
+
+async def seed(client: httpx.AsyncClient) -> int:
+    user = await client.post("/api/users/get-or-create", json={"email": "bulk@example.com", "name": "Bulk"})
+    return user.json()["id"]
+
+async def test_mixed_parents(client: httpx.AsyncClient, user_id: int):
+    """Items with a missing parent fail alone; the rest are inserted in one go"""
+    print("=== TESTING MIXED PARENTS ===")
+    response = await client.post("/api/plants/bulk", json=[
+        {"name": "Apple", "species": "Malus", "user_id": user_id},
+        {"name": "Ghost", "species": "Malus", "user_id": MISSING_ID},
+        {"name": "Pear", "species": "Pyrus", "user_id": user_id},
+    ])
+    body = response.json()
+    assert response.status_code == 200 and body["created"] == 2 and body["failed"] == 1, body
+    assert [(r["index"], r["success"], r["error"]) for r in body["results"]] == \
+        [(0, True, None), (1, False, "User not found"), (2, True, None)]
+    plants = await Plant.filter(user_id=user_id).order_by("id").values_list("id", flat=True)
+    assert len(plants) == 2
+    print("✓ Plants: 2 created, index 1 failed with 'User not found'")
+
+    response = await client.post("/api/diagnoses/bulk", json=[
+        diagnosis(plants[0], 0), diagnosis(MISSING_ID, 1), diagnosis(plants[1], 2), diagnosis(plants[0], 3),
+    ])
+    body = response.json()
+    assert body["created"] == 3 and [r["error"] for r in body["results"]] == [None, "Plant not found", None, None]
+    assert await Diagnosis.filter(plant_id=plants[0]).count() == 2
+    assert (await Plant.get(id=plants[0])).diagnosis_count == 2
+    print("✓ Diagnoses: 3 created with health summaries refreshed, index 1 failed with 'Plant not found'")
+    return plants
+
+async def test_item_limit(client: httpx.AsyncClient, plants):
+    """More than BULK_MAX_ITEMS items are refused before anything is written"""
+    print("\n=== TESTING ITEM LIMIT ===")
+    before = await Diagnosis.all().count()
+    response = await client.post("/api/diagnoses/bulk", json=[diagnosis(plants[0], n) for n in range(6)])
+    assert response.status_code == 413 and "5" in response.json()["detail"]
+    response = await client.post("/api/plants/bulk", json=[{"name": "P", "species": "S", "user_id": 1}] * 6)
+    assert response.status_code == 413
+    assert await Diagnosis.all().count() == before
+    assert (await client.post("/api/diagnoses/bulk", json=[diagnosis(plants[0], n) for n in range(5)])).json()["created"] == 5
+    print("✓ 6 items get 413 on both endpoints; 5 are accepted")
+
+async def test_concurrent_parent_delete(client: httpx.AsyncClient, plants):
+    """A parent deleted mid-batch waits for the batch to commit instead of failing it"""
+    print("\n=== TESTING CONCURRENT PARENT DELETE ===")
+    inserted, release = asyncio.Event(), asyncio.Event()
+
+    async def pause(conn, rows):
+        inserted.set()
+        await release.wait()
+
+    items = [DiagnosisCreate(**diagnosis(plants[1], n)) for n in range(3)]
+    batch = asyncio.create_task(bulk_create_checked(Diagnosis, Plant, "plant_id", items, "Plant not found", pause))
+    await inserted.wait()
+    delete = asyncio.create_task(client.delete(f"/api/plants/{plants[1]}"))
+    await asyncio.sleep(0.3)
+    assert not delete.done(), "the delete should wait on the batch's lock"
+    release.set()
+    result = await batch
+    assert result.created == 3 and result.failed == 0, result
+    assert (await delete).status_code == 200
+    assert await Diagnosis.filter(plant_id=plants[1]).count() == 0  # gone with the plant
+    print("✓ The delete waited for the batch, then removed the plant and its diagnoses")
+
+async def test_rolled_back_batch(plants):
+    """A batch that fails to commit reports every item without database error text"""
+    print("\n=== TESTING ROLLED-BACK BATCH ===")
+
+    async def fail(conn, rows):
+        raise IntegrityError('insert or update on table "diagnoses" violates foreign key constraint')
+
+    before = await Diagnosis.all().count()
+    items = [DiagnosisCreate(**diagnosis(plants[0], 0)), DiagnosisCreate(**diagnosis(plants[1], 1))]
+    result = await bulk_create_checked(Diagnosis, Plant, "plant_id", items, "Plant not found", fail)
+    assert result.created == 0 and result.failed == 2, result
+    assert [r.error for r in result.results] == ["Not inserted: the batch was rolled back", "Plant not found"]
+    assert await Diagnosis.all().count() == before
+    print("✓ Nothing written; the item whose plant is gone says so, the other was rolled back")
+
+async def main():
+    """Run all bulk create tests"""
+    print("🧪 Starting Bulk Create Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            user_id = await seed(client)
+            plants = await test_mixed_parents(client, user_id)
+            await test_item_limit(client, plants)
+            await test_concurrent_parent_delete(client, plants)
+            await test_rolled_back_batch(plants)
+    print("\n" + "=" * 50)
+    print("🎉 ALL BULK CREATE TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
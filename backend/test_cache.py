@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Entity cache tests against the in-memory Redis stand-in (no Redis or PostgreSQL needed)
+"""
+import asyncio
+from datetime import datetime, timezone
+from app.core.cache import TOMBSTONE, EntityCache, InMemoryRedis, LRUTTLCache
+from app.schemas.user import UserResponse
+
+def make_cache(redis, l1_ttl=30.0, tombstone_ttl=5):
+    """Build a cache the way a worker would, on a shared Redis"""
+    return EntityCache(redis, ttl=60, l1_max_entries=100, l1_ttl=l1_ttl, channel="test:invalidate",
+                       tombstone_ttl=tombstone_ttl)
+
+def make_user(name="Cached User"):
+    now = datetime.now(timezone.utc)
+    return UserResponse(id=1, email="cached@example.com", name=name, created_at=now, updated_at=now)
+
+async def test_read_through():
+    """Misses load once, then L1 serves; a second worker is served from L2"""
+    print("=== TESTING READ-THROUGH ===")
+    redis = InMemoryRedis()
+    worker_a, worker_b = make_cache(redis), make_cache(redis)
+    loads = 0
+    
+    async def loader():
+        nonlocal loads
+        loads += 1
+        return make_user()
+    
+    first = await worker_a.read_through("user:1", UserResponse, loader)
+    second = await worker_a.read_through("user:1", UserResponse, loader)
+    third = await worker_b.read_through("user:1", UserResponse, loader)
+    assert first == second == third and loads == 1
+    assert worker_a.stats == {"l1_hits": 1, "l2_hits": 0, "misses": 1}
+    assert worker_b.stats == {"l1_hits": 0, "l2_hits": 1, "misses": 0}
+    print(f"✓ One load for three reads: {worker_a.stats} / {worker_b.stats}")
+
+async def test_missing_rows_are_not_cached():
+    """A loader returning None is a miss every time"""
+    print("\n=== TESTING MISSING ROWS ===")
+    cache = make_cache(InMemoryRedis())
+    
+    async def loader():
+        return None
+    
+    assert await cache.read_through("user:404", UserResponse, loader) is None
+    assert await cache.get("user:404") is None
+    print("✓ Missing rows fall through to the database")
+
+async def test_pubsub_invalidation():
+    """A write on one worker evicts the L1 copy held by another"""
+    print("\n=== TESTING PUB/SUB INVALIDATION ===")
+    redis = InMemoryRedis()
+    writer, reader = make_cache(redis), make_cache(redis)
+    await reader.start()
+    await writer.start()
+    try:
+        await asyncio.sleep(0)
+        await reader.set("user:1", make_user().model_dump_json())
+        assert reader.l1.get("user:1") is not None
+        await writer.invalidate("user:1")
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert reader.l1.get("user:1") is None
+        assert await redis.get("user:1") == TOMBSTONE and await reader.get("user:1") is None
+        print("✓ Invalidation reached the other worker's L1 and left a tombstone in L2")
+    finally:
+        await reader.stop()
+        await writer.stop()
+
+async def test_fill_racing_invalidation():
+    """A row read before a write is not cached after the write's invalidation"""
+    print("\n=== TESTING FILL AFTER INVALIDATION ===")
+    redis = InMemoryRedis()
+    reader, writer = make_cache(redis, tombstone_ttl=1), make_cache(redis, tombstone_ttl=1)
+    read_done, write_done = asyncio.Event(), asyncio.Event()
+    
+    async def slow_loader():
+        row = make_user("Before")  # read from the database before the update commits
+        read_done.set()
+        await write_done.wait()
+        return row
+    
+    fill = asyncio.create_task(reader.read_through("user:1", UserResponse, slow_loader))
+    await read_done.wait()
+    await writer.invalidate("user:1")  # the update commits and invalidates
+    write_done.set()
+    assert (await fill).name == "Before"  # the reader still answers with what it read
+    assert await redis.get("user:1") == TOMBSTONE and reader.l1.get("user:1") is None
+    
+    async def loader():
+        return make_user("After")
+    
+    assert (await reader.read_through("user:1", UserResponse, loader)).name == "After"
+    assert await reader.get("user:1") is None, "fills wait for the tombstone to expire"
+    await asyncio.sleep(1.05)
+    await reader.read_through("user:1", UserResponse, loader)
+    assert UserResponse.model_validate_json(await redis.get("user:1")).name == "After"
+    print("✓ The stale fill was refused; the key is cached again once the tombstone expires")
+
+async def test_l1_ttl_and_lru():
+    """L1 entries expire after their TTL and the oldest is evicted at capacity"""
+    print("\n=== TESTING L1 TTL AND LRU ===")
+    l1 = LRUTTLCache(max_entries=2, ttl=0.05)
+    l1.set("a", "1")
+    l1.set("b", "2")
+    l1.get("a")
+    l1.set("c", "3")
+    assert l1.get("b") is None and l1.get("a") == "1" and l1.get("c") == "3"
+    await asyncio.sleep(0.06)
+    assert l1.get("a") is None and len(l1) == 1
+    print("✓ LRU eviction and TTL expiry work")
+
+async def main():
+    """Main test function"""
+    await test_read_through()
+    await test_missing_rows_are_not_cached()
+    await test_pubsub_invalidation()
+    await test_fill_racing_invalidation()
+    await test_l1_ttl_and_lru()
+    print("\n*** ALL CACHE TESTS PASSED! ***")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Total count tests: ?total=cached seeds a counter from COUNT(*) and creates
+and deletes adjust it in place, deletes that cascade drop the counters they
+cannot adjust, and ?total=approx uses planner statistics once the table has
+been analyzed. Needs PostgreSQL at DATABASE_URL on a fresh database; runs
+the counter script on the Redis at REDIS_URL (default: the in-memory one).
+"""
+import asyncio
+import os
+os.environ.setdefault("REDIS_URL", "memory://")
+
+import httpx
+from tortoise import connections
+
+from app.core.cache import INCR_IF_EXISTS_SCRIPT, InMemoryRedis
+from app.core.counters import (
+    DIAGNOSES_COUNT_KEY, PLANTS_COUNT_KEY, USERS_COUNT_KEY, counter_cache,
+    diagnoses_by_plant_count_key, diagnoses_by_user_count_key, plants_by_user_count_key,
+)
+from app.core.metrics import metrics_response
+from app.main import app, lifespan
+
+def requests_count(mode: str, result: str) -> float:
+    for line in metrics_response().body.decode().splitlines():
+        if line.startswith(f'plantify_count_requests_total{{mode="{mode}",result="{result}"}}'):
+            return float(line.split()[-1])
+    return 0.0
+
+async def counter(key: str):
+    value = await counter_cache.redis.get(key)
+    return None if value is None else int(value)
+
+async def total(client: httpx.AsyncClient, url: str, mode: str = "cached") -> int:
+    response = await client.get(url, params={"total": mode, "limit": 1})
+    assert response.status_code == 200, response.text
+    return int(response.headers["x-total-count"])
+
+async def create_diagnosis(client: httpx.AsyncClient, plant_id: int) -> None:
+    response = await client.post("/api/diagnoses/", json={
+        "plant_id": plant_id, "disease_name": "rust", "confidence_score": 0.7, "image_path": "count.jpg",
+    })
+    assert response.status_code == 200, response.text
+
+async def test_counter_script():
+    """The counter script only increments counters that exist"""
+    print("=== TESTING COUNTER SCRIPT ===")
+    redis = counter_cache.redis
+    await redis.delete("count:test")
+    assert await redis.eval(INCR_IF_EXISTS_SCRIPT, 1, "count:test", 5) is None
+    assert await redis.get("count:test") is None
+    await redis.set("count:test", 10, ex=60)
+    assert int(await redis.eval(INCR_IF_EXISTS_SCRIPT, 1, "count:test", -3)) == 7
+    assert int(await redis.get("count:test")) == 7
+    await redis.delete("count:test")
+    if isinstance(redis, InMemoryRedis):
+        try:
+            await redis.eval("return 1", 0)
+            raise AssertionError("scripts without an emulation should be refused")
+        except ValueError:
+            pass
+    print(f"✓ Missing counters are not created; existing ones move by the delta ({type(redis).__name__})")
+
+async def test_seed_and_adjust(client: httpx.AsyncClient):
+    """First read seeds from COUNT(*); creates and deletes adjust without recounting"""
+    print("\n=== TESTING SEEDING AND ADJUSTMENT ===")
+    users = [(await client.post("/api/users/", json={"email": f"count{n}@example.com", "name": f"Count {n}"})).json()
+             for n in range(3)]
+    assert await counter(USERS_COUNT_KEY) is None
+    assert await total(client, "/api/users/") == 3 and await counter(USERS_COUNT_KEY) == 3
+    extra = (await client.post("/api/users/", json={"email": "count9@example.com", "name": "Extra"})).json()
+    assert await counter(USERS_COUNT_KEY) == 4
+    assert (await client.delete(f"/api/users/{extra['id']}")).status_code == 200
+    misses = requests_count("cached", "miss")
+    assert await total(client, "/api/users/") == 3 and requests_count("cached", "miss") == misses
+    print("✓ Users: seeded at 3, +1 on create and -1 on delete, served without a recount")
+
+    owner = users[0]["id"]
+    plants = [(await client.post("/api/plants/", json={"name": f"P{n}", "species": "Ficus", "user_id": owner})).json()["id"]
+              for n in range(2)]
+    assert await total(client, f"/api/plants/user/{owner}") == 2 and await total(client, "/api/plants/") == 2
+    plants.append((await client.post("/api/plants/", json={"name": "P2", "species": "Ficus", "user_id": owner})).json()["id"])
+    assert await counter(plants_by_user_count_key(owner)) == 3 and await counter(PLANTS_COUNT_KEY) == 3
+
+    for _ in range(2):
+        await create_diagnosis(client, plants[0])
+    assert await total(client, f"/api/diagnoses/plant/{plants[0]}") == 2
+    assert await total(client, f"/api/diagnoses/user/{owner}") == 2 and await total(client, "/api/diagnoses/") == 2
+    await create_diagnosis(client, plants[0])
+    response = await client.post("/api/diagnoses/bulk", json=[
+        {"plant_id": plants[0], "disease_name": "rust", "confidence_score": 0.5, "image_path": "a.jpg"},
+        {"plant_id": plants[1], "disease_name": "rust", "confidence_score": 0.5, "image_path": "b.jpg"},
+    ])
+    assert response.json()["created"] == 2, response.text
+    assert await counter(diagnoses_by_plant_count_key(plants[0])) == 4
+    assert await counter(diagnoses_by_user_count_key(owner)) == 5 and await counter(DIAGNOSES_COUNT_KEY) == 5
+    assert await counter(diagnoses_by_plant_count_key(plants[1])) is None  # never read, so never seeded
+    print("✓ Plant and diagnosis counters per user, per plant and overall follow single and bulk creates")
+    return owner, plants
+
+async def test_cascade_invalidation(client: httpx.AsyncClient, owner: int, plants):
+    """Deletes that cascade invalidate the counters of what went with them"""
+    print("\n=== TESTING CASCADED DELETES ===")
+    assert (await client.delete(f"/api/plants/{plants[0]}")).status_code == 200
+    for key in (DIAGNOSES_COUNT_KEY, diagnoses_by_user_count_key(owner), diagnoses_by_plant_count_key(plants[0])):
+        assert await counter(key) is None, key
+    assert await counter(plants_by_user_count_key(owner)) == 2 and await counter(PLANTS_COUNT_KEY) == 2
+    assert await total(client, f"/api/diagnoses/user/{owner}") == 1 and await total(client, "/api/diagnoses/") == 1
+    print("✓ Deleting a plant drops its diagnosis counters; the next read recounts 1")
+
+    assert (await client.delete(f"/api/users/{owner}")).status_code == 200
+    for key in (PLANTS_COUNT_KEY, DIAGNOSES_COUNT_KEY, plants_by_user_count_key(owner), diagnoses_by_user_count_key(owner)):
+        assert await counter(key) is None, key
+    assert await counter(USERS_COUNT_KEY) == 2
+    assert await total(client, "/api/plants/") == 0 and await total(client, "/api/diagnoses/") == 0
+    print("✓ Deleting a user drops its plant and diagnosis counters; totals recount to 0")
+
+async def test_approx(client: httpx.AsyncClient):
+    """approx falls back to the counter while reltuples is -1, then uses the estimate"""
+    print("\n=== TESTING APPROXIMATE TOTALS ===")
+    conn = connections.get("default")
+    _, rows = await conn.execute_query("SELECT reltuples FROM pg_class WHERE oid = 'users'::regclass")
+    assert rows[0]["reltuples"] == -1, "needs a database whose users table was never analyzed"
+    estimates = requests_count("approx", "estimate")
+    assert await total(client, "/api/users/", "approx") == 2
+    assert requests_count("approx", "estimate") == estimates
+    print("✓ Never-analyzed table: approx answered from the counter cache")
+
+    await conn.execute_script("ANALYZE users")
+    assert await total(client, "/api/users/", "approx") == 2
+    assert requests_count("approx", "estimate") == estimates + 1
+    print("✓ After ANALYZE: approx answered from pg_class.reltuples")
+
+async def main():
+    """Run all total count tests"""
+    print("🧪 Starting Total Count Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        await test_counter_script()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            owner, plants = await test_seed_and_adjust(client)
+            await test_cascade_invalidation(client, owner, plants)
+            await test_approx(client)
+    print("\n" + "=" * 50)
+    print("🎉 ALL TOTAL COUNT TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -36,7 +36,7 @@ async def test_user_crud():
     print("4. Testing User Update...")
     update_data = UserUpdate(name="John Doe Updated")
     updated_user = await UserService.update_user(user.id, update_data)
-    print(f"✓ Updated user name: {updated_user.name}")
+    print(f"✓ Updated user name: {updated_user['name']}")
     
     # READ ALL
     print("5. Testing Get All Users...")
@@ -69,7 +69,7 @@ async def test_plant_crud(user):
     print("3. Testing Plant Update...")
     update_data = PlantUpdate(description="Beautiful red roses in the garden")
     updated_plant = await PlantService.update_plant(plant.id, update_data)
-    print(f"✓ Updated plant description: {updated_plant.description}")
+    print(f"✓ Updated plant description: {updated_plant['description']}")
     
     # READ ALL
     print("4. Testing Get All Plants...")
@@ -112,7 +112,7 @@ async def test_diagnosis_crud(plant):
         notes="Black spots observed on leaves, treatment recommended"
     )
     updated_diagnosis = await DiagnosisService.update_diagnosis(diagnosis.id, update_data)
-    print(f"✓ Updated diagnosis confidence: {updated_diagnosis.confidence_score}")
+    print(f"✓ Updated diagnosis confidence: {updated_diagnosis['confidence_score']}")
     
     # READ ALL
     print("4. Testing Get All Diagnoses...")
@@ -139,13 +139,13 @@ async def test_relationships():
     users = await UserService.get_all_users()
     if users:
         user = users[0]
-        plants = await PlantService.get_plants_by_user(user.id)
-        print(f"✓ User {user.name} has {len(plants)} plants")
+        plants = await PlantService.get_plants_by_user(user['id'])
+        print(f"✓ User {user['name']} has {len(plants)} plants")
         
         if plants:
             plant = plants[0]
-            diagnoses = await DiagnosisService.get_diagnoses_by_plant(plant.id)
-            print(f"✓ Plant {plant.name} has {len(diagnoses)} diagnoses")
+            diagnoses = await DiagnosisService.get_diagnoses_by_plant(plant['id'])
+            print(f"✓ Plant {plant['name']} has {len(diagnoses)} diagnoses")
 
 async def test_edge_cases():
     """Test edge cases and error conditions"""
@@ -198,20 +198,20 @@ async def test_delete_operations():
     # Delete diagnosis
     if diagnoses:
         diagnosis = diagnoses[0]
-        success = await DiagnosisService.delete_diagnosis(diagnosis.id)
-        print(f"✓ Deleted diagnosis {diagnosis.id}: {success}")
+        success = await DiagnosisService.delete_diagnosis(diagnosis['id'])
+        print(f"✓ Deleted diagnosis {diagnosis['id']}: {success}")
     
     # Delete plant
     if plants:
         plant = plants[0]
-        success = await PlantService.delete_plant(plant.id)
-        print(f"✓ Deleted plant {plant.id}: {success}")
+        success = await PlantService.delete_plant(plant['id'])
+        print(f"✓ Deleted plant {plant['id']}: {success}")
     
     # Delete user
     if users:
         user = users[0]
-        success = await UserService.delete_user(user.id)
-        print(f"✓ Deleted user {user.id}: {success}")
+        success = await UserService.delete_user(user['id'])
+        print(f"✓ Deleted user {user['id']}: {success}")
 
 async def main():
     """Main test function"""
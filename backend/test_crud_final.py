@@ -47,7 +47,7 @@ async def test_complete_crud_flow():
         # Update user
         user_update = UserUpdate(name="John Doe Updated")
         updated_user = await UserService.update_user(user.id, user_update)
-        print(f"  UPDATE: User name changed to - {updated_user.name}")
+        print(f"  UPDATE: User name changed to - {updated_user['name']}")
         
         # 2. PLANT OPERATIONS
         print("\n2. PLANT OPERATIONS:")
@@ -69,7 +69,7 @@ async def test_complete_crud_flow():
         # Update plant
         plant_update = PlantUpdate(description="Beautiful red roses in the garden")
         updated_plant = await PlantService.update_plant(plant.id, plant_update)
-        print(f"  UPDATE: Plant description - {updated_plant.description}")
+        print(f"  UPDATE: Plant description - {updated_plant['description']}")
         
         # 3. DIAGNOSIS OPERATIONS
         print("\n3. DIAGNOSIS OPERATIONS:")
@@ -97,7 +97,7 @@ async def test_complete_crud_flow():
             notes="Black spots observed on leaves, treatment applied"
         )
         updated_diagnosis = await DiagnosisService.update_diagnosis(diagnosis.id, diagnosis_update)
-        print(f"  UPDATE: Diagnosis confidence - {updated_diagnosis.confidence_score}")
+        print(f"  UPDATE: Diagnosis confidence - {updated_diagnosis['confidence_score']}")
         
         # 4. RELATIONSHIP QUERIES
         print("\n4. RELATIONSHIP QUERIES:")
@@ -171,8 +171,8 @@ async def test_complete_crud_flow():
         print(f"  User now has {len(user_diagnoses)} total diagnoses")
         
         for plant in user_plants:
-            plant_diagnoses = await DiagnosisService.get_diagnoses_by_plant(plant.id)
-            print(f"    Plant {plant.name} has {len(plant_diagnoses)} diagnoses")
+            plant_diagnoses = await DiagnosisService.get_diagnoses_by_plant(plant['id'])
+            print(f"    Plant {plant['name']} has {len(plant_diagnoses)} diagnoses")
         
         # 9. ERROR HANDLING TESTS
         print("\n9. ERROR HANDLING TESTS:")
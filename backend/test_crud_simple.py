@@ -35,7 +35,7 @@ async def test_all_crud():
         # Update user
         update_data = UserUpdate(name="Updated Test User")
         updated_user = await UserService.update_user(user.id, update_data)
-        print(f"  Updated user: {updated_user.name}")
+        print(f"  Updated user: {updated_user['name']}")
         
         # === PLANT CRUD ===
         print("\n2. TESTING PLANT CRUD:")
@@ -57,7 +57,7 @@ async def test_all_crud():
         # Update plant
         plant_update = PlantUpdate(description="Updated test plant")
         updated_plant = await PlantService.update_plant(plant.id, plant_update)
-        print(f"  Updated plant: {updated_plant.description}")
+        print(f"  Updated plant: {updated_plant['description']}")
         
         # === DIAGNOSIS CRUD ===
         print("\n3. TESTING DIAGNOSIS CRUD:")
@@ -81,7 +81,7 @@ async def test_all_crud():
         # Update diagnosis
         diagnosis_update = DiagnosisUpdate(confidence_score=0.98)
         updated_diagnosis = await DiagnosisService.update_diagnosis(diagnosis.id, diagnosis_update)
-        print(f"  Updated diagnosis confidence: {updated_diagnosis.confidence_score}")
+        print(f"  Updated diagnosis confidence: {updated_diagnosis['confidence_score']}")
         
         # === COUNTS ===
         print("\n4. TESTING COUNTS:")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Connection pool tests: settings reach asyncpg, saturation is visible in the
+metrics and requests fail fast with 503 instead of queueing. Needs PostgreSQL
+at DATABASE_URL; REDIS_URL=memory:// is enough for the cache.
+"""
+import asyncio
+import os
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ.setdefault("DB_POOL_MIN_SIZE", "1")
+os.environ.setdefault("DB_POOL_MAX_SIZE", "2")
+os.environ.setdefault("DB_POOL_ACQUIRE_TIMEOUT", "0.2")
+
+import httpx
+from tortoise import connections
+
+from app.core.config import settings
+from app.core.database import TORTOISE_ORM, pool_stats
+from app.core.db_pool import InstrumentedPool, PoolTimeoutError
+from app.core.metrics import metrics_response
+from app.main import app, lifespan
+
+async def test_pool_settings():
+    """Every configured connection gets the pool settings and the instrumented pool"""
+    print("=== TESTING POOL SETTINGS ===")
+    for name, config in TORTOISE_ORM["connections"].items():
+        assert config["engine"] == "app.core.db_pool"
+        assert config["credentials"]["maxsize"] == settings.DB_POOL_MAX_SIZE
+        client = connections.get(name)
+        await client.execute_query("SELECT 1")
+        assert isinstance(client._pool, InstrumentedPool)
+        assert client._pool.get_max_size() == settings.DB_POOL_MAX_SIZE
+    print(f"✓ {list(TORTOISE_ORM['connections'])}: max_size={settings.DB_POOL_MAX_SIZE}, "
+          f"acquire_timeout={settings.DB_POOL_ACQUIRE_TIMEOUT}s")
+
+async def test_acquire_timeout():
+    """With every connection checked out, an acquire fails after the timeout"""
+    print("\n=== TESTING ACQUIRE TIMEOUT ===")
+    pool = connections.get("default")._pool
+    held = [await pool.acquire() for _ in range(settings.DB_POOL_MAX_SIZE)]
+    try:
+        assert pool_stats()["default"]["in_use"] == settings.DB_POOL_MAX_SIZE
+        try:
+            await connections.get("default").execute_query("SELECT 1")
+            raise AssertionError("acquire should have timed out")
+        except PoolTimeoutError as exc:
+            print(f"✓ Saturated pool raised: {exc}")
+        
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/users/")
+            assert response.status_code == 503, response.status_code
+            assert response.headers["retry-after"] == "1"
+            print("✓ API answers 503 with Retry-After while saturated")
+    finally:
+        for conn in held:
+            await pool.release(conn)
+    assert pool_stats()["default"]["in_use"] == 0
+    await connections.get("default").execute_query("SELECT 1")
+    print("✓ Pool recovers once connections are released")
+
+async def test_pool_metrics():
+    """Pool gauges and the acquire histogram are exported"""
+    print("\n=== TESTING POOL METRICS ===")
+    body = metrics_response().body.decode()
+    for name in ("plantify_db_pool_size", "plantify_db_pool_in_use", "plantify_db_pool_waiting",
+                 "plantify_db_pool_acquire_seconds_bucket", "plantify_db_pool_acquire_timeouts_total"):
+        assert name in body, name
+    timeouts = [l for l in body.splitlines() if l.startswith("plantify_db_pool_acquire_timeouts_total{")]
+    assert any(float(l.split()[-1]) >= 2 for l in timeouts), timeouts
+    print("✓ Gauges, histogram and timeout counter exported")
+
+async def main():
+    """Run all pool tests"""
+    print("🧪 Starting Connection Pool Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        await test_pool_settings()
+        await test_acquire_timeout()
+        await test_pool_metrics()
+    print("\n" + "=" * 50)
+    print("🎉 ALL POOL TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
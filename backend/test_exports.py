@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Export tests: a user's diagnoses and plants stream as NDJSON or CSV in
+EXPORT_FETCH_SIZE batches from a server-side cursor, with the same columns
+as the list endpoints, only that user's rows, and CSV quoting that survives
+commas, quotes and newlines. Needs PostgreSQL at DATABASE_URL.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["EXPORT_FETCH_SIZE"] = "4"
+
+import httpx
+
+from app.main import app, lifespan
+from app.services.diagnosis_service import DIAGNOSIS_FIELDS
+from app.services.export_service import ExportService
+from app.services.plant_service import PLANT_FIELDS
+
+TRICKY_NOTES = 'Spots on "lower" leaves,\nspreading'
+
+async def seed(client: httpx.AsyncClient):
+    users = []
+    for name in ("exporter", "bystander"):
+        user = (await client.post("/api/users/get-or-create", json={"email": f"{name}@example.com", "name": name})).json()
+        users.append(user["id"])
+    diagnosis_ids = []
+    for user_id, plants in ((users[0], 2), (users[1], 1)):
+        for p in range(plants):
+            plant = (await client.post("/api/plants/", json={"name": f"Plant {p}", "species": "Vitis", "user_id": user_id})).json()
+            for n in range(5):
+                response = await client.post("/api/diagnoses/", json={
+                    "plant_id": plant["id"], "disease_name": "mildew", "confidence_score": 0.1 * n,
+                    "image_path": f"{p}/{n}.jpg", "notes": TRICKY_NOTES if n == 0 else None,
+                })
+                if user_id == users[0]:
+                    diagnosis_ids.append(response.json()["id"])
+    return users, diagnosis_ids
+
+async def test_batches(user_id: int):
+    """Rows come from the cursor EXPORT_FETCH_SIZE at a time"""
+    print("=== TESTING CURSOR BATCHES ===")
+    sizes = [len(batch) async for batch in ExportService.stream_user_rows("diagnoses", user_id)]
+    assert sizes == [4, 4, 2], sizes
+    print(f"✓ 10 diagnoses in batches of {sizes}")
+
+async def test_ndjson(client: httpx.AsyncClient, user_id: int, diagnosis_ids):
+    """NDJSON has one diagnosis per line with the list columns, only for this user"""
+    print("\n=== TESTING NDJSON EXPORT ===")
+    response = await client.get(f"/api/exports/users/{user_id}/diagnoses")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["content-disposition"] == f'attachment; filename="user_{user_id}_diagnoses.ndjson"'
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(row["id"] for row in rows) == sorted(diagnosis_ids)
+    assert all(list(row) == list(DIAGNOSIS_FIELDS) for row in rows)
+    listed = {row["id"]: row for row in (await client.get(f"/api/diagnoses/user/{user_id}")).json()}
+    for row in rows:
+        assert row["notes"] == listed[row["id"]]["notes"] and row["confidence_score"] == listed[row["id"]]["confidence_score"]
+    print(f"✓ {len(rows)} lines with the {len(DIAGNOSIS_FIELDS)} list columns; the other user's rows excluded")
+
+async def test_csv(client: httpx.AsyncClient, user_id: int):
+    """CSV has a header row and quotes values so they read back unchanged"""
+    print("\n=== TESTING CSV EXPORT ===")
+    response = await client.get(f"/api/exports/users/{user_id}/diagnoses", params={"format": "csv"})
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/csv")
+    reader = csv.DictReader(io.StringIO(response.text))
+    rows = list(reader)
+    assert reader.fieldnames == list(DIAGNOSIS_FIELDS) and len(rows) == 10
+    assert sum(row["notes"] == TRICKY_NOTES for row in rows) == 2
+    assert all("T" in row["created_at"] for row in rows)
+    print("✓ Header plus 10 rows; notes with commas, quotes and newlines round-trip; ISO timestamps")
+
+    plants = list(csv.DictReader(io.StringIO(
+        (await client.get(f"/api/exports/users/{user_id}/plants", params={"format": "csv"})).text)))
+    assert len(plants) == 2 and list(plants[0]) == list(PLANT_FIELDS)
+    print("✓ Plants export: 2 rows with the plant list columns")
+
+async def test_empty_and_invalid(client: httpx.AsyncClient):
+    """A user without rows exports nothing but the header; unknown kinds and formats are refused"""
+    print("\n=== TESTING EMPTY AND INVALID EXPORTS ===")
+    assert (await client.get("/api/exports/users/999999/diagnoses")).text == ""
+    header = (await client.get("/api/exports/users/999999/plants", params={"format": "csv"})).text
+    assert header.strip() == ",".join(PLANT_FIELDS)
+    assert (await client.get("/api/exports/users/1/users")).status_code == 422
+    assert (await client.get("/api/exports/users/1/plants", params={"format": "xml"})).status_code == 422
+    print("✓ Empty NDJSON body, header-only CSV; bad kind or format get 422")
+
+async def main():
+    """Run all export tests"""
+    print("🧪 Starting Export Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            (user_id, _), diagnosis_ids = await seed(client)
+            await test_batches(user_id)
+            await test_ndjson(client, user_id, diagnosis_ids)
+            await test_csv(client, user_id)
+            await test_empty_and_invalid(client)
+    print("\n" + "=" * 50)
+    print("🎉 ALL EXPORT TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
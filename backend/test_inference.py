@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Diagnosis engine tests with a tiny stand-in model: concurrent requests are
+micro-batched under the size and deadline limits, failures reach every
+caller in the batch, images are preprocessed in worker processes with
+decompression bombs refused from the header, and /api/diagnoses/analyze
+stores the model's verdict. Needs PostgreSQL at DATABASE_URL; uses a
+temporary UPLOAD_DIR.
+"""
+import asyncio
+import io
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="plantify_inference_")
+os.environ.setdefault("PREPROCESS_WORKERS", "2")
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.main import app, lifespan
+from app.services.diagnosis_engine import InferenceOverloadedError, MicroBatcher, diagnosis_engine
+from app.services.preprocessing import ImagePreprocessor, ImageTooLargeError
+
+class StandInModel:
+    """Calls a leaf healthy when it is greener than it is red; records batch sizes"""
+    version = "stand-in-1"
+    labels = ["healthy", "leaf_spot"]
+    input_size = (32, 32)
+
+    def __init__(self, delay: float = 0.02, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.batch_sizes = []
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        self.batch_sizes.append(len(batch))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("model exploded")
+        healthy = np.clip(batch[..., 1].mean(axis=(1, 2)) - batch[..., 0].mean(axis=(1, 2)) + 0.5, 0, 1)
+        return np.stack([healthy, 1 - healthy], axis=1)
+
+def image(color) -> np.ndarray:
+    return np.full((32, 32, 3), np.array(color) * 255, dtype=np.uint8)
+
+def png(color, size=(64, 48)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def rotated_jpeg() -> bytes:
+    """Landscape pixels, green on the left, with EXIF orientation 6 (display rotated 90° clockwise)"""
+    pixels = Image.new("RGB", (400, 200), (200, 40, 30))
+    pixels.paste((20, 200, 30), (0, 0, 200, 200))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    pixels.save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+def png_bomb(width: int, height: int) -> bytes:
+    """A PNG whose header claims width x height pixels, with no pixel data at all"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IEND", b"")
+
+async def test_batching():
+    """Concurrent submits share batches no larger than max_batch_size"""
+    print("=== TESTING MICRO-BATCHING ===")
+    model = StandInModel()
+    batcher = MicroBatcher(model.predict, model.input_size, max_batch_size=8, max_wait=0.05, max_queue=100)
+    batcher.start()
+    try:
+        outputs = await asyncio.gather(*(batcher.submit(image((0, i / 40, 0))) for i in range(20)))
+        assert len(outputs) == 20 and all(o.shape == (2,) for o in outputs)
+        assert sum(model.batch_sizes) == 20 and max(model.batch_sizes) <= 8, model.batch_sizes
+        assert len(model.batch_sizes) <= 4, model.batch_sizes
+        # Rows come back to the caller that submitted them
+        assert outputs[0][0] < outputs[19][0]
+        print(f"✓ 20 concurrent images ran as batches of {model.batch_sizes}")
+
+        start = time.perf_counter()
+        await batcher.submit(image((0, 1, 0)))
+        elapsed = time.perf_counter() - start
+        assert 0.05 <= elapsed < 0.05 + model.delay + 0.1, elapsed
+        print(f"✓ A lone image runs once the 50ms deadline passes ({elapsed * 1000:.0f}ms)")
+    finally:
+        await batcher.stop()
+
+async def test_failures_and_overload():
+    """A failing batch fails all its callers; a full queue refuses new images"""
+    print("\n=== TESTING FAILURES AND OVERLOAD ===")
+    model = StandInModel(fail=True)
+    batcher = MicroBatcher(model.predict, model.input_size, max_batch_size=4, max_wait=0.01, max_queue=4)
+    batcher.start()
+    try:
+        results = await asyncio.gather(*(batcher.submit(image((0, 1, 0))) for _ in range(3)),
+                                       return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results), results
+        print("✓ Model error reaches every caller in the batch")
+        model.fail = False
+        assert (await batcher.submit(image((0, 1, 0))))[0] > 0.5
+        print("✓ Batcher keeps serving after a failed batch")
+
+        model.delay = 0.2
+        results = await asyncio.gather(*(batcher.submit(image((0, 1, 0))) for _ in range(12)),
+                                       return_exceptions=True)
+        rejected = [r for r in results if isinstance(r, InferenceOverloadedError)]
+        assert rejected and len(rejected) < 12, results
+        print(f"✓ {len(rejected)} of 12 images refused once {batcher.max_queue} were queued")
+    finally:
+        await batcher.stop()
+
+async def test_preprocessing(client: httpx.AsyncClient):
+    """Worker processes decode, rotate and resize; bombs are refused from the header"""
+    print("\n=== TESTING PREPROCESSING ===")
+    preprocessor = diagnosis_engine.preprocessor
+    assert preprocessor._pool is not None and preprocessor.workers == 2
+    key = (await client.post("/upload", content=rotated_jpeg(), headers={"Content-Type": "image/jpeg"})).json()["image_path"]
+    pixels, timings = await preprocessor.load(key, (32, 16))
+    assert pixels.shape == (32, 16, 3) and pixels.dtype == np.uint8
+    # Rotated clockwise, the green left half ends up on top
+    assert pixels[2, 8, 1] > 150 and pixels[-3, 8, 0] > 150, (pixels[2, 8], pixels[-3, 8])
+    assert {"read", "queue", "open", "decode", "resize"} <= set(timings)
+    print(f"✓ EXIF-rotated JPEG resized in a worker process ({', '.join(sorted(timings))} timed)")
+
+    bomb = (await client.post("/upload", content=png_bomb(9000, 9000), headers={"Content-Type": "image/png"})).json()
+    started = time.perf_counter()
+    try:
+        await preprocessor.load(bomb["image_path"], (32, 32))
+        raise AssertionError("bomb should have been refused")
+    except ImageTooLargeError as exc:
+        print(f"✓ 81 megapixel header refused in {(time.perf_counter() - started) * 1000:.0f}ms: {exc}")
+    inline = ImagePreprocessor(0, max_pixels=1000)
+    try:
+        await inline.load(key, (32, 32))
+        raise AssertionError("image over max_pixels should have been refused")
+    except ImageTooLargeError:
+        print("✓ PREPROCESS_MAX_PIXELS applies in-thread too")
+    return bomb["image_path"]
+
+async def test_analyze_endpoint(client: httpx.AsyncClient, bomb_key: str):
+    """Upload, analyze, and the diagnosis carries the model's verdict and version"""
+    print("\n=== TESTING ANALYZE ENDPOINT ===")
+    user = (await client.post("/api/users/get-or-create",
+                              json={"email": "inference@example.com", "name": "Inference"})).json()
+    plant = (await client.post("/api/plants/", json={"name": "Fern", "species": "Nephrolepis",
+                                                     "user_id": user["id"]})).json()
+    green = (await client.post("/upload", content=png((20, 200, 30)), headers={"Content-Type": "image/png"})).json()
+    red = (await client.post("/upload", content=png((200, 40, 30)), headers={"Content-Type": "image/png"})).json()
+
+    responses = await asyncio.gather(*(
+        client.post("/api/diagnoses/analyze", json={"plant_id": plant["id"], "image_path": key})
+        for key in [green["image_path"], red["image_path"]] * 4
+    ))
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses]
+    assert "decode;dur=" in responses[0].headers["server-timing"] and "inference;dur=" in responses[0].headers["server-timing"]
+    first, second = responses[0].json(), responses[1].json()
+    assert first["disease_name"] == "healthy" and first["is_healthy"], first
+    assert second["disease_name"] == "leaf_spot" and not second["is_healthy"], second
+    assert first["model_version"] == StandInModel.version
+    print(f"✓ 8 concurrent analyses stored in batches of {diagnosis_engine.model.batch_sizes}")
+
+    health = (await client.get(f"/api/plants/user/{user['id']}/health")).json()[0]
+    assert health["diagnosis_count"] == 8, health
+    print("✓ Plant health summary includes the analyzed diagnoses")
+
+    response = await client.post("/api/diagnoses/analyze", json={"plant_id": plant["id"], "image_path": "no/such.png"})
+    assert response.status_code == 404, response.text
+    response = await client.post("/api/diagnoses/analyze", json={"plant_id": 10**9, "image_path": green["image_path"]})
+    assert response.status_code == 404 and response.json()["detail"] == "Plant not found"
+    print("✓ Unknown image or plant is a 404")
+    response = await client.post("/api/diagnoses/analyze", json={"plant_id": plant["id"], "image_path": bomb_key})
+    assert response.status_code == 413, response.text
+    print("✓ Decompression bomb is a 413")
+
+    await diagnosis_engine.stop()
+    response = await client.post("/api/diagnoses/analyze", json={"plant_id": plant["id"], "image_path": green["image_path"]})
+    assert response.status_code == 503, response.text
+    print("✓ Without a model the endpoint answers 503")
+
+async def main():
+    """Run all diagnosis engine tests"""
+    print("🧪 Starting Diagnosis Engine Tests")
+    print("=" * 50)
+    await test_batching()
+    await test_failures_and_overload()
+    async with lifespan(app):
+        diagnosis_engine.start(StandInModel())
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            bomb_key = await test_preprocessing(client)
+            await test_analyze_endpoint(client, bomb_key)
+    shutil.rmtree(settings.UPLOAD_DIR)
+    print("\n" + "=" * 50)
+    print("🎉 ALL DIAGNOSIS ENGINE TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Inference cache tests: predictions are reused for the same image and model
+version, near-duplicates match by perceptual hash within the configured
+distance, the least recently used entry is evicted first, and
+/api/diagnoses/analyze skips the model on hits. Needs PostgreSQL at
+DATABASE_URL; uses a temporary UPLOAD_DIR.
+"""
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="plantify_inference_cache_")
+os.environ.setdefault("PREPROCESS_WORKERS", "0")
+os.environ["INFERENCE_CACHE_MAX_DISTANCE"] = "6"
+
+import httpx
+import numpy as np
+from PIL import Image, ImageFilter
+
+from app.core.config import settings
+from app.main import app, lifespan
+from app.services.diagnosis_engine import diagnosis_engine
+from app.services.inference_cache import InferenceCache, dhash
+from app.services.preprocessing import load_image
+from test_inference import StandInModel
+
+def leaf_photo(seed: int, size=(640, 480), quality=92, scale=1.0) -> bytes:
+    """A blurred random pattern standing in for a photo; the same seed gives the same scene"""
+    rng = np.random.default_rng(seed)
+    scene = Image.fromarray(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)).resize(size, Image.BICUBIC)
+    scene = scene.filter(ImageFilter.GaussianBlur(4))
+    if scale != 1.0:
+        scene = scene.resize((int(size[0] * scale), int(size[1] * scale)), Image.BILINEAR)
+    buffer = io.BytesIO()
+    scene.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+def preprocessed(data: bytes) -> np.ndarray:
+    return load_image(data, (32, 32), settings.PREPROCESS_MAX_PIXELS)[0]
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def test_perceptual_hash():
+    """Re-encoded and rescaled copies hash close together, other scenes far apart"""
+    print("=== TESTING PERCEPTUAL HASH ===")
+    original = dhash(preprocessed(leaf_photo(1)))
+    recompressed = dhash(preprocessed(leaf_photo(1, quality=40)))
+    rescaled = dhash(preprocessed(leaf_photo(1, scale=0.5)))
+    other = dhash(preprocessed(leaf_photo(2)))
+    assert distance(original, recompressed) <= 6 and distance(original, rescaled) <= 6, \
+        (distance(original, recompressed), distance(original, rescaled))
+    assert distance(original, other) > 12, distance(original, other)
+    print(f"✓ Same scene re-encoded/rescaled: {distance(original, recompressed)}/{distance(original, rescaled)} "
+          f"bits apart; another scene: {distance(original, other)} bits")
+
+def test_cache():
+    """Exact and similar lookups, version isolation and LRU eviction"""
+    print("\n=== TESTING INFERENCE CACHE ===")
+    cache = InferenceCache(max_entries=3, max_distance=4)
+    cache.put("v1", "a" * 64, "verdict-a", phash=0b1111)
+    assert cache.get("v1", "a" * 64) == "verdict-a"
+    assert cache.get("v2", "a" * 64) is None and cache.get("v1", "b" * 64) is None
+    print("✓ Exact hits are per image and per model version")
+
+    assert cache.get_similar("v1", 0b1_1000_0111) == "verdict-a"  # 3 bits apart
+    assert cache.get_similar("v1", 0b1111_0000_0000) is None  # 8 bits apart
+    assert cache.get_similar("v2", 0b1111) is None
+    print("✓ Near-duplicates hit within max_distance bits, for the same model version only")
+
+    b, c, d = 0xFFFFFFFF00000000, 0x00000000FFFFFFF0, 0xFFFF0000FFFF0000  # 32+ bits from each other
+    cache.put("v1", "b" * 64, "verdict-b", phash=b)
+    cache.put("v1", "c" * 64, "verdict-c", phash=c)
+    cache.get("v1", "a" * 64)  # a is now the most recently used
+    cache.put("v1", "d" * 64, "verdict-d", phash=d)
+    assert len(cache) == 3 and cache.get("v1", "b" * 64) is None
+    assert cache.get_similar("v1", b) is None, "evicted entries must leave the hash tier too"
+    assert cache.get_similar("v1", d) == "verdict-d" and cache.get("v1", "a" * 64) == "verdict-a"
+    print("✓ The least recently used entry is evicted from both tiers")
+    assert cache.stats == {"exact_hits": 3, "similar_hits": 2, "misses": 3}, cache.stats
+    # With the similar tier on, an exact miss is only the first half of a lookup
+    print(f"✓ Stats count each image once: {cache.stats}")
+
+async def test_analyze_uses_cache(client: httpx.AsyncClient):
+    """Resubmitted and near-duplicate photos are diagnosed without the model"""
+    print("\n=== TESTING ANALYZE WITH THE CACHE ===")
+    model = diagnosis_engine.model
+    user = (await client.post("/api/users/get-or-create",
+                              json={"email": "inference-cache@example.com", "name": "Cache"})).json()
+    plant = (await client.post("/api/plants/", json={"name": "Moss", "species": "Bryophyta",
+                                                     "user_id": user["id"]})).json()
+
+    async def analyze(data: bytes):
+        key = (await client.post("/upload", content=data, headers={"Content-Type": "image/jpeg"})).json()["image_path"]
+        response = await client.post("/api/diagnoses/analyze", json={"plant_id": plant["id"], "image_path": key})
+        assert response.status_code == 200, response.text
+        return response
+
+    first = await analyze(leaf_photo(1))
+    assert "inference;dur=" in first.headers["server-timing"] and len(model.batch_sizes) == 1
+    again = await analyze(leaf_photo(1))
+    assert "inference" not in again.headers["server-timing"] and "decode" not in again.headers["server-timing"]
+    assert again.json()["disease_name"] == first.json()["disease_name"]
+    assert again.json()["confidence_score"] == first.json()["confidence_score"]
+    assert len(model.batch_sizes) == 1
+    print("✓ Same photo again: stored verdict, no decode, no forward pass")
+
+    near = await analyze(leaf_photo(1, quality=40))
+    assert "decode;dur=" in near.headers["server-timing"] and "inference" not in near.headers["server-timing"]
+    assert near.json()["confidence_score"] == first.json()["confidence_score"] and len(model.batch_sizes) == 1
+    print("✓ Recompressed copy: decoded for its hash, then served from the cache")
+
+    await analyze(leaf_photo(2))
+    assert len(model.batch_sizes) == 2
+    print("✓ A different photo runs the model")
+
+    health = (await client.get("/health")).json()["inference_cache"]
+    assert health == {"exact_hits": 1, "similar_hits": 1, "misses": 2}, health
+    metrics = (await client.get("/metrics")).text
+    assert 'plantify_inference_cache_requests_total{result="hit",tier="similar"}' in metrics
+    print(f"✓ Hit rate on /health and /metrics: {health}")
+
+async def main():
+    """Run all inference cache tests"""
+    print("🧪 Starting Inference Cache Tests")
+    print("=" * 50)
+    test_perceptual_hash()
+    test_cache()
+    async with lifespan(app):
+        diagnosis_engine.start(StandInModel(delay=0))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await test_analyze_uses_cache(client)
+        await diagnosis_engine.stop()
+    shutil.rmtree(settings.UPLOAD_DIR)
+    print("\n" + "=" * 50)
+    print("🎉 ALL INFERENCE CACHE TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
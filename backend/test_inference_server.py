@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Shared inference process tests: web workers hand images over through their
+shared-memory rings, the API diagnoses through the inference process, and
+it recovers when that process restarts. The inference process here runs a
+tiny stand-in model (this script with --serve). Needs PostgreSQL at
+DATABASE_URL; uses a temporary UPLOAD_DIR and socket.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+os.environ.setdefault("REDIS_URL", "memory://")
+if "INFERENCE_SOCKET" not in os.environ:
+    os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="plantify_inference_server_")
+    os.environ["INFERENCE_SOCKET"] = os.path.join(os.environ["UPLOAD_DIR"], "inference.sock")
+os.environ.setdefault("PREPROCESS_WORKERS", "2")
+os.environ.setdefault("INFERENCE_SHM_SLOTS", "8")
+
+from app.core.config import settings
+from app.services.diagnosis_engine import MicroBatcher
+from app.services.inference_server import InferenceClient, InferenceServer, InferenceUnavailableError
+from test_inference import StandInModel, image, png
+
+SOCKET = settings.INFERENCE_SOCKET
+
+async def serve_stand_in():
+    """The --serve mode: an inference process serving StandInModel"""
+    model = StandInModel(delay=0.01)
+    batcher = MicroBatcher(model.predict, model.input_size, 16, 0.005, 256)
+    batcher.start()
+    server = await asyncio.start_unix_server(InferenceServer(model, batcher).handle, path=SOCKET)
+    async with server:
+        await server.serve_forever()
+
+def start_server() -> subprocess.Popen:
+    if os.path.exists(SOCKET):
+        os.unlink(SOCKET)
+    # Its own process tree, like the real one; it inherits INFERENCE_SOCKET
+    process = subprocess.Popen([sys.executable, __file__, "--serve"])
+    for _ in range(600):
+        if os.path.exists(SOCKET):
+            return process
+        time.sleep(0.05)
+    raise RuntimeError("inference process did not start")
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    process.wait()
+
+async def test_ring_handoff():
+    """Two workers' rings feed one process; slots come back, even after a cancel"""
+    print("=== TESTING SHARED-MEMORY HANDOFF ===")
+    clients = [InferenceClient(SOCKET, slots=4) for _ in range(2)]
+    for client in clients:
+        await client.connect()
+    assert clients[0].model.labels == StandInModel.labels and clients[0].model.input_size == (32, 32)
+    assert clients[0].shm.name != clients[1].shm.name
+
+    async def diagnose(client, green):
+        async with client.slot() as index:
+            client.ring[index] = image((0, green, 0))
+            return green, await client.infer(index)
+
+    results = await asyncio.gather(*(diagnose(clients[i % 2], (i % 10) / 10) for i in range(40)))
+    for green, probabilities in results:
+        assert abs(probabilities[0] - (green + 0.5 if green < 0.5 else 1.0)) < 0.01, (green, probabilities)
+    print("✓ 40 images from 2 workers (4 slots each) answered with their own probabilities")
+
+    task = asyncio.create_task(diagnose(clients[0], 0.3))
+    await asyncio.sleep(0.002)
+    task.cancel()
+    await asyncio.sleep(0.1)
+    assert clients[0]._free.qsize() == 4 and not clients[0]._orphaned
+    print("✓ A cancelled request's slot is reused only after the server answered")
+    for client in clients:
+        await client.close()
+
+async def test_api_through_inference_process(server: subprocess.Popen):
+    """analyze goes through the shared process, 503s while it is down, then recovers"""
+    import httpx
+    from app.main import app, lifespan
+    from app.services.diagnosis_engine import diagnosis_engine
+    print("\n=== TESTING API THROUGH THE INFERENCE PROCESS ===")
+    async with lifespan(app):
+        assert diagnosis_engine.client is not None and diagnosis_engine.batcher is None
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            user = (await client.post("/api/users/get-or-create",
+                                      json={"email": "shared-inference@example.com", "name": "Shared"})).json()
+            plant = (await client.post("/api/plants/", json={"name": "Ivy", "species": "Hedera",
+                                                             "user_id": user["id"]})).json()
+            key = (await client.post("/upload", content=png((20, 200, 30)),
+                                     headers={"Content-Type": "image/png"})).json()["image_path"]
+
+            async def analyze():
+                return await client.post("/api/diagnoses/analyze", json={"plant_id": plant["id"], "image_path": key})
+
+            responses = await asyncio.gather(*(analyze() for _ in range(12)))
+            assert all(r.status_code == 200 for r in responses), [r.text for r in responses]
+            assert responses[0].json()["disease_name"] == "healthy"
+            assert responses[0].json()["model_version"] == StandInModel.version
+            print("✓ 12 concurrent analyses preprocessed into the ring and diagnosed by the shared process")
+
+            stop_server(server)
+            response = await analyze()
+            assert response.status_code == 503, response.text
+            print("✓ 503 while the inference process is down")
+            server = start_server()
+            response = await analyze()
+            assert response.status_code == 200, response.text
+            print("✓ Reconnects once it is back")
+    return server
+
+async def main():
+    """Run all shared inference process tests"""
+    print("🧪 Starting Inference Process Tests")
+    print("=" * 50)
+    server = start_server()
+    try:
+        await test_ring_handoff()
+        server = await test_api_through_inference_process(server)
+    finally:
+        stop_server(server)
+    try:
+        await InferenceClient(SOCKET, 1).connect()
+        raise AssertionError("connect should fail without a server")
+    except InferenceUnavailableError:
+        pass
+    print("\n" + "=" * 50)
+    print("🎉 ALL INFERENCE PROCESS TESTS PASSED!")
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--serve"]:
+        asyncio.run(serve_stand_in())
+    else:
+        asyncio.run(main())
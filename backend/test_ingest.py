@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+NDJSON ingest tests: lines are validated as they stream in and inserted in
+chunks with one progress record each, bad lines are reported by line
+number without failing their chunk, and a line over the size limit ends
+the stream only after the lines before it are inserted or reported.
+Needs PostgreSQL at DATABASE_URL.
+"""
+import asyncio
+import json
+import os
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["INGEST_CHUNK_SIZE"] = "3"
+os.environ["INGEST_MAX_LINE_BYTES"] = "512"
+
+import httpx
+
+from app.main import app, lifespan
+from app.models.diagnosis import Diagnosis
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+def line(plant_id: int, n: int, **overrides) -> str:
+    row = {"plant_id": plant_id, "disease_name": f"spot-{n}", "confidence_score": 0.5,
+           "image_path": f"ingest/{n}.jpg", **overrides}
+    return json.dumps(row)
+
+async def chunked(body: str, size: int = 100):
+    data = body.encode()
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+async def ingest(client: httpx.AsyncClient, lines, chunk_size: int = 100):
+    body = chunked("\n".join(lines) + "\n", chunk_size)
+    response = await client.post("/api/diagnoses/ingest", content=body, headers=NDJSON)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(record) for record in response.text.splitlines()]
+    return records[:-1], records[-1]
+
+async def seed(client: httpx.AsyncClient) -> int:
+    user = (await client.post("/api/users/get-or-create", json={"email": "ingest@example.com", "name": "Ingest"})).json()
+    plant = await client.post("/api/plants/", json={"name": "Fern", "species": "Nephrolepis", "user_id": user["id"]})
+    return plant.json()["id"]
+
+async def test_chunks(client: httpx.AsyncClient, plant_id: int):
+    """Seven lines in chunks of three: three progress records, then a summary"""
+    print("=== TESTING CHUNKED INGEST ===")
+    progress, summary = await ingest(client, [line(plant_id, n) for n in range(4)] + [""] +
+                                     [line(plant_id, n) for n in range(4, 7)])
+    assert [p["chunk"] for p in progress] == [1, 2, 3], progress
+    assert [p["created"] for p in progress] == [3, 3, 1] and all(p["errors"] == [] for p in progress)
+    assert summary == {"done": True, "created": 7, "failed": 0}, summary
+    assert await Diagnosis.filter(plant_id=plant_id).count() == 7
+    print("✓ 7 lines (and a blank one) inserted as chunks of 3, 3 and 1")
+
+async def test_line_errors(client: httpx.AsyncClient, plant_id: int):
+    """Invalid lines and missing plants fail alone, reported by line number"""
+    print("\n=== TESTING PER-LINE ERRORS ===")
+    before = await Diagnosis.filter(plant_id=plant_id).count()
+    progress, summary = await ingest(client, [
+        line(plant_id, 10),
+        '{"plant_id": "x"',
+        line(plant_id, 11, confidence_score="high"),
+        line(999999, 12),
+        line(plant_id, 13),
+    ])
+    errors = [error for p in progress for error in p["errors"]]
+    assert [error["line"] for error in errors] == [2, 3, 4], errors
+    assert "confidence_score" in errors[1]["error"] and errors[2]["error"] == "Plant not found", errors
+    assert summary == {"done": True, "created": 2, "failed": 3}, summary
+    assert await Diagnosis.filter(plant_id=plant_id).count() == before + 2
+    print(f"✓ Lines 2-4 reported ({errors[0]['error'][:40]}..., {errors[2]['error']}); lines 1 and 5 inserted")
+
+    response = await client.post("/api/diagnoses/ingest", content=line(plant_id, 14), headers={"Content-Type": "application/json"})
+    assert response.status_code == 415
+    print("✓ Bodies that are not NDJSON get 415")
+
+async def test_line_too_long(client: httpx.AsyncClient, plant_id: int):
+    """A line over INGEST_MAX_LINE_BYTES ends the stream; the lines before it are kept"""
+    print("\n=== TESTING LINE TOO LONG ===")
+    before = await Diagnosis.filter(plant_id=plant_id).count()
+    progress, summary = await ingest(client, [
+        line(plant_id, 20),
+        "not json",
+        line(plant_id, 21),
+        line(plant_id, 22),
+        line(plant_id, 23),
+        line(plant_id, 24, notes="x" * 1000),
+        line(plant_id, 25),
+    ])
+    assert [(p["chunk"], p["created"]) for p in progress] == [(1, 2), (2, 2)], progress
+    assert progress[0]["errors"][0]["line"] == 2
+    assert summary["done"] is False and summary["created"] == 4 and summary["failed"] == 1, summary
+    assert summary["error"] == "Line 6 exceeds 512 bytes", summary
+    assert await Diagnosis.filter(plant_id=plant_id).count() == before + 4
+    print(f"✓ Lines 1-5 inserted or reported before the summary: {summary}")
+
+    progress, summary = await ingest(client, [
+        line(plant_id, 30),
+        line(plant_id, 31, notes="x" * 1000),
+        line(plant_id, 32),
+    ], chunk_size=1 << 16)
+    assert [(p["chunk"], p["created"]) for p in progress] == [(1, 1)], progress
+    assert summary["done"] is False and summary["created"] == 1, summary
+    assert summary["error"] == "Line 2 exceeds 512 bytes", summary
+    assert await Diagnosis.filter(plant_id=plant_id).count() == before + 5
+    print("✓ A complete over-long line inside one body chunk is refused the same way")
+
+async def main():
+    """Run all NDJSON ingest tests"""
+    print("🧪 Starting NDJSON Ingest Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            plant_id = await seed(client)
+            await test_chunks(client, plant_id)
+            await test_line_errors(client, plant_id)
+            await test_line_too_long(client, plant_id)
+    print("\n" + "=" * 50)
+    print("🎉 ALL NDJSON INGEST TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Model registry tests: species route to models by name or genus, models load
+on first use with one load per model however many requests race for it,
+the least recently used idle model is unloaded to stay within the memory
+budget, and /api/diagnoses/analyze diagnoses each plant with its species'
+model. Needs PostgreSQL at DATABASE_URL; uses a temporary UPLOAD_DIR.
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="plantify_registry_")
+os.environ.setdefault("PREPROCESS_WORKERS", "0")
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.main import app, lifespan
+from app.services.diagnosis_engine import ModelNotLoadedError, diagnosis_engine
+from app.services.model_registry import ModelSpec, load_model_registry
+from test_inference import StandInModel, png
+
+MODELS_DIR = os.path.join(settings.UPLOAD_DIR, "models")
+
+class Loader:
+    """Loads stand-in models slowly, counting loads per model; fails for names in fail"""
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.loads = []
+        self.fail = set()
+
+    def __call__(self, spec: ModelSpec) -> StandInModel:
+        self.loads.append(spec.name)
+        time.sleep(self.delay)
+        if spec.name in self.fail:
+            raise OSError(f"cannot read {spec.path}")
+        model = StandInModel(delay=0)
+        model.version = spec.version
+        return model
+
+def write_registry(sizes) -> str:
+    """A registry file with a model file of each size; returns its path"""
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    models = {}
+    for name, size in sizes.items():
+        with open(os.path.join(MODELS_DIR, f"{name}.keras"), "wb") as handle:
+            handle.write(b"\0" * size)
+        models[name] = {"path": f"{name}.keras", "labels": "labels.txt"}
+    models["nightshades"]["species"] = ["Solanum", "Capsicum annuum"]
+    models["herbs"]["species"] = ["Ocimum basilicum", "Mentha"]
+    models["general"]["version"] = "general-v3"
+    path = os.path.join(MODELS_DIR, "registry.json")
+    with open(path, "w") as handle:
+        json.dump({"default": "general", "models": models}, handle)
+    return path
+
+async def test_routing_and_single_flight():
+    """Species and genus routing; racing first requests share one load"""
+    print("=== TESTING ROUTING AND SINGLE-FLIGHT LOADING ===")
+    registry = load_model_registry(write_registry({"general": 400, "nightshades": 400, "herbs": 400}), 10_000)
+    assert registry.route("Solanum lycopersicum") == "nightshades" and registry.route("capsicum ANNUUM") == "nightshades"
+    assert registry.route("Capsicum chinense") == "general" and registry.route(None) == "general"
+    assert registry.route("Mentha spicata") == "herbs" and registry.route("Ocimum basilicum") == "herbs"
+    assert registry.specs["general"].version == "general-v3" and registry.specs["herbs"].version == "herbs.keras"
+    print("✓ Species match by full name or genus, case-insensitively; the rest go to the default")
+
+    registry.loader = loader = Loader()
+
+    async def use(species):
+        async with registry.use(species) as resident:
+            return resident.model
+
+    models = await asyncio.gather(*(use("Solanum tuberosum") for _ in range(10)))
+    assert loader.loads == ["nightshades"] and all(model is models[0] for model in models), loader.loads
+    print("✓ 10 concurrent first requests triggered 1 load and share the model")
+    await registry.stop()
+
+async def test_eviction():
+    """The least recently used idle model is unloaded; models in use are kept"""
+    print("\n=== TESTING MEMORY-BOUNDED LRU ===")
+    registry = load_model_registry(write_registry({"general": 400, "nightshades": 400, "herbs": 400}), 1000)
+    registry.loader = loader = Loader(delay=0)
+    for species in ("Solanum", "Mentha", "Solanum"):
+        async with registry.use(species):
+            pass
+    async with registry.use("Ficus"):
+        pass
+    assert list(registry.stats["loaded"]) == ["nightshades", "general"] and registry.resident_bytes == 800
+    print(f"✓ Budget of 1000 bytes: loading general unloaded herbs, the least recently used ({registry.stats})")
+
+    async with registry.use("Mentha") as herbs:
+        async with registry.use("Solanum") as nightshades:
+            # Both in use: nothing idle to unload, so the budget is exceeded
+            async with registry.use("Ficus"):
+                assert registry.resident_bytes == 1200 and herbs.leases == 1
+            result = await nightshades.batcher.submit(np.zeros((32, 32, 3), np.uint8))
+            assert result.shape == (2,)
+    assert loader.loads == ["nightshades", "herbs", "general", "herbs", "nightshades", "general"], loader.loads
+    print("✓ Models in use are never unloaded, even over budget")
+
+    loader.fail.add("general")
+    await registry.stop()
+    for _ in range(2):
+        try:
+            async with registry.use("Ficus"):
+                raise AssertionError("the load should have failed")
+        except ModelNotLoadedError as exc:
+            assert "failed to load" in str(exc)
+    loader.fail.clear()
+    async with registry.use("Ficus") as resident:
+        assert resident.model.version == "general-v3"
+    print("✓ A failed load raises ModelNotLoadedError and is retried by the next request")
+    await registry.stop()
+
+async def test_analyze_routes_by_species(client: httpx.AsyncClient):
+    """Each plant is diagnosed with its species' model, loaded on first use"""
+    print("\n=== TESTING ANALYZE WITH THE REGISTRY ===")
+    registry = load_model_registry(write_registry({"general": 400, "nightshades": 400, "herbs": 400}), 10_000)
+    registry.loader = loader = Loader(delay=0.05)
+    diagnosis_engine.start_registry(registry)
+    try:
+        user = (await client.post("/api/users/get-or-create", json={"email": "registry@example.com", "name": "Registry"})).json()
+        key = (await client.post("/upload", content=png((20, 200, 30)), headers={"Content-Type": "image/png"})).json()["image_path"]
+        assert (await client.get("/health")).json()["model_registry"]["loaded"] == {}
+        expected = {"Solanum lycopersicum": "nightshades.keras", "Ocimum basilicum": "herbs.keras", "Ficus lyrata": "general-v3"}
+        for species, version in expected.items():
+            plant = (await client.post("/api/plants/", json={"name": species, "species": species, "user_id": user["id"]})).json()
+            responses = await asyncio.gather(*(client.post("/api/diagnoses/analyze",
+                                                           json={"plant_id": plant["id"], "image_path": key})
+                                               for _ in range(3)))
+            for response in responses:
+                assert response.status_code == 200, response.text
+                assert response.json()["model_version"] == version and response.json()["disease_name"] == "healthy"
+        assert sorted(loader.loads) == ["general", "herbs", "nightshades"], loader.loads
+        print("✓ Tomato, basil and fig plants diagnosed by their own models, each loaded once")
+
+        health = (await client.get("/health")).json()
+        assert health["model_registry"]["resident_bytes"] == 1200 and health["diagnosis_model"] is None
+        metrics = (await client.get("/metrics")).text
+        assert 'plantify_model_loads_total{model="herbs",result="loaded"}' in metrics
+        assert 'plantify_model_resident_bytes{model="herbs"} 400.0' in metrics
+        assert 'plantify_model_evictions_total{model="herbs"}' in metrics
+        print("✓ Loaded models on /health and load/evict/memory metrics on /metrics")
+    finally:
+        await diagnosis_engine.stop()
+
+async def main():
+    """Run all model registry tests"""
+    print("🧪 Starting Model Registry Tests")
+    print("=" * 50)
+    await test_routing_and_single_flight()
+    await test_eviction()
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await test_analyze_routes_by_species(client)
+    shutil.rmtree(settings.UPLOAD_DIR)
+    print("\n" + "=" * 50)
+    print("🎉 ALL MODEL REGISTRY TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
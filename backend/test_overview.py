@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+User overview tests: /api/users/{id}/overview returns the user, their
+newest plants with health summaries and each plant's newest diagnoses in
+three queries, honouring plant_limit and diagnoses_per_plant. Needs
+PostgreSQL at DATABASE_URL.
+"""
+import asyncio
+import os
+os.environ.setdefault("REDIS_URL", "memory://")
+
+import httpx
+
+from app.main import app, lifespan
+from app.schemas.diagnosis import DiagnosisResponse
+from app.schemas.plant import PlantHealthResponse
+from test_projections import logged_queries
+
+async def seed(client: httpx.AsyncClient):
+    """A user with plants of 5, 1 and 0 diagnoses, created in that order"""
+    user = (await client.post("/api/users/get-or-create", json={"email": "overview@example.com", "name": "Overview"})).json()
+    plants, diagnoses = [], {}
+    for name, count in (("Lemon", 5), ("Lime", 1), ("Orange", 0)):
+        plant = (await client.post("/api/plants/", json={"name": name, "species": "Citrus", "user_id": user["id"]})).json()
+        plants.append(plant["id"])
+        diagnoses[plant["id"]] = []
+        for n in range(count):
+            response = await client.post("/api/diagnoses/", json={
+                "plant_id": plant["id"], "disease_name": f"canker-{n}", "confidence_score": 0.9,
+                "image_path": f"{name}/{n}.jpg", "is_healthy": n % 2 == 0,
+            })
+            diagnoses[plant["id"]].append(response.json()["id"])
+    return user, plants, diagnoses
+
+async def test_overview(client: httpx.AsyncClient, user, plants, diagnoses):
+    """Plants newest first, each with its newest diagnoses, from three queries"""
+    print("=== TESTING USER OVERVIEW ===")
+    with logged_queries() as queries:
+        response = await client.get(f"/api/users/{user['id']}/overview")
+    assert response.status_code == 200, response.text
+    overview = response.json()
+    assert len(queries) == 3, queries
+    assert {k: overview[k] for k in user} == user
+    assert [plant["id"] for plant in overview["plants"]] == plants[::-1]
+    by_id = {plant["id"]: plant for plant in overview["plants"]}
+    assert [d["id"] for d in by_id[plants[0]]["recent_diagnoses"]] == diagnoses[plants[0]][:-4:-1]
+    assert [d["id"] for d in by_id[plants[1]]["recent_diagnoses"]] == diagnoses[plants[1]]
+    assert by_id[plants[2]]["recent_diagnoses"] == []
+    lemon = by_id[plants[0]]
+    assert set(PlantHealthResponse.model_fields) <= set(lemon)
+    assert lemon["diagnosis_count"] == 5 and lemon["last_disease_name"] == "canker-4" and lemon["last_is_healthy"]
+    assert set(lemon["recent_diagnoses"][0]) == set(DiagnosisResponse.model_fields)
+    print(f"✓ 3 plants newest first with 3, 1 and 0 recent diagnoses and health summaries, in {len(queries)} queries")
+
+async def test_limits(client: httpx.AsyncClient, user, plants, diagnoses):
+    """plant_limit and diagnoses_per_plant bound the response; bad values get 422"""
+    print("\n=== TESTING LIMITS ===")
+    overview = (await client.get(f"/api/users/{user['id']}/overview",
+                                 params={"plant_limit": 2, "diagnoses_per_plant": 5})).json()
+    assert [plant["id"] for plant in overview["plants"]] == plants[:0:-1]
+    assert all(plant["recent_diagnoses"] == [] or len(plant["recent_diagnoses"]) == 1 for plant in overview["plants"])
+    overview = (await client.get(f"/api/users/{user['id']}/overview", params={"diagnoses_per_plant": 0})).json()
+    assert len(overview["plants"]) == 3 and all(plant["recent_diagnoses"] == [] for plant in overview["plants"])
+    lemon = (await client.get(f"/api/users/{user['id']}/overview", params={"diagnoses_per_plant": 50})).json()["plants"][-1]
+    assert [d["id"] for d in lemon["recent_diagnoses"]] == diagnoses[plants[0]][::-1]
+    print("✓ plant_limit=2 keeps the 2 newest plants; diagnoses_per_plant=0 and 50 give none and all")
+
+    assert (await client.get(f"/api/users/{user['id']}/overview", params={"diagnoses_per_plant": 51})).status_code == 422
+    assert (await client.get(f"/api/users/{user['id']}/overview", params={"plant_limit": 0})).status_code == 422
+    assert (await client.get("/api/users/999999/overview")).status_code == 404
+    print("✓ Out-of-range limits get 422; unknown users 404")
+
+async def main():
+    """Run all user overview tests"""
+    print("🧪 Starting User Overview Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            user, plants, diagnoses = await seed(client)
+            await test_overview(client, user, plants, diagnoses)
+            await test_limits(client, user, plants, diagnoses)
+    print("\n" + "=" * 50)
+    print("🎉 ALL USER OVERVIEW TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination tests: cursors round-trip, malformed ones get 400, and
+paging with X-Next-Cursor visits every row exactly once newest first, even
+when rows share a created_at or new rows arrive between pages. Needs
+PostgreSQL at DATABASE_URL.
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+os.environ.setdefault("REDIS_URL", "memory://")
+
+import httpx
+
+from app.core.pagination import decode_cursor, encode_cursor
+from app.main import app, lifespan
+from app.models.diagnosis import Diagnosis
+
+TIE = datetime(2024, 3, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+
+async def walk(client: httpx.AsyncClient, url: str, limit: int, between_pages=None):
+    """Follow X-Next-Cursor from the first page to the last; returns the pages"""
+    pages = []
+    params = {"limit": limit}
+    while True:
+        response = await client.get(url, params=params)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return pages
+        if between_pages is not None:
+            await between_pages()
+        params = {"limit": limit, "cursor": cursor}
+
+def test_cursor_tokens():
+    """Cursors are opaque, URL-safe and round-trip; anything else is refused"""
+    print("=== TESTING CURSOR TOKENS ===")
+    token = encode_cursor(TIE, 42)
+    assert decode_cursor(token) == (TIE, 42) and "=" not in token and "/" not in token
+    for bad in ("", "not-a-cursor", encode_cursor(TIE, 42)[:-3], "WzEsMiwzXQ"):  # the last is [1,2,3]
+        try:
+            decode_cursor(bad)
+            raise AssertionError(f"{bad!r} should be rejected")
+        except ValueError:
+            pass
+    print(f"✓ {token} round-trips to ({TIE.isoformat()}, 42); truncated and foreign tokens raise ValueError")
+
+async def seed(client: httpx.AsyncClient):
+    user = (await client.post("/api/users/get-or-create", json={"email": "pages@example.com", "name": "Pages"})).json()
+    plant = (await client.post("/api/plants/", json={"name": "Oak", "species": "Quercus", "user_id": user["id"]})).json()
+    ids = []
+    for n in range(7):
+        response = await client.post("/api/diagnoses/", json={
+            "plant_id": plant["id"], "disease_name": f"spot-{n}", "confidence_score": 0.5, "image_path": f"{n}.jpg",
+        })
+        ids.append(response.json()["id"])
+    # Five of them share one timestamp, as a bulk insert would produce
+    await Diagnosis.filter(id__in=ids[1:6]).update(created_at=TIE)
+    return user["id"], plant["id"], ids
+
+async def test_keyset_walk(client: httpx.AsyncClient, plant_id: int, ids):
+    """Pages of 3 over 7 rows, 5 of them tied, visit each row once in (created_at, id) order"""
+    print("\n=== TESTING KEYSET PAGES ===")
+    pages = await walk(client, f"/api/diagnoses/plant/{plant_id}", 3)
+    assert [len(page) for page in pages] == [3, 3, 1], [len(page) for page in pages]
+    seen = [row["id"] for page in pages for row in page]
+    rows = await Diagnosis.filter(plant_id=plant_id).values("id", "created_at")
+    expected = [row["id"] for row in sorted(rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)]
+    assert seen == expected and sorted(seen) == sorted(ids), (seen, expected)
+    print(f"✓ 3 + 3 + 1 rows, no cursor after the last page, tied rows ordered by id: {seen}")
+
+    pages = await walk(client, f"/api/diagnoses/plant/{plant_id}", 7)
+    assert [len(page) for page in pages] == [7, 0]
+    print("✓ A full last page gets a cursor whose page is empty")
+
+async def test_inserts_while_paging(client: httpx.AsyncClient, plant_id: int, ids):
+    """Rows created between pages do not shift the pages after them"""
+    print("\n=== TESTING INSERTS BETWEEN PAGES ===")
+
+    async def insert():
+        await client.post("/api/diagnoses/", json={
+            "plant_id": plant_id, "disease_name": "late", "confidence_score": 0.5, "image_path": "late.jpg",
+        })
+
+    pages = await walk(client, f"/api/diagnoses/plant/{plant_id}", 3, between_pages=insert)
+    seen = [row["id"] for page in pages for row in page]
+    assert len(seen) == len(set(seen)) == len(ids) and set(seen) == set(ids)
+    skipped = await client.get(f"/api/diagnoses/plant/{plant_id}", params={"skip": 3, "limit": 3})
+    assert [row["id"] for row in skipped.json()] != seen[3:6], "offset paging shifts after inserts"
+    print(f"✓ {len(pages) - 1} inserts while paging: cursors still saw the original {len(ids)} rows once each")
+
+async def test_bad_cursor_and_other_lists(client: httpx.AsyncClient, user_id: int):
+    """Malformed cursors get 400 on every list; users and plants page the same way"""
+    print("\n=== TESTING OTHER LISTS ===")
+    for url in ("/api/users/", "/api/plants/", "/api/diagnoses/", f"/api/diagnoses/user/{user_id}",
+                f"/api/plants/user/{user_id}"):
+        response = await client.get(url, params={"cursor": "garbage!"})
+        assert response.status_code == 400 and response.json()["detail"] == "Invalid pagination cursor", url
+    for n in range(4):
+        await client.post("/api/users/", json={"email": f"page{n}@example.com", "name": f"Page {n}"})
+    users = [row["id"] for page in await walk(client, "/api/users/", 2) for row in page]
+    assert users == sorted(users, reverse=True) and len(users) == 5
+    diagnoses = [row["id"] for page in await walk(client, f"/api/diagnoses/user/{user_id}", 4) for row in page]
+    assert len(diagnoses) == len(set(diagnoses)) == await Diagnosis.all().count()
+    print("✓ Bad cursors get 400 everywhere; users and per-user diagnoses page without gaps or repeats")
+
+async def main():
+    """Run all keyset pagination tests"""
+    print("🧪 Starting Keyset Pagination Tests")
+    print("=" * 50)
+    test_cursor_tokens()
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            user_id, plant_id, ids = await seed(client)
+            await test_keyset_walk(client, plant_id, ids)
+            await test_inserts_while_paging(client, plant_id, ids)
+            await test_bad_cursor_and_other_lists(client, user_id)
+    print("\n" + "=" * 50)
+    print("🎉 ALL KEYSET PAGINATION TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
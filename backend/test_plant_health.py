@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Plant health summary tests: the summary folded in by each create matches
+the one recomputed from the diagnoses (PlantHealthService.refresh and
+rebuild_plant_health.py), including when concurrent creates commit out of
+created_at order. Needs PostgreSQL at DATABASE_URL.
+"""
+import asyncio
+import math
+import os
+import subprocess
+import sys
+from datetime import timedelta
+os.environ.setdefault("REDIS_URL", "memory://")
+
+import httpx
+from tortoise.transactions import in_transaction
+
+from app.main import app, lifespan
+from app.models.diagnosis import Diagnosis
+from app.models.plant import Plant
+from app.services.plant_health_service import PlantHealthService
+
+SUMMARY_FIELDS = ("diagnosis_count", "health_score", "last_diagnosis_at", "last_disease_name",
+                  "last_confidence_score", "last_is_healthy")
+
+async def summary(plant_id: int) -> dict:
+    return (await Plant.filter(id=plant_id).values(*SUMMARY_FIELDS))[0]
+
+def assert_same(recorded: dict, rebuilt: dict) -> None:
+    for field in SUMMARY_FIELDS:
+        if field == "health_score":
+            assert math.isclose(recorded[field], rebuilt[field], abs_tol=1e-9), (recorded, rebuilt)
+        else:
+            assert recorded[field] == rebuilt[field], (field, recorded, rebuilt)
+
+async def create(client: httpx.AsyncClient, plant_id: int, n: int, healthy: bool) -> dict:
+    response = await client.post("/api/diagnoses/", json={
+        "plant_id": plant_id, "disease_name": "healthy" if healthy else f"blight-{n}",
+        "confidence_score": 0.5 + n % 5 / 10, "image_path": f"health/{n}.jpg", "is_healthy": healthy,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+async def seed(client: httpx.AsyncClient):
+    user = (await client.post("/api/users/get-or-create", json={"email": "health@example.com", "name": "Health"})).json()
+    plants = []
+    for name in ("Rose", "Tulip"):
+        plant = await client.post("/api/plants/", json={"name": name, "species": name, "user_id": user["id"]})
+        plants.append(plant.json()["id"])
+    return user["id"], plants
+
+async def test_record_matches_refresh(client: httpx.AsyncClient, rose: int):
+    """Creates one by one and concurrently fold into the same summary refresh computes"""
+    print("=== TESTING RECORD AGAINST REFRESH ===")
+    for n in range(6):
+        await create(client, rose, n, healthy=n % 3 != 0)
+    await asyncio.gather(*(create(client, rose, n, healthy=n % 2 == 0) for n in range(6, 16)))
+    recorded = await summary(rose)
+    newest = await Diagnosis.filter(plant_id=rose).order_by("-created_at", "-id").first()
+    assert recorded["diagnosis_count"] == 16 and recorded["last_diagnosis_at"] == newest.created_at
+    assert recorded["last_disease_name"] == newest.disease_name
+    await PlantHealthService.refresh([rose])
+    assert_same(recorded, await summary(rose))
+    print(f"✓ 6 sequential and 10 concurrent creates: score {recorded['health_score']:.4f}, "
+          f"last {recorded['last_disease_name']}, same as refresh")
+
+async def test_out_of_order_commit(client: httpx.AsyncClient, tulip: int):
+    """A diagnosis committed after a newer one does not become the plant's latest"""
+    print("\n=== TESTING OUT-OF-ORDER COMMITS ===")
+    newer = await create(client, tulip, 1, healthy=True)
+    # What a create racing the one above sees when it commits second: its row
+    # is older than the summary's latest
+    async with in_transaction() as conn:
+        older = await Diagnosis.create(plant_id=tulip, disease_name="rust", confidence_score=0.9,
+                                       image_path="health/old.jpg", using_db=conn)
+        older.created_at -= timedelta(seconds=5)
+        await Diagnosis.filter(id=older.id).using_db(conn).update(created_at=older.created_at)
+        await PlantHealthService.record(conn, older)
+    recorded = await summary(tulip)
+    assert recorded["last_disease_name"] == "healthy" and recorded["last_is_healthy"], recorded
+    assert recorded["diagnosis_count"] == 2
+    assert recorded["last_diagnosis_at"].isoformat() == newer["created_at"].replace("Z", "+00:00")
+    await PlantHealthService.refresh([tulip])
+    assert_same(recorded, await summary(tulip))
+    print("✓ The older diagnosis is counted and scored in order; the newer one stays latest")
+
+async def test_rebuild_script(user_id: int, plants):
+    """rebuild_plant_health.py leaves the recorded summaries unchanged"""
+    print("\n=== TESTING REBUILD SCRIPT ===")
+    before = [await summary(plant_id) for plant_id in plants]
+    await Plant.filter(id__in=plants).update(diagnosis_count=0, health_score=None, last_diagnosis_at=None)
+    result = await asyncio.to_thread(subprocess.run, [sys.executable, "rebuild_plant_health.py", "--user-id", str(user_id)],
+                                     capture_output=True, text=True)
+    assert result.returncode == 0 and "Rebuilt health summary for 2 plants" in result.stdout, result.stdout + result.stderr
+    for plant_id, recorded in zip(plants, before):
+        assert_same(recorded, await summary(plant_id))
+    print("✓ Clearing and rebuilding the summaries reproduces the recorded ones")
+
+async def main():
+    """Run all plant health summary tests"""
+    print("🧪 Starting Plant Health Summary Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            user_id, (rose, tulip) = await seed(client)
+            await test_record_matches_refresh(client, rose)
+            await test_out_of_order_commit(client, tulip)
+            await test_rebuild_script(user_id, [rose, tulip])
+    print("\n" + "=" * 50)
+    print("🎉 ALL PLANT HEALTH SUMMARY TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
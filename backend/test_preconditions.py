@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+If-Match tests: GET returns the row version as an ETag, PUT and DELETE
+with a matching ETag succeed, a stale one gets 412 while an unknown id
+still gets 404, "*" matches any existing row and weak tags never match.
+Deleting a user also drops its cascaded plants from the cache. Needs
+PostgreSQL at DATABASE_URL.
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+os.environ.setdefault("REDIS_URL", "memory://")
+
+import httpx
+
+from app.core.preconditions import etag_for, parse_if_match
+from app.main import app, lifespan
+
+MISSING_ID = 999999
+
+def test_parse_if_match():
+    """ETags round-trip to updated_at; "*" and absence mean no precondition"""
+    print("=== TESTING IF-MATCH PARSING ===")
+    version = datetime(2024, 5, 17, 8, 30, 12, 345678, tzinfo=timezone.utc)
+    assert parse_if_match(etag_for(version)) == [version]
+    assert parse_if_match(None) is None and parse_if_match(" * ") is None
+    assert parse_if_match(f'W/{etag_for(version)}') == [] and parse_if_match('"v2", xyz') == []
+    assert parse_if_match(f'"1", W/"2", {etag_for(version)}') == [datetime(1970, 1, 1, 0, 0, 0, 1, tzinfo=timezone.utc), version]
+    print("✓ Tags round-trip to microseconds; weak and foreign tags are dropped; * means any")
+
+async def test_updates(client: httpx.AsyncClient):
+    """PUT applies with a current ETag, 412 with a stale one, 404 for unknown ids"""
+    print("\n=== TESTING CONDITIONAL UPDATES ===")
+    user = (await client.post("/api/users/", json={"email": "ifmatch@example.com", "name": "If Match"})).json()
+    url = f"/api/users/{user['id']}"
+    etag = (await client.get(url)).headers["etag"]
+    response = await client.put(url, json={"name": "Renamed"}, headers={"If-Match": etag})
+    assert response.status_code == 200 and response.json()["name"] == "Renamed", response.text
+    new_etag = response.headers["etag"]
+    assert new_etag != etag and (await client.get(url)).headers["etag"] == new_etag
+    print(f"✓ Matching If-Match updates; the ETag moves from {etag} to {new_etag}")
+
+    response = await client.put(url, json={"name": "Lost update"}, headers={"If-Match": etag})
+    assert response.status_code == 412, response.text
+    assert (await client.get(url)).json()["name"] == "Renamed"
+    response = await client.put(url, json={"name": "Weak"}, headers={"If-Match": f"W/{new_etag}"})
+    assert response.status_code == 412
+    response = await client.put(f"/api/users/{MISSING_ID}", json={"name": "Nobody"}, headers={"If-Match": etag})
+    assert response.status_code == 404, response.text
+    print("✓ Stale and weak tags get 412 and change nothing; an unknown id is 404, not 412")
+
+    response = await client.put(url, json={"name": "Either"}, headers={"If-Match": f'"1", {new_etag}'})
+    assert response.status_code == 200
+    response = await client.put(url, json={"name": "Any"}, headers={"If-Match": "*"})
+    assert response.status_code == 200 and response.json()["name"] == "Any"
+    assert (await client.put(f"/api/users/{MISSING_ID}", json={"name": "x"}, headers={"If-Match": "*"})).status_code == 404
+    print("✓ Any matching tag in a list applies; * applies to any existing row")
+
+    current = (await client.get(url)).headers["etag"]
+    response = await client.put(url, json={}, headers={"If-Match": current})
+    assert response.status_code == 200 and response.headers["etag"] == current and response.json()["name"] == "Any"
+    assert (await client.put(url, json={}, headers={"If-Match": etag})).status_code == 412
+    assert (await client.put(f"/api/users/{MISSING_ID}", json={}, headers={"If-Match": current})).status_code == 404
+    print("✓ An empty update only checks the precondition: 200 with the same ETag, 412, 404")
+    return user["id"]
+
+async def test_diagnosis_update(client: httpx.AsyncClient, user_id: int):
+    """Diagnosis edits that refresh the plant summary honour If-Match too"""
+    print("\n=== TESTING CONDITIONAL DIAGNOSIS UPDATES ===")
+    plant = (await client.post("/api/plants/", json={"name": "Ivy", "species": "Hedera", "user_id": user_id})).json()
+    diagnosis = (await client.post("/api/diagnoses/", json={
+        "plant_id": plant["id"], "disease_name": "mildew", "confidence_score": 0.8, "image_path": "ivy.jpg",
+    })).json()
+    url = f"/api/diagnoses/{diagnosis['id']}"
+    etag = (await client.get(url)).headers["etag"]
+    assert (await client.put(url, json={"is_healthy": True}, headers={"If-Match": etag})).status_code == 200
+    assert (await client.put(url, json={"is_healthy": False}, headers={"If-Match": etag})).status_code == 412
+    health = (await client.get(f"/api/plants/user/{user_id}/health")).json()
+    assert health[0]["last_is_healthy"] is True, health
+    print("✓ The stale edit is refused and leaves the health summary alone")
+
+async def test_deletes(client: httpx.AsyncClient, user_id: int):
+    """DELETE follows the same rules; deleting a user evicts its plants from the cache"""
+    print("\n=== TESTING CONDITIONAL DELETES ===")
+    url = f"/api/users/{user_id}"
+    stale = '"1"'
+    assert (await client.delete(url, headers={"If-Match": stale})).status_code == 412
+    assert (await client.get(url)).status_code == 200
+    assert (await client.delete(f"/api/users/{MISSING_ID}", headers={"If-Match": stale})).status_code == 404
+    print("✓ A stale DELETE gets 412 and keeps the row; an unknown id is 404")
+
+    plants = []
+    for name in ("Fern", "Moss"):
+        plant = (await client.post("/api/plants/", json={"name": name, "species": name, "user_id": user_id})).json()
+        assert (await client.get(f"/api/plants/{plant['id']}")).status_code == 200  # now cached
+        plants.append(plant["id"])
+    etag = (await client.get(url)).headers["etag"]
+    response = await client.delete(url, headers={"If-Match": etag})
+    assert response.status_code == 200, response.text
+    assert (await client.get(url)).status_code == 404
+    for plant_id in plants:
+        assert (await client.get(f"/api/plants/{plant_id}")).status_code == 404
+    assert (await client.delete(url, headers={"If-Match": etag})).status_code == 404
+    print("✓ A matching DELETE removes the user; its cached plants are gone with it")
+
+async def main():
+    """Run all If-Match tests"""
+    print("🧪 Starting If-Match Tests")
+    print("=" * 50)
+    test_parse_if_match()
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            user_id = await test_updates(client)
+            await test_diagnosis_update(client, user_id)
+            await test_deletes(client, user_id)
+    print("\n" + "=" * 50)
+    print("🎉 ALL IF-MATCH TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
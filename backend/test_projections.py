@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+List projection tests: list service methods return plain dicts with
+exactly the columns their response schema serializes, each page is one
+SELECT with no prefetch queries, and list and single-row endpoints agree on
+every field. Needs PostgreSQL at DATABASE_URL.
+"""
+import asyncio
+import logging
+import os
+from contextlib import contextmanager
+os.environ.setdefault("REDIS_URL", "memory://")
+
+import httpx
+
+from app.main import app, lifespan
+from app.schemas.diagnosis import DiagnosisResponse
+from app.schemas.plant import PlantHealthResponse, PlantResponse
+from app.schemas.user import UserResponse
+from app.services.diagnosis_service import DiagnosisService
+from app.services.plant_service import PlantService
+from app.services.user_service import UserService
+
+class QueryLog(logging.Handler):
+    """Collects the SQL Tortoise sends, from its debug log"""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.queries = []
+
+    def emit(self, record):
+        self.queries.append(str(record.args[0]) if record.args else record.getMessage())
+
+@contextmanager
+def logged_queries():
+    logger = logging.getLogger("tortoise.db_client")
+    log, level = QueryLog(), logger.level
+    logger.addHandler(log)
+    logger.setLevel(logging.DEBUG)
+    try:
+        yield log.queries
+    finally:
+        logger.removeHandler(log)
+        logger.setLevel(level)
+
+async def seed(client: httpx.AsyncClient):
+    user = (await client.post("/api/users/get-or-create", json={"email": "shape@example.com", "name": "Shape"})).json()
+    plants = []
+    for name in ("Cactus", "Aloe"):
+        plant = await client.post("/api/plants/", json={"name": name, "species": name, "user_id": user["id"],
+                                                        "description": f"A {name.lower()}"})
+        plants.append(plant.json()["id"])
+        for n in range(3):
+            await client.post("/api/diagnoses/", json={
+                "plant_id": plants[-1], "disease_name": "rot", "confidence_score": 0.25 * n, "image_path": f"{n}.jpg",
+                "notes": "watered" if n else None, "is_healthy": n == 2,
+            })
+    return user["id"], plants
+
+async def test_service_shapes(user_id: int, plants):
+    """Each list method returns dicts keyed by exactly its schema's fields, in one query"""
+    print("=== TESTING LIST SHAPES ===")
+    cases = [
+        ("users", UserService.get_all_users(), UserResponse, 1),
+        ("plants", PlantService.get_all_plants(), PlantResponse, 2),
+        ("plants by user", PlantService.get_plants_by_user(user_id), PlantResponse, 2),
+        ("plant health", PlantService.get_plant_health_by_user(user_id), PlantHealthResponse, 2),
+        ("diagnoses", DiagnosisService.get_all_diagnoses(), DiagnosisResponse, 6),
+        ("diagnoses by plant", DiagnosisService.get_diagnoses_by_plant(plants[0]), DiagnosisResponse, 3),
+        ("diagnoses by user", DiagnosisService.get_diagnoses_by_user(user_id), DiagnosisResponse, 6),
+    ]
+    for name, call, schema, expected in cases:
+        with logged_queries() as queries:
+            rows = await call
+        assert len(rows) == expected, (name, rows)
+        assert all(type(row) is dict and list(row) == list(schema.model_fields) for row in rows), (name, rows[0])
+        assert len(queries) == 1 and queries[0].lstrip().upper().startswith("SELECT"), (name, queries)
+        for field in schema.model_fields:
+            assert f'"{field}"' in queries[0], (name, field, queries[0])
+        print(f"✓ {name}: {expected} dicts with {len(schema.model_fields)} columns from 1 SELECT")
+
+async def test_list_matches_detail(client: httpx.AsyncClient, user_id: int, plants):
+    """List rows serialize exactly like the same row fetched on its own"""
+    print("\n=== TESTING LIST AND DETAIL AGREE ===")
+    for list_url, detail_url in ((f"/api/diagnoses/plant/{plants[0]}", "/api/diagnoses/{id}"),
+                                 (f"/api/plants/user/{user_id}", "/api/plants/{id}"),
+                                 ("/api/users/", "/api/users/{id}")):
+        rows = (await client.get(list_url)).json()
+        for row in rows:
+            assert row == (await client.get(detail_url.format(id=row["id"]))).json(), (list_url, row)
+    health = (await client.get(f"/api/plants/user/{user_id}/health")).json()
+    assert {row["id"]: row["diagnosis_count"] for row in health} == {plants[0]: 3, plants[1]: 3}
+    print("✓ Diagnoses, plants and users: every list row equals its detail response")
+
+async def main():
+    """Run all list projection tests"""
+    print("🧪 Starting List Projection Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            user_id, plants = await seed(client)
+            await test_service_shapes(user_id, plants)
+            await test_list_matches_detail(client, user_id, plants)
+    print("\n" + "=" * 50)
+    print("🎉 ALL LIST PROJECTION TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Read-replica routing tests with two local databases standing in for primary
+and replica (no replication between them, so every read shows where it went):
+
+    DATABASE_URL=postgres://.../plant_primary DATABASE_REPLICA_URL=postgres://.../plant_replica \\
+        python test_replica_routing.py
+"""
+import asyncio
+import os
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ.setdefault("REPLICA_PIN_SECONDS", "0.5")
+
+import httpx
+from tortoise import connections
+
+from app.core.config import settings
+from app.core.metrics import metrics_response
+from app.main import app, lifespan
+from test_query_plans import apply_migrations
+
+def route_count(target, reason):
+    """Current value of the read routing counter for target and reason"""
+    for line in metrics_response().body.decode().splitlines():
+        if line.startswith(f'plantify_db_read_routes_total{{reason="{reason}",target="{target}"}}'):
+            return float(line.split()[-1])
+    return 0.0
+
+async def setup_replica():
+    """Give the replica the schema and a copy of the primary's users, renamed"""
+    await apply_migrations("replica")
+    replica = connections.get("replica")
+    await replica.execute_script("TRUNCATE users, plants, diagnoses RESTART IDENTITY CASCADE")
+
+async def copy_users_to_replica():
+    rows = await connections.get("default").execute_query_dict("SELECT * FROM users")
+    for row in rows:
+        await connections.get("replica").execute_query(
+            "INSERT INTO users (id, email, name, created_at, updated_at) VALUES ($1, $2, $3, $4, $5) "
+            "ON CONFLICT (id) DO NOTHING",
+            [row["id"], row["email"], "replica copy", row["created_at"], row["updated_at"]],
+        )
+
+async def test_reads_go_to_replica(client):
+    """A session that has not written reads list endpoints from the replica"""
+    print("=== TESTING REPLICA READS ===")
+    before = route_count("replica", "read")
+    response = await client.get("/api/users/")
+    assert [u["name"] for u in response.json()] == ["replica copy"], response.json()
+    assert route_count("replica", "read") > before
+    print("✓ Fresh session reads /users/ from the replica")
+
+async def test_read_your_writes(client):
+    """After a write, the session is pinned to the primary until the window passes"""
+    print("\n=== TESTING READ-YOUR-WRITES ===")
+    response = await client.post("/api/users/", json={"email": "writer@example.com", "name": "Writer"})
+    assert response.status_code == 200, response.text
+    assert settings.REPLICA_PIN_COOKIE in response.cookies
+    user_id = response.json()["id"]
+    
+    before = route_count("primary", "pinned_session")
+    names = [u["name"] for u in (await client.get("/api/users/")).json()]
+    assert "Writer" in names, names
+    assert route_count("primary", "pinned_session") > before
+    print("✓ Pinned session sees its own write on the primary")
+    
+    plant = await client.post("/api/plants/", json={"name": "Fern", "species": "fern", "user_id": user_id})
+    assert plant.status_code == 200, "writes must check the user on the primary"
+    print("✓ Write requests read from the primary (user only exists there)")
+    
+    await asyncio.sleep(settings.REPLICA_PIN_SECONDS + 0.1)
+    client.cookies.clear()
+    names = [u["name"] for u in (await client.get("/api/users/")).json()]
+    assert "Writer" not in names, names
+    print("✓ After the pin window, reads return to the replica")
+
+async def test_cache_fills_from_primary(client):
+    """Cached by-id reads are filled from the primary so replica lag is never cached"""
+    print("\n=== TESTING CACHE FILLS ===")
+    user = (await connections.get("default").execute_query_dict("SELECT id, name FROM users LIMIT 1"))[0]
+    response = await client.get(f"/api/users/{user['id']}")
+    assert response.json()["name"] == user["name"], response.json()
+    print("✓ get_user_by_id served the primary's row")
+
+async def main():
+    """Run all replica routing tests"""
+    assert settings.DATABASE_REPLICA_URL, "set DATABASE_REPLICA_URL to a second database"
+    print("🧪 Starting Replica Routing Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        await setup_replica()
+        await connections.get("default").execute_script("TRUNCATE users, plants, diagnoses RESTART IDENTITY CASCADE")
+        await connections.get("default").execute_query(
+            "INSERT INTO users (email, name, created_at, updated_at) VALUES ('seed@example.com', 'primary row', now(), now())"
+        )
+        await copy_users_to_replica()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await test_reads_go_to_replica(client)
+            await test_read_your_writes(client)
+            await test_cache_fills_from_primary(client)
+    print("\n" + "=" * 50)
+    print("🎉 ALL REPLICA ROUTING TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
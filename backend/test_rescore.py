@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Re-scoring job tests: stored diagnoses are re-diagnosed in batches and
+tagged with the model version, unreadable images are skipped, plant health
+follows the new verdicts, and a run that crashes resumes from its
+checkpoint without redoing committed batches. Runs scoped to a user of its
+own, so other rows in the database are left alone. Needs PostgreSQL at
+DATABASE_URL; uses a temporary UPLOAD_DIR.
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import uuid
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="plantify_rescore_")
+
+import httpx
+
+from app.core.config import settings
+from app.main import app, lifespan
+from app.models.diagnosis import Diagnosis
+from app.models.plant import Plant
+from app.services.preprocessing import ImagePreprocessor
+from rescore_diagnoses import rescore
+from test_inference import StandInModel, png
+
+CHECKPOINT = os.path.join(settings.UPLOAD_DIR, "rescore.checkpoint.json")
+
+class CrashingModel(StandInModel):
+    """Fails on its nth batch, like a job killed halfway"""
+
+    def __init__(self, crash_on: int):
+        super().__init__(delay=0)
+        self.crash_on = crash_on
+
+    def predict(self, batch):
+        if len(self.batch_sizes) + 1 == self.crash_on:
+            raise RuntimeError("killed")
+        return super().predict(batch)
+
+async def seed(client: httpx.AsyncClient):
+    """A new user's plant with 22 diagnoses of green and red leaves (every 7th image missing), all unscored"""
+    email = f"rescore-{uuid.uuid4().hex[:8]}@example.com"
+    user = (await client.post("/api/users/get-or-create", json={"email": email, "name": "Rescore"})).json()
+    plant = (await client.post("/api/plants/", json={"name": "Basil", "species": "Ocimum", "user_id": user["id"]})).json()
+    keys = {}
+    for name, color in (("green", (20, 200, 30)), ("red", (200, 40, 30))):
+        keys[name] = (await client.post("/upload", content=png(color), headers={"Content-Type": "image/png"})).json()["image_path"]
+    diagnoses = [{"plant_id": plant["id"], "disease_name": "unknown", "confidence_score": 0.5,
+                  "image_path": "missing/leaf.png" if i % 7 == 3 else keys["green" if i % 2 else "red"]}
+                 for i in range(22)]
+    response = await client.post("/api/diagnoses/bulk", json=diagnoses)
+    assert response.json()["created"] == 22, response.text
+    return user["id"], plant["id"]
+
+async def test_crash_and_resume(user_id: int, plant_id: int):
+    """A crash keeps committed batches; the next run continues after the checkpoint"""
+    print("=== TESTING CRASH AND RESUME ===")
+    preprocessor = ImagePreprocessor(2, settings.PREPROCESS_MAX_PIXELS)
+    preprocessor.start()
+    lines = []
+    try:
+        crashing = CrashingModel(crash_on=3)
+        try:
+            await rescore(crashing, preprocessor, CHECKPOINT, batch_size=4, prefetch=6, page_size=5, report=lines.append,
+                          user_id=user_id)
+            raise AssertionError("the run should have crashed")
+        except RuntimeError:
+            pass
+        scored = await Diagnosis.filter(plant_id=plant_id, model_version=StandInModel.version) \
+            .order_by("id").values_list("id", flat=True)
+        assert len(scored) == 8, scored
+        with open(CHECKPOINT) as handle:
+            saved = json.load(handle)
+        assert saved["last_id"] >= scored[-1] and saved["rescored"] == 8, saved
+        print(f"✓ Crash on the 3rd batch kept the first 2 batches ({len(scored)} rows) and their checkpoint")
+        assert any("⚠️  skipped diagnosis" in line for line in lines) and any("img/s, ETA" in line for line in lines)
+
+        model = StandInModel(delay=0)
+        lines.clear()
+        checkpoint = await rescore(model, preprocessor, CHECKPOINT, batch_size=4, prefetch=6, page_size=5,
+                                   report=lines.append, user_id=user_id)
+        assert lines[0].endswith(f"(after id {saved['last_id']})"), lines[0]
+        assert max(model.batch_sizes) == 4 and sum(model.batch_sizes) == 22 - 3 - 8, model.batch_sizes
+        assert checkpoint["rescored"] == 19 and checkpoint["skipped"] == 3, checkpoint
+        print(f"✓ Resumed from the checkpoint: {sum(model.batch_sizes)} more images in batches of {model.batch_sizes}")
+        print(f"  {lines[-2].strip()}")
+    finally:
+        preprocessor.stop()
+
+async def test_results(user_id: int, plant_id: int):
+    """Verdicts, version tags and the health summary reflect the new model"""
+    print("\n=== TESTING RE-SCORED ROWS ===")
+    rows = await Diagnosis.filter(plant_id=plant_id).order_by("id").values("image_path", "disease_name", "model_version")
+    for row in rows:
+        if row["image_path"].startswith("missing/"):
+            assert row["disease_name"] == "unknown" and row["model_version"] is None, row
+        else:
+            assert row["model_version"] == StandInModel.version, row
+    assert {row["disease_name"] for row in rows} == {"healthy", "leaf_spot", "unknown"}
+    print("✓ Every readable image has the new verdict and model version; missing ones are untouched")
+    plant = await Plant.get(id=plant_id)
+    assert plant.last_disease_name == rows[-1]["disease_name"] == "healthy", plant.last_disease_name
+    print("✓ Plant health summary refreshed from the new verdicts")
+
+    lines = []
+    preprocessor = ImagePreprocessor(0, settings.PREPROCESS_MAX_PIXELS)
+    checkpoint = await rescore(StandInModel(delay=0), preprocessor, CHECKPOINT, 4, 6, 5, report=lines.append,
+                               user_id=user_id)
+    assert checkpoint["rescored"] == 19 and lines[0].startswith("🔁 Re-scoring 0 diagnoses"), lines
+    newer = StandInModel(delay=0)
+    newer.version = "stand-in-2"
+    checkpoint = await rescore(newer, preprocessor, CHECKPOINT, 8, 16, 100, report=lines.append, user_id=user_id)
+    assert checkpoint["rescored"] == 19 and sum(newer.batch_sizes) == 19, checkpoint
+    print("✓ Finished runs are no-ops; a new model version re-scores everything")
+
+    lines.clear()
+    checkpoint = await rescore(newer, preprocessor, CHECKPOINT, 8, 16, 100, report=lines.append, user_id=user_id + 1)
+    assert "is for user" in lines[0] and checkpoint["user_id"] == user_id + 1, lines
+    print("✓ A checkpoint from a run scoped to another user is not resumed")
+
+async def main():
+    """Run all re-scoring job tests"""
+    print("🧪 Starting Re-scoring Job Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            user_id, plant_id = await seed(client)
+        await test_crash_and_resume(user_id, plant_id)
+        await test_results(user_id, plant_id)
+    shutil.rmtree(settings.UPLOAD_DIR)
+    print("\n" + "=" * 50)
+    print("🎉 ALL RE-SCORING JOB TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
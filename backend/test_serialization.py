@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Response serialization tests: render() validates ORM objects and row dicts
+once and produces the same JSON FastAPI's response_model path would, drops
+columns the schema does not declare, refuses rows that do not fit, reuses
+its adapters and keeps the OpenAPI schema. No database needed.
+"""
+import json
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import List
+os.environ.setdefault("REDIS_URL", "memory://")
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+
+from app.core.serialization import get_adapter, render
+from app.main import app
+from app.schemas.diagnosis import DiagnosisResponse
+from app.schemas.plant import PlantHealthResponse
+
+NOW = datetime(2024, 6, 1, 9, 15, 30, 250000, tzinfo=timezone.utc)
+
+def diagnosis_row(n: int) -> dict:
+    return {"id": n, "plant_id": 7, "disease_name": "blight", "confidence_score": 0.875, "image_path": f"{n}.jpg",
+            "notes": None, "is_healthy": False, "model_version": "leaf-v2", "created_at": NOW}
+
+def expected_json(schema, content):
+    """What FastAPI sends for a response_model: validate, then jsonable_encoder"""
+    if isinstance(content, list):
+        return [jsonable_encoder(schema.model_validate(item, from_attributes=True)) for item in content]
+    return jsonable_encoder(schema.model_validate(content, from_attributes=True))
+
+def test_same_json():
+    """Dicts, ORM-style objects and lists render like the response_model path"""
+    print("=== TESTING RENDERED JSON ===")
+    rows = [diagnosis_row(n) for n in range(3)]
+    response = render(List[DiagnosisResponse], rows)
+    assert response.status_code == 200 and response.media_type == "application/json"
+    assert json.loads(response.body) == expected_json(DiagnosisResponse, rows)
+    assert b'"created_at":"2024-06-01T09:15:30.250000Z"' in response.body
+    orm_row = SimpleNamespace(**diagnosis_row(9), plant=object())  # attribute access, like a Tortoise model
+    assert json.loads(render(DiagnosisResponse, orm_row).body) == expected_json(DiagnosisResponse, orm_row)
+    print(f"✓ Row dicts, attribute objects and lists match jsonable_encoder output ({len(response.body)} bytes)")
+
+    plant = {"id": 3, "user_id": 1, "name": "Fig", "species": "Ficus", "description": None, "created_at": NOW,
+             "updated_at": NOW, "diagnosis_count": 0, "internal_note": "not for clients"}
+    response = render(PlantHealthResponse, plant, status_code=201, headers={"X-Total-Count": "1"})
+    body = json.loads(response.body)
+    assert response.status_code == 201 and response.headers["x-total-count"] == "1"
+    assert "internal_note" not in body and body["health_score"] is None and body["last_is_healthy"] is None
+    print("✓ Undeclared columns are dropped, optional ones default; status and headers pass through")
+
+def test_invalid_rows():
+    """A row missing a required field is an error, not a partial response"""
+    print("\n=== TESTING INVALID ROWS ===")
+    row = diagnosis_row(1)
+    del row["disease_name"]
+    try:
+        render(DiagnosisResponse, row)
+        raise AssertionError("a row without disease_name should not render")
+    except ValidationError as exc:
+        assert exc.errors()[0]["loc"] == ("disease_name",)
+    print("✓ Missing fields raise ValidationError")
+
+def test_adapters_and_openapi():
+    """Adapters are built once per type; routes still document their response models"""
+    print("\n=== TESTING ADAPTER CACHE AND OPENAPI ===")
+    assert get_adapter(List[DiagnosisResponse]) is get_adapter(List[DiagnosisResponse])
+    assert get_adapter(DiagnosisResponse) is not get_adapter(List[DiagnosisResponse])
+    schema = app.openapi()["paths"]["/api/diagnoses/{diagnosis_id}"]["get"]["responses"]["200"]
+    assert schema["content"]["application/json"]["schema"]["$ref"].endswith("/DiagnosisResponse"), schema
+    listed = app.openapi()["paths"]["/api/diagnoses/"]["get"]["responses"]["200"]["content"]["application/json"]
+    assert listed["schema"]["items"]["$ref"].endswith("/DiagnosisResponse"), listed
+    print("✓ One adapter per response type; OpenAPI still names DiagnosisResponse")
+
+def main():
+    """Run all serialization tests"""
+    print("🧪 Starting Serialization Tests")
+    print("=" * 50)
+    test_same_json()
+    test_invalid_rows()
+    test_adapters_and_openapi()
+    print("\n" + "=" * 50)
+    print("🎉 ALL SERIALIZATION TESTS PASSED!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+TFLite runtime tests: converted float16 and int8 models load through
+MODEL_PATH, agree with the Keras model they came from, quantize inputs and
+outputs correctly, and run any batch size on a dynamic batch dimension.
+Needs no database; converts a tiny Keras model in a temporary directory.
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="plantify_tflite_")
+os.environ.setdefault("PREPROCESS_WORKERS", "0")
+os.environ["MODEL_PATH"] = os.path.join(os.environ["UPLOAD_DIR"], "models", "leaf_int8.tflite")
+os.environ["TFLITE_THREADS"] = "2"
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.storage import storage
+from app.services.diagnosis_engine import (
+    KerasDiseaseModel, TFLiteDiseaseModel, diagnosis_engine, load_configured_model, open_model,
+)
+from bench_inference import convert_tflite
+from test_inference import png
+
+MODELS_DIR = os.path.dirname(settings.MODEL_PATH)
+LABELS = ["healthy", "leaf_spot"]
+
+def build_models():
+    """A small CNN that tells green leaves from red ones, saved as Keras, float16 and int8"""
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(0)
+    inputs = tf.keras.Input((32, 32, 3))
+    features = tf.keras.layers.Conv2D(8, 3, activation="relu")(inputs)
+    features = tf.keras.layers.GlobalAveragePooling2D()(features)
+    outputs = tf.keras.layers.Dense(2, activation="softmax")(features)
+    model = tf.keras.Model(inputs, outputs)
+    rng = np.random.default_rng(0)
+    colors = rng.random((256, 3), dtype=np.float32)
+    x = np.clip(colors[:, None, None, :] + rng.normal(0, 0.05, (256, 32, 32, 3)), 0, 1).astype(np.float32)
+    y = (colors[:, 0] > colors[:, 1]).astype(np.int64)  # redder than green: leaf_spot
+    model.compile("adam", "sparse_categorical_crossentropy")
+    model.fit(x, y, epochs=30, batch_size=32, verbose=0)
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    with open(os.path.join(MODELS_DIR, "labels.txt"), "w") as handle:
+        handle.write("\n".join(LABELS))
+    keras_path = os.path.join(MODELS_DIR, "leaf.keras")
+    model.save(keras_path)
+    for quantization in ("float16", "int8"):
+        with open(os.path.join(MODELS_DIR, f"leaf_{quantization}.tflite"), "wb") as handle:
+            handle.write(convert_tflite(keras_path, quantization, (x[:64] * 255).astype(np.uint8)))
+    return keras_path, x
+
+def test_agreement(keras_path, x):
+    """Both conversions track the Keras model across batch sizes"""
+    print("=== TESTING TFLITE RUNTIMES ===")
+    keras = KerasDiseaseModel(keras_path, LABELS, "leaf.keras")
+    reference = keras.predict(x)
+    for quantization, tolerance in (("float16", 0.01), ("int8", 0.05)):
+        model = open_model(os.path.join(MODELS_DIR, f"leaf_{quantization}.tflite"), LABELS, quantization)
+        assert isinstance(model, TFLiteDiseaseModel) and model.input_size == (32, 32)
+        chunks = list(zip(range(0, 256, 37), [1, 3, 5, 8, 16, 32, 64]))
+        outputs = np.concatenate([model.predict(x[start:start + n]) for start, n in chunks])
+        expected = np.concatenate([reference[start:start + n] for start, n in chunks])
+        assert outputs.shape == expected.shape and outputs.dtype == np.float32, outputs.shape
+        agreement = np.mean(outputs.argmax(axis=1) == expected.argmax(axis=1))
+        drift = np.abs(outputs - expected).max()
+        assert agreement >= 0.97 and drift < tolerance, (quantization, agreement, drift)
+        print(f"✓ {quantization}: top-1 agreement {agreement:.1%}, max probability drift {drift:.4f}, "
+              f"batches of 1 to 64")
+    int8 = open_model(os.path.join(MODELS_DIR, "leaf_int8.tflite"), LABELS, "int8")
+    assert int8._input["dtype"] == np.int8 and int8._output["dtype"] == np.int8
+    alone = np.concatenate([int8.predict(x[i:i + 1]) for i in range(5)])
+    assert np.array_equal(alone, int8.predict(x[:5])), "padding must not change other rows"
+    print("✓ int8 input and output are quantized and dequantized; padded rows do not leak")
+    try:
+        TFLiteDiseaseModel(settings.MODEL_PATH, LABELS + ["rust"], "int8")
+        raise AssertionError("a label count mismatch should be refused")
+    except ValueError as exc:
+        assert "2 outputs but 3 labels" in str(exc)
+    print("✓ A labels file that does not match the outputs is refused")
+
+async def test_engine_serves_tflite():
+    """MODEL_PATH pointing at a .tflite file serves diagnoses through the engine"""
+    print("\n=== TESTING ENGINE WITH A TFLITE MODEL ===")
+    model = await asyncio.to_thread(load_configured_model)
+    assert isinstance(model, TFLiteDiseaseModel) and model.version == "leaf_int8.tflite"
+    assert model.interpreter is not None and settings.TFLITE_THREADS == 2
+    diagnosis_engine.start(model)
+    try:
+        verdicts = {}
+        for name, color in (("green", (20, 200, 30)), ("red", (200, 40, 30))):
+            stored = await storage.store(_once(png(color)), settings.UPLOAD_MAX_BYTES)
+            verdicts[name] = await diagnosis_engine.diagnose(stored.key)
+        assert verdicts["green"].disease_name == "healthy" and verdicts["green"].is_healthy
+        assert verdicts["red"].disease_name == "leaf_spot", verdicts
+        assert verdicts["red"].model_version == "leaf_int8.tflite"
+        print(f"✓ Green leaf: {verdicts['green'].disease_name} ({verdicts['green'].confidence_score:.2f}), "
+              f"red leaf: {verdicts['red'].disease_name} ({verdicts['red'].confidence_score:.2f})")
+    finally:
+        await diagnosis_engine.stop()
+
+async def _once(data: bytes):
+    yield data
+
+async def main():
+    """Run all TFLite runtime tests"""
+    print("🧪 Starting TFLite Runtime Tests")
+    print("=" * 50)
+    keras_path, x = await asyncio.to_thread(build_models)
+    test_agreement(keras_path, x)
+    await test_engine_serves_tflite()
+    shutil.rmtree(settings.UPLOAD_DIR)
+    print("\n" + "=" * 50)
+    print("🎉 ALL TFLITE RUNTIME TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
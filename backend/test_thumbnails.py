@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Resized image tests: /images serves width-bucketed WebP or JPEG copies of
+uploads, rendered once in the worker pool and then read from disk, with
+concurrent first requests sharing one rendering, EXIF rotation applied and
+metadata stripped, and ETag/Cache-Control/If-None-Match for caches. Needs
+PostgreSQL at DATABASE_URL (for the app lifespan); uses a temporary UPLOAD_DIR.
+"""
+import asyncio
+import io
+import os
+import re
+import shutil
+import tempfile
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="plantify_thumbnails_")
+os.environ["THUMBNAIL_WORKERS"] = "1"
+
+import httpx
+from PIL import Image
+
+from app.core.config import settings
+from app.main import app, lifespan
+from app.services.thumbnails import thumbnails, width_bucket
+from test_inference import png, rotated_jpeg
+
+def phone_photo() -> bytes:
+    """A 3000x2000 JPEG with a GPS tag, like a phone camera's"""
+    exif = Image.Exif()
+    exif[0x8825] = {1: "N", 2: (52.0, 22.0, 0.0)}  # GPS IFD
+    buffer = io.BytesIO()
+    Image.new("RGB", (3000, 2000), (40, 160, 60)).save(buffer, "JPEG", quality=90, exif=exif)
+    return buffer.getvalue()
+
+def metric(text: str, result: str) -> float:
+    match = re.search(rf'plantify_thumbnail_requests_total{{result="{result}"}} ([0-9.]+)', text)
+    return float(match.group(1)) if match else 0.0
+
+async def upload(client: httpx.AsyncClient, data: bytes, content_type: str) -> str:
+    response = await client.post("/upload", content=data, headers={"Content-Type": content_type})
+    assert response.status_code in (200, 201), response.text
+    return response.json()["image_path"]
+
+async def test_derivatives(client: httpx.AsyncClient):
+    """Widths round up to buckets; format follows Accept unless given"""
+    print("=== TESTING RESIZED IMAGES ===")
+    assert width_bucket(1, [160, 320]) == 160 and width_bucket(161, [160, 320]) == 320
+    assert width_bucket(5000, [160, 320]) == 320
+    key = await upload(client, phone_photo(), "image/jpeg")
+    response = await client.get(f"/images/{key}?w=300", headers={"Accept": "image/avif,image/webp,*/*"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "image/webp" and response.headers["vary"] == "Accept"
+    with Image.open(io.BytesIO(response.content)) as image:
+        assert image.format == "WEBP" and image.size == (320, 213), image.size
+        assert not image.getexif(), "metadata must be stripped"
+    print(f"✓ w=300 with WebP accepted: 320x213 WebP, {len(response.content)} bytes, no EXIF/GPS")
+
+    response = await client.get(f"/images/{key}?w=300", headers={"Accept": "image/jpeg"})
+    assert response.headers["content-type"] == "image/jpeg"
+    response = await client.get(f"/images/{key}", params={"w": 5000, "format": "jpeg"})
+    assert "vary" not in response.headers
+    with Image.open(io.BytesIO(response.content)) as image:
+        assert image.format == "JPEG" and image.width == max(settings.THUMBNAIL_WIDTHS)
+    print("✓ JPEG for other clients; format=jpeg skips negotiation; widths cap at the largest bucket")
+
+    small = await upload(client, png((200, 40, 30), (64, 48)), "image/png")
+    with Image.open(io.BytesIO((await client.get(f"/images/{small}?w=640")).content)) as image:
+        assert image.size == (64, 48)
+    rotated = await upload(client, rotated_jpeg(), "image/jpeg")
+    with Image.open(io.BytesIO((await client.get(f"/images/{rotated}?w=160&format=jpeg")).content)) as image:
+        assert image.size == (160, 320), image.size
+        assert image.getpixel((80, 10))[1] > 150 and image.getpixel((80, 310))[1] < 100  # left (green) half on top
+    print("✓ Small images are never enlarged; EXIF orientation is applied")
+
+async def test_single_flight_and_caching(client: httpx.AsyncClient):
+    """Concurrent first requests render once; later ones read the file; 304 on a matching ETag"""
+    print("\n=== TESTING SINGLE-FLIGHT AND CACHING ===")
+    key = await upload(client, phone_photo(), "image/jpeg")  # deduplicated; 640 WebP not made yet
+    before = (await client.get("/metrics")).text
+    responses = await asyncio.gather(*(client.get(f"/images/{key}?w=640&format=webp") for _ in range(8)))
+    after = (await client.get("/metrics")).text
+    assert all(r.status_code == 200 and r.content == responses[0].content for r in responses)
+    assert metric(after, "generated") - metric(before, "generated") == 1
+    assert metric(after, "coalesced") - metric(before, "coalesced") == 7
+    print("✓ 8 concurrent requests for a new size: rendered once, 7 waited on it")
+
+    again = await client.get(f"/images/{key}?w=500&format=webp")
+    assert again.content == responses[0].content
+    assert metric((await client.get("/metrics")).text, "cached") - metric(after, "cached") == 1
+    etag = again.headers["etag"]
+    assert again.headers["cache-control"] == "public, max-age=31536000, immutable" and etag.startswith('"')
+    print(f"✓ w=500 is served from the w=640 file on disk, ETag {etag}")
+
+    response = await client.get(f"/images/{key}?w=500&format=webp", headers={"If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304 and response.content == b"" and response.headers["etag"] == etag
+    response = await client.get(f"/images/{key}?w=500&format=jpeg", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    print("✓ If-None-Match with the ETag gets 304; another format has its own ETag")
+
+async def test_errors(client: httpx.AsyncClient):
+    """Unknown keys 404, unreadable images 422, bad parameters 422"""
+    print("\n=== TESTING ERRORS ===")
+    missing = "ab/cd/abcd" + "0" * 60 + ".jpg"
+    assert (await client.get(f"/images/{missing}?w=160")).status_code == 404
+    assert (await client.get("/images/../../etc/passwd?w=160")).status_code == 404
+    assert (await client.get("/images/.thumbnails/x.webp?w=160")).status_code == 404
+    broken = "12/34/1234" + "f" * 60 + ".jpg"
+    os.makedirs(os.path.join(settings.UPLOAD_DIR, "12", "34"))
+    with open(os.path.join(settings.UPLOAD_DIR, broken), "wb") as handle:
+        handle.write(b"\xff\xd8\xff not really a jpeg")
+    response = await client.get(f"/images/{broken}?w=160")
+    assert response.status_code == 422 and "cannot be resized" in response.text, response.text
+    key = await upload(client, png((20, 200, 30)), "image/png")
+    assert (await client.get(f"/images/{key}?w=0")).status_code == 422
+    assert (await client.get(f"/images/{key}?format=gif")).status_code == 422
+    print("✓ Unknown and non-content keys 404; undecodable blobs and bad w/format 422")
+    assert not os.path.exists(os.path.join(thumbnails.root, "12"))
+    print("✓ Failed renders leave nothing in the cache")
+
+async def main():
+    """Run all resized image tests"""
+    print("🧪 Starting Resized Image Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await test_derivatives(client)
+            await test_single_flight_and_caching(client)
+            await test_errors(client)
+    shutil.rmtree(settings.UPLOAD_DIR)
+    print("\n" + "=" * 50)
+    print("🎉 ALL RESIZED IMAGE TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Upload tests: images stream to content-addressed storage, duplicates are
+stored once and the body is never held in memory whole. Uses a temporary
+UPLOAD_DIR; needs PostgreSQL at DATABASE_URL only for the app lifespan.
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import tracemalloc
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="plantify_uploads_")
+os.environ.setdefault("UPLOAD_MAX_BYTES", str(32 * 1024 * 1024))
+
+import httpx
+
+from app.core.config import settings
+from app.core.storage import storage
+from app.main import app, lifespan
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 4096
+JPEG = b"\xff\xd8\xff\xe0" + os.urandom(8192)
+BOUNDARY = "plantifyboundary"
+
+def stored_files():
+    return [os.path.join(d, f) for d, _, files in os.walk(settings.UPLOAD_DIR) for f in files]
+
+def multipart(field: str, data: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nleaf\r\n"
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"leaf.png\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+def content_path(data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+
+async def test_dedup(client: httpx.AsyncClient):
+    """The same bytes stored twice (raw and multipart) keep one file"""
+    print("=== TESTING CONTENT-ADDRESSED UPLOADS ===")
+    first = await client.post("/upload", content=PNG, headers={"Content-Type": "image/png"})
+    assert first.status_code == 201, first.text
+    body = first.json()
+    assert body["content_type"] == "image/png" and body["size"] == len(PNG) and not body["deduplicated"]
+    assert os.path.exists(os.path.join(settings.UPLOAD_DIR, body["image_path"]))
+    print(f"✓ Raw upload stored at {body['image_path']}")
+
+    second = await client.post("/upload", content=multipart("file", PNG),
+                               headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"})
+    assert second.status_code == 200, second.text
+    assert second.json()["image_path"] == body["image_path"] and second.json()["deduplicated"]
+    assert len(stored_files()) == 1, stored_files()
+    print("✓ Multipart re-upload of the same bytes deduplicated (200, one file)")
+
+    # Concurrent uploads of new content must also end with exactly one copy
+    responses = await asyncio.gather(*(
+        client.post("/upload", content=JPEG, headers={"Content-Type": "image/jpeg"}) for _ in range(5)
+    ))
+    assert {r.json()["image_path"] for r in responses} == {content_path(JPEG)}
+    assert len(stored_files()) == 2, stored_files()
+    print("✓ Concurrent identical uploads end with one copy")
+
+async def test_rejections(client: httpx.AsyncClient):
+    """Oversized, non-image and malformed uploads are refused and leave nothing behind"""
+    print("\n=== TESTING REJECTED UPLOADS ===")
+    async def too_big():
+        yield b"\xff\xd8\xff\xe0"
+        for _ in range(settings.UPLOAD_MAX_BYTES // 65536 + 1):
+            yield b"\x00" * 65536
+    response = await client.post("/upload", content=too_big(), headers={"Content-Type": "image/jpeg"})
+    assert response.status_code == 413, response.status_code
+    print("✓ Oversized upload rejected with 413")
+
+    response = await client.post("/upload", content=b"GIF89a" + b"\x00" * 100, headers={"Content-Type": "image/gif"})
+    assert response.status_code == 415, response.status_code
+    response = await client.post("/upload", content=b"{}", headers={"Content-Type": "application/json"})
+    assert response.status_code == 415, response.status_code
+    print("✓ Unsupported formats rejected with 415")
+
+    response = await client.post("/upload", content=multipart("photo", PNG),
+                                 headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"})
+    assert response.status_code == 400, response.status_code
+    print("✓ Form without a file field rejected with 400")
+    assert os.listdir(storage.tmp_dir) == [], os.listdir(storage.tmp_dir)
+    assert len(stored_files()) == 2
+    print("✓ No partial files left behind")
+
+async def test_local_paths():
+    """Only content keys written by store() resolve; other files under the root do not"""
+    print("\n=== TESTING LOCAL PATHS ===")
+    key = content_path(JPEG)
+    assert storage.local_path(key) == os.path.join(settings.UPLOAD_DIR, key)
+    partial = os.path.join(storage.tmp_dir, "0" * 32)
+    with open(partial, "wb") as out:
+        out.write(JPEG[:100])
+    with open(os.path.join(settings.UPLOAD_DIR, "notes.jpg"), "wb") as out:
+        out.write(JPEG)
+    for bad in (f".tmp/{'0' * 32}", "notes.jpg", f"../{key}", os.path.join(settings.UPLOAD_DIR, key),
+                key.replace(".jpg", ".png")):
+        try:
+            storage.local_path(bad)
+            raise AssertionError(f"{bad!r} should not resolve")
+        except FileNotFoundError:
+            pass
+    os.remove(partial)
+    os.remove(os.path.join(settings.UPLOAD_DIR, "notes.jpg"))
+    print("✓ Partial uploads, non-content files, traversal and missing blobs raise FileNotFoundError")
+
+async def test_streaming_memory(client: httpx.AsyncClient):
+    """A large upload is streamed: peak allocation stays far below its size"""
+    print("\n=== TESTING STREAMING MEMORY ===")
+    size = 24 * 1024 * 1024
+    chunk = b"\x00" * 65536
+    async def body():
+        yield b"\xff\xd8\xff\xe0"
+        for _ in range(size // len(chunk)):
+            yield chunk
+    tracemalloc.start()
+    response = await client.post("/upload", content=body(), headers={"Content-Type": "image/jpeg"})
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert response.status_code == 201, response.text
+    assert peak < 4 * 1024 * 1024, peak
+    print(f"✓ {size // 2**20} MiB upload with {peak / 2**20:.1f} MiB peak allocation")
+
+async def main():
+    """Run all upload tests"""
+    print("🧪 Starting Upload Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await test_dedup(client)
+            await test_rejections(client)
+            await test_local_paths()
+            await test_streaming_memory(client)
+    shutil.rmtree(settings.UPLOAD_DIR)
+    print("\n" + "=" * 50)
+    print("🎉 ALL UPLOAD TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Email uniqueness tests: concurrent signups for one email are settled by the
+database's unique index, and get-or-create is idempotent. Needs PostgreSQL
+at DATABASE_URL; REDIS_URL=memory:// is enough for the cache.
+"""
+import asyncio
+import os
+import uuid
+os.environ.setdefault("REDIS_URL", "memory://")
+
+import httpx
+
+from app.main import app, lifespan
+
+CONCURRENCY = 8
+
+def unique_email(label: str) -> str:
+    return f"{label}-{uuid.uuid4().hex[:12]}@example.com"
+
+async def test_concurrent_signups(client: httpx.AsyncClient):
+    """Racing creates with one email: exactly one succeeds, the rest get 400"""
+    print("=== TESTING CONCURRENT SIGNUPS ===")
+    email = unique_email("race")
+    responses = await asyncio.gather(*(
+        client.post("/api/users/", json={"email": email, "name": f"Racer {i}"}) for i in range(CONCURRENCY)
+    ))
+    codes = sorted(r.status_code for r in responses)
+    assert codes == [200] + [400] * (CONCURRENCY - 1), codes
+    assert all(r.json()["detail"] == "User with this email already exists"
+               for r in responses if r.status_code == 400)
+    print(f"✓ {CONCURRENCY} concurrent signups: 1 created, {CONCURRENCY - 1} rejected with 400")
+
+async def test_update_to_taken_email(client: httpx.AsyncClient):
+    """Changing an email to one already in use is a 400, keeping the old email"""
+    print("\n=== TESTING UPDATE TO A TAKEN EMAIL ===")
+    taken = (await client.post("/api/users/", json={"email": unique_email("taken"), "name": "A"})).json()
+    other = (await client.post("/api/users/", json={"email": unique_email("other"), "name": "B"})).json()
+    response = await client.put(f"/api/users/{other['id']}", json={"email": taken["email"]})
+    assert response.status_code == 400, response.text
+    response = await client.put(f"/api/users/{other['id']}", json={"email": other["email"], "name": "B2"})
+    assert response.status_code == 200, response.text
+    assert (await client.get(f"/api/users/{other['id']}")).json()["email"] == other["email"]
+    print("✓ Update to a taken email rejected; updating to its own email still works")
+
+async def test_get_or_create(client: httpx.AsyncClient):
+    """get-or-create returns 201 once, then 200 with the same user, even when racing"""
+    print("\n=== TESTING GET-OR-CREATE ===")
+    email = unique_email("onboard")
+    responses = await asyncio.gather(*(
+        client.post("/api/users/get-or-create", json={"email": email, "name": f"Job {i}"})
+        for i in range(CONCURRENCY)
+    ))
+    codes = sorted(r.status_code for r in responses)
+    assert codes == [200] * (CONCURRENCY - 1) + [201], codes
+    assert len({r.json()["id"] for r in responses}) == 1
+    again = await client.post("/api/users/get-or-create", json={"email": email, "name": "Renamed"})
+    assert again.status_code == 200 and again.json()["id"] == responses[0].json()["id"]
+    assert again.json()["name"] != "Renamed"
+    print(f"✓ {CONCURRENCY} concurrent calls: one 201, the rest 200 with the same id")
+    print("✓ Repeat call returns the existing user unchanged")
+
+async def main():
+    """Run all email uniqueness tests"""
+    print("🧪 Starting Email Uniqueness Tests")
+    print("=" * 50)
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await test_concurrent_signups(client)
+            await test_update_to_taken_email(client)
+            await test_get_or_create(client)
+    print("\n" + "=" * 50)
+    print("🎉 ALL EMAIL UNIQUENESS TESTS PASSED!")
+
+if __name__ == "__main__":
+    asyncio.run(main())